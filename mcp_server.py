@@ -32,7 +32,7 @@ logging.basicConfig(level=logging.ERROR)
 # Add src to path
 sys.path.insert(0, str(Path(__file__).parent / "src"))
 
-from mcp.server.fastmcp import FastMCP
+from mcp.server.fastmcp import Context, FastMCP
 from rag_agent.rag_agent import RAGAgent
 from rag_agent.ingest import ingest_documents as run_ingestion
 from rag_agent.researcher import ResearchAgent
@@ -56,7 +56,7 @@ def get_agent():
     return _agent
 
 @mcp.tool()
-async def ask_project_x(query: str) -> str:
+async def ask_project_x(query: str, ctx: Context) -> str:
     """
     Ask a question to the EchoMindAI RAG Agent.
     Use this tool when you need to retrieve information from the user's documents.
@@ -69,8 +69,16 @@ async def ask_project_x(query: str) -> str:
         return "Error: RAG Agent could not be initialized. Please check the text embeddings and vector store."
     
     try:
-        # We run the synchronous ask method in a thread to avoid blocking the async loop
-        response = await asyncio.to_thread(agent.ask, query)
+        # Native async stream: no thread hops, per-request timeout, and
+        # cancellation propagates if the MCP client goes away
+        from rag_agent.streaming import Final, ToolStart
+
+        response = ""
+        async for event in agent.astream(query):
+            if isinstance(event, ToolStart):
+                await ctx.info(f"Running tool: {event.tool}")
+            elif isinstance(event, Final):
+                response = event.output
         return str(response)
     except Exception as e:
         return f"Error processing query: {str(e)}"
@@ -114,6 +122,40 @@ def system_health() -> str:
              health_status.append("❌ RAG Agent: Failed to load")
     except Exception as e:
         health_status.append(f"❌ RAG Agent Check Failed: {e}")
+
+    # 3. Loaded Embedding Models
+    from rag_agent.embeddings import embedding_memory_report
+    for entry in embedding_memory_report():
+        size = entry["weights_bytes"]
+        size_str = f"{size / 1e6:.0f} MB" if size else "remote"
+        health_status.append(f"🧠 Embeddings: {entry['provider']}/{entry['model']} ({size_str})")
+
+    # 4. CPU Budget
+    from rag_agent.resources import get_cpu_budget
+    cpu = get_cpu_budget().snapshot()
+    health_status.append(
+        f"⚙️ CPU: {cpu['threads_in_use']}/{cpu['total_threads']} threads in use, "
+        f"running={cpu['running']}, waiting={cpu['waiting']}"
+    )
+
+    # 5. Chat Model Circuits
+    from rag_agent.routing import routing_metrics
+    for entry in routing_metrics():
+        latency = f"{entry['p95_ms']} ms p95" if entry["p95_ms"] is not None else "no traffic"
+        icon = "✅" if entry["state"] == "closed" else "⛔" if entry["state"] == "open" else "🟡"
+        health_status.append(
+            f"{icon} LLM {entry['model']}: {entry['state']}, "
+            f"error rate {entry['error_rate']:.0%}, {latency}"
+        )
+
+    # 6. Embedding Model Migration
+    from rag_agent.migration import migration_status
+    migration = migration_status()
+    if migration:
+        health_status.append(
+            f"🔁 Migration to {migration.get('provider')}/{migration.get('model')}: "
+            f"{migration.get('status')} ({migration.get('done', 0)}/{migration.get('total')} chunks)"
+        )
         
     return "\n".join(health_status)
 
@@ -295,12 +337,14 @@ async def retrieve_documents(query: str, k: int = 5) -> str:
     try:
         # Limit k to reasonable bounds
         k = max(1, min(k, 20))
-        docs = await asyncio.to_thread(agent.vector_store.similarity_search, query, k=k)
+        docs = await agent.aretrieve(query, k=k)
         
         if not docs:
             return "No matching documents found."
             
         return "\\n\\n---\\n\\n".join([f"Source: {d.metadata.get('source', 'Unknown')}\\nContent: {d.page_content}" for d in docs])
+    except asyncio.TimeoutError:
+        return f"Error retrieving documents: timed out after {settings.retrieval_timeout:.0f}s"
     except Exception as e:
         return f"Error retrieving documents: {str(e)}"
 
@@ -315,6 +359,15 @@ def get_stats() -> str:
     }
     return str(stats)
 
+@mcp.resource("echomindai://metrics")
+def get_metrics() -> str:
+    """Latency breakdown of recent answers (TTFT, tokens/s, tool and retrieval timings)."""
+    import json
+    from rag_agent.metrics import get_metrics_registry
+
+    registry = get_metrics_registry()
+    return json.dumps({"summary": registry.summary(), "recent": registry.recent(20)}, indent=2)
+
 @mcp.tool()
 def translate_content(text: str, target_lang: str = "en") -> str:
     """
@@ -504,6 +557,9 @@ def shopping_assistant(product_query: str) -> str:
 
 if __name__ == "__main__":
     import threading
+    from rag_agent.resources import configure_cpu
+
+    configure_cpu()
     # Warmup Agent in background
     def warmup():
         print("Warming up RAG Agent...", file=sys.stderr)
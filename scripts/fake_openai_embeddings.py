@@ -0,0 +1,60 @@
+"""
+Local stand-in for the OpenAI /v1/embeddings endpoint.
+
+Returns deterministic vectors and injects 429s so the concurrent embedding
+client can be exercised without API quota:
+
+    python scripts/fake_openai_embeddings.py --port 8089 --rate-limit-every 5
+    RAG_EMBEDDING_PROVIDER=openai RAG_OPENAI_EMBED_BASE_URL=http://127.0.0.1:8089/v1 \
+        python -m rag_agent.cli ingest
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--port", type=int, default=8089)
+parser.add_argument("--dim", type=int, default=1536)
+parser.add_argument("--latency-ms", type=float, default=50)
+parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every Nth request with 429 (0 = never)")
+args = parser.parse_args()
+
+counter = itertools.count(1)
+
+
+def fake_vector(text):
+    seed = hashlib.sha256(text.encode("utf-8")).digest()
+    return [((seed[i % len(seed)] + i) % 255) / 255 - 0.5 for i in range(args.dim)]
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        n = next(counter)
+        if args.rate_limit_every and n % args.rate_limit_every == 0:
+            self.send_response(429)
+            self.send_header("Retry-After", "0.5")
+            self.end_headers()
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        time.sleep(args.latency_ms / 1000)
+        payload = json.dumps({
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": fake_vector(t)} for i, t in enumerate(inputs)],
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *_):
+        pass
+
+
+print(f"Fake OpenAI embeddings listening on http://127.0.0.1:{args.port}/v1")
+ThreadingHTTPServer(("127.0.0.1", args.port), Handler).serve_forever()
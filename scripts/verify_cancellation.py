@@ -0,0 +1,113 @@
+"""
+Checks that a Stop (cancelled CancellationToken) aborts an agent run promptly,
+using the offline mock model: once mid-answer while tokens stream, once while
+a tool runs (so the next model call never happens), and through the model
+router, where a Stop must not count as a model failure or fail over.
+
+    python scripts/verify_cancellation.py
+"""
+import sys
+import os
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from langchain_classic.agents import create_tool_calling_agent
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import tool
+
+from rag_agent.agent_executor import ConcurrentAgentExecutor
+from rag_agent.cancellation import CancellationHandler, CancellationToken, Cancelled
+from rag_agent.llm_mock import MockChatModel
+
+
+@tool
+def slow_lookup(query: str) -> str:
+    """Looks something up (slow)."""
+    time.sleep(1)
+    return f"Found {query}"
+
+
+class CountModelCalls(BaseCallbackHandler):
+    def __init__(self):
+        self.calls = 0
+
+    def on_llm_end(self, response, **kwargs):
+        self.calls += 1
+
+
+SCRIPT = [
+    {"match": "lookup", "tool_calls": [{"name": "slow_lookup", "args": {"query": "{question}"}}]},
+    {"content": "Long answer: {filler}"},
+]
+# 200 tokens at 20/s: about 10s of streaming unless stopped
+llm = MockChatModel(script=SCRIPT, latency=0.1, tokens_per_second=20, response_tokens=200)
+prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a test agent."),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad"),
+])
+executor = ConcurrentAgentExecutor(agent=create_tool_calling_agent(llm, [slow_lookup], prompt), tools=[slow_lookup])
+
+
+def run_and_stop(question, stop_after):
+    token = CancellationToken()
+    counter = CountModelCalls()
+    threading.Timer(stop_after, token.cancel).start()
+    start = time.perf_counter()
+    try:
+        executor.invoke({"input": question}, config={"callbacks": [counter, CancellationHandler(token)]})
+        outcome = "finished"
+    except Cancelled:
+        outcome = "cancelled"
+    return outcome, time.perf_counter() - start, counter.calls
+
+
+print("--- Testing Stop While Streaming ---")
+try:
+    outcome, elapsed, _ = run_and_stop("tell me a story", stop_after=0.5)
+    print(f"Outcome: {outcome} after {elapsed:.2f}s")
+    if outcome == "cancelled" and elapsed < 1.5:
+        print("✅ Stream aborted on the next token")
+    else:
+        print("❌ Run was not stopped promptly")
+except Exception as e:
+    print(f"❌ Error: {e}")
+
+print("\n--- Testing Stop During A Tool Call ---")
+try:
+    outcome, elapsed, calls = run_and_stop("lookup the refund policy", stop_after=0.3)
+    print(f"Outcome: {outcome} after {elapsed:.2f}s, completed model calls: {calls}")
+    if outcome == "cancelled" and calls == 1:
+        print("✅ The step after the tool never ran the model")
+    else:
+        print("❌ Expected the run to stop before its second model call")
+except Exception as e:
+    print(f"❌ Error: {e}")
+
+print("\n--- Testing Stop Through The Model Router ---")
+try:
+    from rag_agent.routing import ModelRouter, model_health
+
+    router = ModelRouter.from_models(
+        MockChatModel(model_name="mock-primary", latency=0.1), MockChatModel(model_name="mock-fallback", latency=0.1)
+    )
+    outcomes = []
+    for _ in range(3):
+        # Stop before the first chunk: the case that used to fail over and count as a model failure
+        token = CancellationToken()
+        token.cancel()
+        try:
+            list(router.stream("hello", config={"callbacks": [CancellationHandler(token)]}))
+            outcomes.append("finished")
+        except Cancelled:
+            outcomes.append("cancelled")
+    primary, fallback = model_health("mock-primary"), model_health("mock-fallback")
+    print(f"Outcomes: {outcomes}, primary failures: {primary.failures} ({primary.state}), "
+          f"fallback requests: {fallback.requests}")
+    if outcomes == ["cancelled"] * 3 and primary.failures == 0 and primary.state == "closed" and fallback.requests == 0:
+        print("✅ Stop is not counted against the model and does not fail over")
+    else:
+        print("❌ Stop was treated as a model failure")
+except Exception as e:
+    print(f"❌ Error: {e}")
@@ -0,0 +1,130 @@
+"""
+Drives ConcurrentAgentExecutor with the offline mock model (no API key needed):
+one step that asks for two slow tools at once, and one tool that runs past its
+timeout, through both invoke and ainvoke.
+
+    python scripts/verify_concurrent_tools.py
+"""
+import sys
+import os
+import asyncio
+import threading
+import time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from langchain_classic.agents import create_tool_calling_agent
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import tool
+
+from rag_agent.agent_executor import TOOL_TIMEOUTS, ConcurrentAgentExecutor
+from rag_agent.llm_mock import MockChatModel
+
+TOOL_SECONDS = 1.0
+# Worker threads the slow tools ran on
+tool_threads = []
+
+
+@tool
+def slow_weather(city: str) -> str:
+    """Weather for a city (slow)."""
+    tool_threads.append(threading.current_thread().name)
+    time.sleep(TOOL_SECONDS)
+    return f"Sunny in {city}"
+
+
+@tool
+def slow_news(topic: str) -> str:
+    """Headlines for a topic (slow)."""
+    tool_threads.append(threading.current_thread().name)
+    time.sleep(TOOL_SECONDS)
+    return f"Nothing new about {topic}"
+
+
+@tool
+def stuck_tool(query: str) -> str:
+    """A tool that never answers in time."""
+    time.sleep(3)
+    return "too late"
+
+
+TOOL_TIMEOUTS["stuck_tool"] = 0.5
+
+SCRIPT = [
+    {"match": "both", "tool_calls": [
+        {"name": "slow_weather", "args": {"city": "Paris"}},
+        {"name": "slow_news", "args": {"topic": "Paris"}},
+    ]},
+    {"match": "stuck", "tool_calls": [{"name": "stuck_tool", "args": {"query": "{question}"}}]},
+    {"content": "Done after {tool}: {tool_output}"},
+]
+
+tools = [slow_weather, slow_news, stuck_tool]
+llm = MockChatModel(script=SCRIPT, latency=0, tokens_per_second=0)
+prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a test agent."),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad"),
+])
+executor = ConcurrentAgentExecutor(
+    agent=create_tool_calling_agent(llm, tools, prompt),
+    tools=tools,
+    return_intermediate_steps=True,
+)
+
+print("--- Testing Multi-Tool Step ---")
+try:
+    start = time.perf_counter()
+    result = executor.invoke({"input": "weather and news, both please"})
+    elapsed = time.perf_counter() - start
+    order = [action.tool for action, _ in result["intermediate_steps"]]
+    print(f"Tools: {order} in {elapsed:.2f}s")
+    if order != ["slow_weather", "slow_news"]:
+        print("❌ Observations out of order")
+    elif elapsed >= 2 * TOOL_SECONDS:
+        print("❌ Tools ran one after another")
+    else:
+        print("✅ Tools ran concurrently, observations in call order")
+except Exception as e:
+    print(f"❌ Error: {e}")
+
+print("\n--- Testing Tool Timeout ---")
+try:
+    start = time.perf_counter()
+    result = executor.invoke({"input": "this one gets stuck"})
+    elapsed = time.perf_counter() - start
+    observation = result["intermediate_steps"][0][1]
+    print(f"Observation: {observation}")
+    if "did not respond" in observation and elapsed < 2:
+        print(f"✅ Timed out after {elapsed:.2f}s and the agent still answered: {result['output'][:60]}")
+    else:
+        print(f"❌ Expected a timeout observation within 2s, took {elapsed:.2f}s")
+except Exception as e:
+    print(f"❌ Error: {e}")
+
+print("\n--- Testing Async Multi-Tool Step ---")
+try:
+    tool_threads.clear()
+    start = time.perf_counter()
+    result = asyncio.run(executor.ainvoke({"input": "weather and news, both please"}))
+    elapsed = time.perf_counter() - start
+    print(f"Tools ran on: {tool_threads} in {elapsed:.2f}s")
+    if not all(name.startswith("tools") for name in tool_threads):
+        print("❌ Sync tools ran outside the bounded tool pool")
+    elif elapsed >= 2 * TOOL_SECONDS:
+        print("❌ Tools ran one after another")
+    else:
+        print("✅ Sync tools ran concurrently on the tool pool")
+except Exception as e:
+    print(f"❌ Error: {e}")
+
+print("\n--- Testing Async Tool Timeout ---")
+try:
+    start = time.perf_counter()
+    result = asyncio.run(executor.ainvoke({"input": "this one gets stuck"}))
+    elapsed = time.perf_counter() - start
+    observation = result["intermediate_steps"][0][1]
+    if "did not respond" in observation and elapsed < 2:
+        print(f"✅ Timed out after {elapsed:.2f}s on the async path")
+    else:
+        print(f"❌ Expected a timeout observation within 2s, took {elapsed:.2f}s")
+except Exception as e:
+    print(f"❌ Error: {e}")
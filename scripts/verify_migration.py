@@ -0,0 +1,34 @@
+"""
+Checks that needs_migration() compares the model recorded in an index manifest
+with the configured one. Uses throwaway manifests only; nothing is embedded.
+
+    python scripts/verify_migration.py
+"""
+import sys
+import os
+import tempfile
+from pathlib import Path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from rag_agent.embeddings import resolve_embedding_model
+from rag_agent.manifest import write_manifest
+from rag_agent.migration import needs_migration
+
+provider, model = resolve_embedding_model()
+
+print("--- Testing needs_migration ---")
+cases = [
+    ("Index built with another model", {"embedding_provider": provider, "embedding_model": model + "-old"}, True),
+    ("Index built with the configured model", {"embedding_provider": provider, "embedding_model": model}, False),
+    ("Index built before models were recorded", {}, False),
+]
+for label, fields, expected in cases:
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            write_manifest(Path(tmp), **fields)
+            result = needs_migration(Path(tmp))
+        if result == expected:
+            print(f"✅ {label}: needs_migration() = {result}")
+        else:
+            print(f"❌ {label}: expected {expected}, got {result}")
+    except Exception as e:
+        print(f"❌ {label}: {type(e).__name__}: {e}")
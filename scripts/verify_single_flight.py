@@ -0,0 +1,135 @@
+"""
+Checks single-flight coalescing of identical questions with the offline mock
+model: concurrent subscribers share one agent run, a subscriber's own Stop or
+timeout only ends its own stream, and a run nobody is reading is cancelled.
+
+    python scripts/verify_single_flight.py
+"""
+import sys
+import os
+import asyncio
+from contextlib import aclosing
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'src')))
+from langchain_classic.agents import create_tool_calling_agent
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.tools import tool
+
+from rag_agent.agent_executor import ConcurrentAgentExecutor
+from rag_agent.cancellation import CancellationHandler, CancellationToken, Cancelled
+from rag_agent.llm_mock import MockChatModel
+from rag_agent.singleflight import SingleFlight
+from rag_agent.streaming import Final, Token
+
+
+@tool
+def search_knowledge_base(query: str) -> str:
+    """Searches the documents."""
+    return f"Policy text for {query}"
+
+
+class CountModelCalls(BaseCallbackHandler):
+    def __init__(self):
+        self.calls = 0
+
+    def on_llm_end(self, response, **kwargs):
+        self.calls += 1
+
+
+# Default script: one knowledge-base search, then about a second of streamed answer
+llm = MockChatModel(latency=0.2, tokens_per_second=50, response_tokens=40)
+prompt = ChatPromptTemplate.from_messages([
+    ("system", "You are a test agent."),
+    ("human", "{input}"),
+    MessagesPlaceholder(variable_name="agent_scratchpad"),
+])
+executor = ConcurrentAgentExecutor(
+    agent=create_tool_calling_agent(llm, [search_knowledge_base], prompt),
+    tools=[search_knowledge_base],
+)
+counter = CountModelCalls()
+
+
+async def run_agent(question, token):
+    """Stand-in for RAGAgent._astream_run: Token events, then one Final."""
+    output = ""
+    try:
+        async for event in executor.astream_events(
+            {"input": question},
+            config={"callbacks": [counter, CancellationHandler(token)]},
+            version="v2",
+        ):
+            if event["event"] == "on_chat_model_stream" and event["data"]["chunk"].content:
+                yield Token(event["data"]["chunk"].content)
+            elif event["event"] == "on_chain_end" and not event["parent_ids"]:
+                output = event["data"]["output"]["output"]
+    except Cancelled:
+        yield Final("", error="cancelled")
+        return
+    yield Final(output)
+
+
+async def collect(subscription, stop=None, stop_after=None):
+    if stop is not None:
+        asyncio.get_running_loop().call_later(stop_after, stop.cancel)
+    async with aclosing(subscription):
+        return [event async for event in subscription]
+
+
+def join(flight, question, cancel=None, timeout=None):
+    return flight.join(question, lambda token: run_agent(question, token), cancel, timeout)
+
+
+async def main():
+    print("--- Testing Coalesced Runs ---")
+    try:
+        flight = SingleFlight()
+        counter.calls = 0
+        joined = [join(flight, "what is the refund policy?") for _ in range(3)]
+        results = await asyncio.gather(*(collect(s) for s, _ in joined))
+        answers = {events[-1].output for events in results}
+        leaders = sum(leader for _, leader in joined)
+        print(f"Subscribers: 3, leaders: {leaders}, completed model calls: {counter.calls}")
+        if len(answers) == 1 and leaders == 1 and counter.calls == 2 and all(e[-1].error is None for e in results):
+            print("✅ Three identical questions shared one agent run")
+        else:
+            print(f"❌ Expected one shared run, got answers {answers}")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+    print("\n--- Testing Per-Subscriber Stop And Timeout ---")
+    try:
+        flight = SingleFlight()
+        stop = CancellationToken()
+        patient, _ = join(flight, "what is the leave policy?")
+        stopped, _ = join(flight, "what is the leave policy?", cancel=stop)
+        hurried, _ = join(flight, "what is the leave policy?", timeout=0.3)
+        full, cut, late = await asyncio.gather(
+            collect(patient), collect(stopped, stop, 0.3), collect(hurried)
+        )
+        print(f"Stopped: {cut[-1].error}, timed out: {late[-1].error}, others: {full[-1].error or 'answered'}")
+        if cut[-1].error == "cancelled" and "timed out" in (late[-1].error or "") and full[-1].error is None:
+            print("✅ Stop and timeout ended only their own streams")
+        else:
+            print("❌ One subscriber's Stop or timeout affected the others")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+    print("\n--- Testing Abandoned Run ---")
+    try:
+        flight = SingleFlight()
+        first, _ = join(flight, "what is the travel policy?")
+        second, _ = join(flight, "what is the travel policy?")
+        # Both leave before reading anything
+        await first.aclose()
+        await second.aclose()
+        await asyncio.sleep(0.5)
+        if first.flight.cancel.cancelled and len(flight) == 0:
+            print("✅ Run cancelled once every subscriber left")
+        else:
+            print("❌ Abandoned run kept going")
+    except Exception as e:
+        print(f"❌ Error: {e}")
+
+
+asyncio.run(main())
@@ -0,0 +1,166 @@
+"""Agent executor that runs the tool calls of one step concurrently.
+
+When the model asks for several tools in one step (say ``get_images`` +
+``get_stock_price`` + ``get_global_news``), the stock ``AgentExecutor`` runs
+them one after another, so the step takes the sum of their latencies.
+:class:`ConcurrentAgentExecutor` submits them together to a bounded pool and
+hands the observations back in the order the model asked for them. Each call
+is capped by a per-tool timeout, counted from submission so time spent queued
+for a busy pool counts too; a call that runs over becomes an error
+observation the model can react to instead of stalling the whole answer.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from langchain_classic.agents import AgentExecutor
+from langchain_core.agents import AgentAction, AgentStep
+from langchain_core.tools import BaseTool
+
+from .config import settings
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Seconds; tools not listed use RAG_TOOL_TIMEOUT
+TOOL_TIMEOUTS = {
+    "calculator": 10.0,
+    "save_file": 10.0,
+    "translate_content": 30.0,
+    "generate_plot": 30.0,
+    "create_chart": 30.0,
+    "generate_ai_image": 90.0,
+}
+
+_tool_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# Set while ConcurrentAgentExecutor collects one step's tool calls on this thread
+_batching = threading.local()
+_DONE = object()
+
+
+def get_tool_executor() -> ThreadPoolExecutor:
+    """Bounded pool shared by the tool calls of every agent run."""
+    global _tool_executor
+    with _executor_lock:
+        if _tool_executor is None:
+            _tool_executor = ThreadPoolExecutor(
+                max_workers=settings.tool_max_workers,
+                thread_name_prefix="tools",
+            )
+        return _tool_executor
+
+
+def tool_timeout(name: str) -> float:
+    return TOOL_TIMEOUTS.get(name, settings.tool_timeout)
+
+
+def _sync_only(tool: BaseTool | None) -> bool:
+    """Whether ``tool.arun`` would fall back to ``run_in_executor(None, ...)``."""
+    if tool is None:
+        return False
+    # StructuredTool and Tool take an optional coroutine; other tools may override _arun
+    if hasattr(tool, "coroutine"):
+        return tool.coroutine is None
+    return type(tool)._arun is BaseTool._arun
+
+
+def _timed_out(action: AgentAction, timeout: float) -> AgentStep:
+    logger.warning("Tool %s timed out after %.0fs", action.tool, timeout)
+    return AgentStep(
+        action=action,
+        observation=f"Error: {action.tool} did not respond within {timeout:.0f}s. "
+                    "Answer without it or suggest trying again.",
+    )
+
+
+class ConcurrentAgentExecutor(AgentExecutor):
+    """``AgentExecutor`` whose tool calls within one step run in parallel."""
+
+    def _perform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        if not getattr(_batching, "active", False):
+            return super()._perform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager)
+        # Copy the context so callbacks and tracing still attach to this run
+        context = contextvars.copy_context()
+        return get_tool_executor().submit(
+            context.run,
+            super()._perform_agent_action,
+            name_to_tool_map,
+            color_mapping,
+            agent_action,
+            run_manager,
+        )
+
+    def _iter_next_step(self, name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager=None):
+        # The base step yields the planned actions, then one _perform_agent_action result per
+        # action in the same order; while batching those are futures, so all calls start first
+        steps = super()._iter_next_step(name_to_tool_map, color_mapping, inputs, intermediate_steps, run_manager)
+        actions: list[AgentAction] = []
+        pending: list[tuple[AgentAction, Future, float]] = []
+        while True:
+            _batching.active = True
+            try:
+                item = next(steps, _DONE)
+            finally:
+                _batching.active = False
+            if item is _DONE:
+                break
+            if isinstance(item, Future):
+                action = actions[len(pending)]
+                # The budget starts at submission: queueing behind other runs' tools counts against it
+                pending.append((action, item, time.monotonic() + tool_timeout(action.tool)))
+                continue
+            if isinstance(item, AgentAction):
+                actions.append(item)
+            yield item
+
+        for action, future, deadline in pending:
+            try:
+                yield future.result(timeout=max(0.0, deadline - time.monotonic()))
+            except FutureTimeoutError:
+                # A call still queued never starts; a running one cannot be interrupted,
+                # so its late result is discarded
+                if future.cancel():
+                    logger.debug("Tool %s never left the queue", action.tool)
+                yield _timed_out(action, tool_timeout(action.tool))
+
+    async def _aperform_agent_action(self, name_to_tool_map, color_mapping, agent_action, run_manager=None):
+        # The async loop already gathers one step's calls; only the timeout is added here
+        timeout = tool_timeout(agent_action.tool)
+        if not _sync_only(name_to_tool_map.get(agent_action.tool)):
+            try:
+                return await asyncio.wait_for(
+                    super()._aperform_agent_action(name_to_tool_map, color_mapping, agent_action, run_manager),
+                    timeout=timeout,
+                )
+            except asyncio.TimeoutError:
+                return _timed_out(agent_action, timeout)
+
+        # Sync tools would otherwise land on the loop's default executor; keep them on the bounded pool
+        context = contextvars.copy_context()
+        future = get_tool_executor().submit(
+            context.run,
+            super()._perform_agent_action,
+            name_to_tool_map,
+            color_mapping,
+            agent_action,
+            run_manager.get_sync() if run_manager is not None else None,
+        )
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), timeout=timeout)
+        except asyncio.TimeoutError:
+            if future.cancel():
+                logger.debug("Tool %s never left the queue", agent_action.tool)
+            return _timed_out(agent_action, timeout)
+        except asyncio.CancelledError:
+            # The run was stopped: a call still queued never starts
+            future.cancel()
+            raise
+
+
+__all__ = ["ConcurrentAgentExecutor", "TOOL_TIMEOUTS", "get_tool_executor", "tool_timeout"]
@@ -0,0 +1,164 @@
+"""Micro-batching of query embeddings across concurrent callers.
+
+Chat sessions, the MCP server and the retrieval service all embed short
+queries. Instead of one model forward pass per query, :class:`QueryBatcher`
+collects the requests that arrive within ``RAG_QUERY_BATCH_WAIT_MS`` and runs
+them as a single batch, handing each caller back its own vector.
+"""
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+from .resources import cpu_slot
+
+# Queued by QueryBatcher.stop() to end the worker thread
+_STOP = object()
+
+
+class QueryBatcher:
+    """Collects concurrent query embeddings for a few ms and runs them as one batch."""
+
+    def __init__(self, embeddings, max_wait_ms: float, max_batch: int) -> None:
+        from .embeddings import is_local_model
+
+        self.embeddings = embeddings
+        self._local = is_local_model(embeddings)
+        self.max_wait = max_wait_ms / 1000
+        self.max_batch = max(1, max_batch)
+        self._queue: queue.Queue = queue.Queue()
+        self._stopped = False
+        threading.Thread(target=self._run, name="query-batcher", daemon=True).start()
+
+    def submit(self, text: str) -> Future:
+        if self._stopped:
+            # A retriever still holding the unloaded model keeps working, just unbatched
+            future: Future = Future()
+            future.set_running_or_notify_cancel()
+            self._embed([(text, future)])
+            return future
+        future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def stop(self) -> None:
+        """Answer the queries already queued, then end the worker thread.
+
+        The thread holds the model; without this it would stay loaded for the
+        life of the process.
+        """
+        self._stopped = True
+        self._queue.put(_STOP)
+
+    def _collect(self) -> list | None:
+        """The next batch, or None once the queue reaches the stop marker."""
+        item = self._queue.get()
+        if item is _STOP:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                # Drain whatever is already queued even once the wait window has passed
+                item = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is _STOP:
+                # Run this batch first; the next _collect sees the marker again
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while (collected := self._collect()) is not None:
+            # Callers that gave up (cancelled futures) are dropped before the forward pass
+            batch = [(text, f) for text, f in collected if f.set_running_or_notify_cancel()]
+            if batch:
+                self._embed(batch)
+        # Queries that raced with stop() landed behind the marker
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and item[1].set_running_or_notify_cancel():
+                self._embed([item])
+
+    def _embed(self, batch: list) -> None:
+        try:
+            # embed_documents == embed_query for the symmetric models we support
+            texts = [text for text, _ in batch]
+            if self._local:
+                with cpu_slot("embedding"):
+                    vectors = self.embeddings.embed_documents(texts)
+            else:
+                vectors = self.embeddings.embed_documents(texts)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+
+class BatchedEmbeddings(Embeddings):
+    """Embeddings whose query path goes through a shared :class:`QueryBatcher`.
+
+    Document embedding (ingestion) bypasses the batcher.
+    """
+
+    def __init__(self, embeddings, batcher: QueryBatcher | None = None) -> None:
+        self.embeddings = embeddings
+        self.batcher = batcher or QueryBatcher(
+            embeddings, settings.query_batch_wait_ms, settings.query_batch_size
+        )
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.batcher.submit(text).result()
+
+    async def aembed_query(self, text: str) -> list[float]:
+        # Await the batch without parking a thread on it
+        return await asyncio.wrap_future(self.batcher.submit(text))
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        futures = [self.batcher.submit(text) for text in texts]
+        return [f.result() for f in futures]
+
+
+_batched: dict[int, BatchedEmbeddings] = {}
+_batched_lock = threading.Lock()
+
+
+def get_query_embeddings(provider: str | None = None, model: str | None = None) -> BatchedEmbeddings:
+    """Shared batching wrapper around the registry model; use it for every query-time embed."""
+    from .embeddings import get_embeddings
+
+    base = get_embeddings(provider, model)
+    with _batched_lock:
+        # Keyed by the model instance so an unloaded/reloaded model gets a fresh batcher
+        wrapper = _batched.get(id(base))
+        if wrapper is None or wrapper.embeddings is not base:
+            wrapper = BatchedEmbeddings(base)
+            _batched[id(base)] = wrapper
+        return wrapper
+
+
+def release_query_embeddings(base) -> None:
+    """Stop and forget the batcher wrapping ``base``; called when the model is unloaded."""
+    with _batched_lock:
+        wrapper = _batched.pop(id(base), None)
+    if wrapper is not None:
+        wrapper.batcher.stop()
+
+
+__all__ = ["BatchedEmbeddings", "QueryBatcher", "get_query_embeddings", "release_query_embeddings"]
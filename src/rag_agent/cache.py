@@ -0,0 +1,284 @@
+"""Answer caches for the RAG agent."""
+from __future__ import annotations
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from .config import settings
+
+FOREVER = float("inf")
+
+# Freshness class per tool: seconds an answer that used the tool stays valid.
+# Knowledge-base answers are keyed by index version, so "forever" means until the
+# next re-ingest. Tools missing here (plots, files, generated images) have side
+# effects and their answers are never cached.
+TOOL_TTLS: dict[str, float] = {
+    "search_knowledge_base": FOREVER,
+    "calculator": FOREVER,
+    "translate_content": FOREVER,
+    "create_chart": FOREVER,
+    "get_map_location": 7 * 86400,
+    "get_images": 86400,
+    "find_relevant_links": 3600,
+    "web_search": 3600,
+    "search_products": 3600,
+    "find_hotels": 3600,
+    "get_global_news": 900,
+    "get_weather": 600,
+    "get_stock_price": 30,
+}
+
+# Tools whose output only changes when the knowledge base is re-ingested (or never)
+STATIC_TOOLS = frozenset(tool for tool, ttl in TOOL_TTLS.items() if ttl == FOREVER)
+
+# Tools whose output depends on the index alone. Answers that used only these can be
+# reused for a paraphrased question; anything parameter-sensitive ("15% of 230" vs
+# "15% of 240", French vs Spanish) or tool-free stays in the exact-key ResponseCache.
+SEMANTIC_TOOLS = frozenset({"search_knowledge_base"})
+
+
+def answer_ttl(tools_used) -> float:
+    """Seconds an answer stays fresh: the shortest TTL among the tools it used (0 = don't cache)."""
+    return min((TOOL_TTLS.get(tool, 0) for tool in tools_used), default=FOREVER)
+
+
+def is_semantically_cacheable(tools_used) -> bool:
+    """True when an answer came from the knowledge base alone and may serve similar questions."""
+    tools_used = tuple(tools_used)
+    return bool(tools_used) and all(tool in SEMANTIC_TOOLS for tool in tools_used)
+
+
+@dataclass(slots=True)
+class CacheEntry:
+    question: str
+    answer: str
+    index_version: str
+    tools_used: tuple[str, ...]
+    created_at: float
+
+
+class SemanticCache:
+    """Answer cache keyed by question-embedding similarity.
+
+    Question vectors are L2-normalised and kept in a small inner-product FAISS
+    index, so a lookup returns a previous answer whose question has cosine
+    similarity above ``threshold``. Entries expire after ``ttl`` seconds and the
+    oldest are evicted once ``max_entries`` is exceeded.
+    """
+
+    def __init__(self, embeddings, threshold: float, ttl: float, max_entries: int) -> None:
+        self.embeddings = embeddings
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: list[CacheEntry] = []
+        self._vectors: np.ndarray | None = None
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype="float32")
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _rebuild(self) -> None:
+        import faiss
+
+        if self._vectors is None or not len(self._entries):
+            self._index = None
+            return
+        self._index = faiss.IndexFlatIP(self._vectors.shape[1])
+        self._index.add(self._vectors)
+
+    def _expired(self, entry: CacheEntry, now: float) -> bool:
+        return self.ttl > 0 and now - entry.created_at > self.ttl
+
+    def lookup(self, question: str, index_version: str) -> str | None:
+        """Return a cached answer for a semantically equivalent question, if any."""
+        vector = self._embed(question)
+        now = time.time()
+        with self._lock:
+            # A different width means the embedding model changed; nothing cached is comparable
+            if self._index is None or self._index.d != vector.shape[0]:
+                return None
+            k = min(4, len(self._entries))
+            scores, ids = self._index.search(vector.reshape(1, -1), k)
+            for score, idx in zip(scores[0], ids[0]):
+                if idx < 0 or score < self.threshold:
+                    break
+                entry = self._entries[idx]
+                if entry.index_version == index_version and not self._expired(entry, now):
+                    return entry.answer
+        return None
+
+    def store(self, question: str, answer: str, index_version: str, tools_used) -> bool:
+        """Cache an answer if it came from the knowledge base alone. Returns True if stored."""
+        tools_used = tuple(tools_used)
+        if not answer or not is_semantically_cacheable(tools_used):
+            return False
+
+        vector = self._embed(question)
+        now = time.time()
+        with self._lock:
+            entry = CacheEntry(question, answer, index_version, tools_used, now)
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                entries, vectors = [entry], vector.reshape(1, -1)
+            else:
+                entries, vectors = self._entries + [entry], np.vstack([self._vectors, vector])
+
+            # Evict expired entries, entries for older indexes, then the oldest beyond capacity
+            keep = [
+                i for i, entry in enumerate(entries)
+                if not self._expired(entry, now) and entry.index_version == index_version
+            ]
+            keep = keep[-self.max_entries:]
+            self._entries = [entries[i] for i in keep]
+            self._vectors = vectors[keep]
+            self._rebuild()
+        return True
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries = []
+            self._vectors = None
+            self._index = None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class ResponseCache:
+    """Persistent exact-match answer cache in SQLite, shared by every process on the host.
+
+    Keyed by the normalised question, a hash of the chat history, the index
+    version and the chat model, so a hit is only possible for the same
+    conversation state against the same knowledge base. Each answer expires
+    according to the freshness class of the tools it used (see :data:`TOOL_TTLS`).
+    """
+
+    def __init__(self, path: Path, max_entries: int, default_ttl: float) -> None:
+        self.path = Path(path)
+        self.max_entries = max_entries
+        # Applies to answers that used no tools (pure model knowledge); 0 = don't cache them
+        self.default_ttl = default_ttl
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False, timeout=5)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, question TEXT, answer TEXT, tools TEXT,"
+                " created_at REAL, expires_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_created ON responses (created_at)")
+
+    @staticmethod
+    def key(question: str, history, index_version: str, model: str) -> str:
+        normalised = " ".join(question.lower().split())
+        turns = [(getattr(m, "type", ""), str(getattr(m, "content", m))) for m in history or []]
+        history_hash = hashlib.sha256(json.dumps(turns).encode("utf-8")).hexdigest()
+        payload = json.dumps([normalised, history_hash, index_version, model])
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def lookup(self, question: str, history, index_version: str, model: str) -> str | None:
+        key = self.key(question, history, index_version, model)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT answer, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        answer, expires_at = row
+        if expires_at is not None and expires_at < time.time():
+            return None
+        return answer
+
+    def store(self, question: str, answer: str, history, index_version: str, model: str, tools_used) -> bool:
+        """Cache an answer for as long as its freshest tool allows. Returns True if stored."""
+        tools_used = tuple(tools_used)
+        ttl = answer_ttl(tools_used) if tools_used else self.default_ttl
+        if not answer or ttl <= 0:
+            return False
+        now = time.time()
+        expires_at = None if ttl == FOREVER else now + ttl
+        key = self.key(question, history, index_version, model)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, question, answer, json.dumps(tools_used), now, expires_at),
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (now,))
+            self._conn.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY created_at DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+        return True
+
+    def clear(self) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+
+_response_cache: ResponseCache | None = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache | None:
+    """Return the process-wide persistent response cache, or None if disabled."""
+    global _response_cache
+    if not settings.response_cache:
+        return None
+    with _response_cache_lock:
+        if _response_cache is None:
+            _response_cache = ResponseCache(
+                settings.response_cache_path,
+                max_entries=settings.response_cache_size,
+                default_ttl=settings.response_cache_ttl,
+            )
+        return _response_cache
+
+
+_semantic_cache: SemanticCache | None = None
+_semantic_cache_lock = threading.Lock()
+
+
+def get_semantic_cache(embeddings) -> SemanticCache | None:
+    """Return the process-wide semantic cache (shared by every agent), or None if disabled."""
+    global _semantic_cache
+    if not settings.semantic_cache:
+        return None
+    with _semantic_cache_lock:
+        if _semantic_cache is None:
+            _semantic_cache = SemanticCache(
+                embeddings,
+                threshold=settings.semantic_cache_threshold,
+                ttl=settings.semantic_cache_ttl,
+                max_entries=settings.semantic_cache_size,
+            )
+        return _semantic_cache
+
+
+__all__ = [
+    "ResponseCache",
+    "SEMANTIC_TOOLS",
+    "STATIC_TOOLS",
+    "SemanticCache",
+    "TOOL_TTLS",
+    "answer_ttl",
+    "get_response_cache",
+    "get_semantic_cache",
+    "is_semantically_cacheable",
+]
@@ -0,0 +1,92 @@
+"""Cooperative cancellation for agent runs.
+
+A :class:`CancellationToken` is created per request and cancelled by whoever
+gives up on the answer (the Streamlit Stop button, a disconnecting MCP client).
+The agent checks it at every step. :class:`CancellationHandler` raises
+:class:`Cancelled` from the next LLM token, model call or tool start, which
+aborts the model stream and skips tool calls that have not started.
+:meth:`RAGAgent.astream` also races the token, so a run that is still waiting
+for its first token stops right away.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Callable
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class Cancelled(Exception):
+    """Raised inside an agent run once its token has been cancelled."""
+
+
+class CancellationToken:
+    """Thread-safe, one-way flag with callbacks, shared by a request and its caller."""
+
+    def __init__(self) -> None:
+        self._event = threading.Event()
+        self._callbacks: list[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self) -> None:
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                logger.debug("Cancellation callback failed: %s", e)
+
+    def on_cancel(self, callback: Callable[[], None]) -> Callable[[], None]:
+        """Run ``callback`` on cancellation (now, if already cancelled). Returns an unsubscribe function."""
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(callback)
+
+                def unsubscribe() -> None:
+                    with self._lock:
+                        if callback in self._callbacks:
+                            self._callbacks.remove(callback)
+
+                return unsubscribe
+        callback()
+        return lambda: None
+
+    def raise_if_cancelled(self) -> None:
+        if self._event.is_set():
+            raise Cancelled("cancelled")
+
+
+class CancellationHandler(BaseCallbackHandler):
+    """Callback that aborts the run it is attached to once ``token`` is cancelled."""
+
+    raise_error = True  # Let Cancelled propagate instead of being logged and ignored
+
+    def __init__(self, token: CancellationToken) -> None:
+        self.token = token
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self.token.raise_if_cancelled()
+
+    def on_tool_start(self, serialized, input_str: str, **kwargs) -> None:
+        self.token.raise_if_cancelled()
+
+
+__all__ = ["CancellationHandler", "CancellationToken", "Cancelled"]
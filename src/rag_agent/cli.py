@@ -4,7 +4,7 @@ from __future__ import annotations
 import argparse
 import os
 
-from .ingest import ingest_documents
+from .ingest import ingest_documents, ingest_files
 from .rag_agent import RAGAgent
 
 # Suppress tokenizers parallelism warning
@@ -20,12 +20,71 @@ def handle_ingest(_: argparse.Namespace) -> None:
     print(f"Vector store saved under {location}")
 
 
+def handle_add(args: argparse.Namespace) -> None:
+    count = ingest_files(args.paths)
+    print(f"Indexed {count} chunks as a new segment")
+
+
+def handle_compact(_: argparse.Namespace) -> None:
+    from .embeddings import get_embeddings
+    from .manifest import index_dir
+    from .segments import SegmentedIndex, is_segmented
+
+    data_dir = index_dir()
+    if not is_segmented(data_dir):
+        print("Index is not segmented; nothing to compact.")
+        return
+    index = SegmentedIndex(data_dir, get_embeddings())
+    print("Compacted segments" if index.compact() else "Nothing to compact")
+
+
+def handle_migrate(args: argparse.Namespace) -> None:
+    from .migration import migrate, migration_status
+
+    if args.status:
+        status = migration_status()
+        if not status:
+            print("No migration in progress.")
+            return
+        print(
+            f"{status.get('status')}: {status.get('done', 0)}/{status.get('total')} chunks "
+            f"re-embedded with {status.get('provider')}/{status.get('model')}"
+        )
+        if status.get("error"):
+            print(f"Error: {status['error']}")
+        return
+    manifest = migrate(args.provider, args.model)
+    if manifest:
+        print(f"Index now embedded with {manifest['embedding_provider']}/{manifest['embedding_model']}")
+    else:
+        print("Index already uses that model; nothing to migrate.")
+
+
+def handle_serve(args: argparse.Namespace) -> None:
+    from .retrieval_service import serve
+
+    serve(args.host, args.port)
+
+
+def handle_embed_report(args: argparse.Namespace) -> None:
+    from .embeddings_onnx import compare_with_pytorch
+    from .ingest import load_documents, split_documents
+
+    texts = None
+    try:
+        texts = [c.page_content for c in split_documents(load_documents())][: args.limit]
+    except FileNotFoundError:
+        pass  # No local docs: fall back to the built-in sample sentences
+    for key, value in compare_with_pytorch(texts).items():
+        print(f"{key:>16}: {value}")
+
+
 def handle_chat(args: argparse.Namespace) -> None:
     agent = RAGAgent()
     
     # Debug: Check what's being retrieved
     if args.debug:
-        docs = agent.vector_store.similarity_search(args.question, k=4)
+        docs = agent.retrieve(args.question, k=4)
         print("\n--- RETRIEVED DOCUMENTS ---")
         for i, doc in enumerate(docs, 1):
             print(f"\n[{i}] {doc.page_content[:200]}...")
@@ -44,6 +103,32 @@ def build_parser() -> argparse.ArgumentParser:
     ingest_parser = subparsers.add_parser("ingest", help="Ingest local docs into FAISS")
     ingest_parser.set_defaults(func=handle_ingest)
 
+    add_parser = subparsers.add_parser("add", help="Index specific files as a new segment")
+    add_parser.add_argument("paths", nargs="+", help="Files to (re-)index")
+    add_parser.set_defaults(func=handle_add)
+
+    compact_parser = subparsers.add_parser("compact", help="Merge index segments and purge deletes")
+    compact_parser.set_defaults(func=handle_compact)
+
+    migrate_parser = subparsers.add_parser(
+        "migrate", help="Re-embed the index with the configured model while the old one keeps serving"
+    )
+    migrate_parser.add_argument("--provider", default=None, help="Target provider (default RAG_EMBEDDING_PROVIDER)")
+    migrate_parser.add_argument("--model", default=None, help="Target model (default the configured model)")
+    migrate_parser.add_argument("--status", action="store_true", help="Show progress of a running migration")
+    migrate_parser.set_defaults(func=handle_migrate)
+
+    serve_parser = subparsers.add_parser("serve", help="Run the shared retrieval service")
+    serve_parser.add_argument("--host", default=None, help="Bind address (default RAG_RETRIEVAL_SERVICE_HOST)")
+    serve_parser.add_argument("--port", type=int, default=None, help="Port (default RAG_RETRIEVAL_SERVICE_PORT)")
+    serve_parser.set_defaults(func=handle_serve)
+
+    report_parser = subparsers.add_parser(
+        "embed-report", help="Compare ONNX embedding speed and quality against PyTorch"
+    )
+    report_parser.add_argument("--limit", type=int, default=256, help="Max chunks to embed")
+    report_parser.set_defaults(func=handle_embed_report)
+
     chat_parser = subparsers.add_parser("chat", help="Ask a question against the index")
     chat_parser.add_argument("question", type=str, help="User question")
     chat_parser.add_argument("--debug", action="store_true", help="Show retrieved documents")
@@ -53,6 +138,9 @@ def build_parser() -> argparse.ArgumentParser:
 
 
 def main() -> None:
+    from .resources import configure_cpu
+
+    configure_cpu()
     parser = build_parser()
     args = parser.parse_args()
     args.func(args)
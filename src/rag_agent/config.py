@@ -21,6 +21,30 @@ class Settings:
     hf_embedding_model: str = os.getenv(
         "RAG_HF_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"
     )
+    # OpenAI embeddings client: concurrency and rate budgets for bulk (re-)ingests
+    openai_embed_base_url: str = os.getenv(
+        "RAG_OPENAI_EMBED_BASE_URL", os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    )
+    openai_embed_batch_size: int = int(os.getenv("RAG_OPENAI_EMBED_BATCH_SIZE", "256"))
+    openai_embed_concurrency: int = int(os.getenv("RAG_OPENAI_EMBED_CONCURRENCY", "4"))
+    openai_embed_rpm: int = int(os.getenv("RAG_OPENAI_EMBED_RPM", "3000"))
+    openai_embed_tpm: int = int(os.getenv("RAG_OPENAI_EMBED_TPM", "1000000"))
+    # ONNX Runtime backend (RAG_EMBEDDING_PROVIDER=onnx)
+    onnx_cache_dir: Path = Path(os.getenv("RAG_ONNX_CACHE_DIR", "artifacts/onnx"))
+    onnx_quantize: bool = os.getenv("RAG_ONNX_QUANTIZE", "true").lower() == "true"
+    onnx_threads: int = int(os.getenv("RAG_ONNX_THREADS", "0"))
+    # CPU budget shared by embeddings, vision (BLIP) and plotting
+    cpu_threads: int = int(os.getenv("RAG_CPU_THREADS", str(os.cpu_count() or 1)))
+    torch_threads: int = int(os.getenv("RAG_TORCH_THREADS", str(max(1, (os.cpu_count() or 1) // 2))))
+    # Bulk ingestion embedding: batch size and worker processes for local models
+    embed_batch_size: int = int(os.getenv("RAG_EMBED_BATCH_SIZE", "64"))
+    embed_workers: int = int(os.getenv("RAG_EMBED_WORKERS", str(min(4, os.cpu_count() or 1))))
+    # Reduced-dimension index (0 keeps full-width vectors)
+    embedding_dim: int = int(os.getenv("RAG_EMBEDDING_DIM", "0"))
+    embedding_reduction: str = os.getenv("RAG_EMBEDDING_REDUCTION", "pca").lower()
+    # Re-rank candidates with the full-width vectors stored next to a reduced index
+    embedding_rescore: bool = os.getenv("RAG_EMBEDDING_RESCORE", "true").lower() == "true"
+    rescore_factor: int = int(os.getenv("RAG_RESCORE_FACTOR", "3"))
     chat_provider: str = os.getenv("RAG_CHAT_PROVIDER", "groq").lower()
     chat_model: str = os.getenv("RAG_CHAT_MODEL", "openai/gpt-oss-20b")
     groq_base_url: str = os.getenv("GROQ_BASE_URL", "")
@@ -28,8 +52,68 @@ class Settings:
     groq_max_tokens: int = int(os.getenv("GROQ_MAX_TOKENS", "8192"))
     groq_top_p: float = float(os.getenv("GROQ_TOP_P", "1.0"))
     groq_reasoning_effort: str = os.getenv("GROQ_REASONING_EFFORT", "medium")
+    # Shared keep-alive HTTP pool used by every chat model client
+    llm_max_connections: int = int(os.getenv("RAG_LLM_MAX_CONNECTIONS", "20"))
+    llm_keepalive_expiry: float = float(os.getenv("RAG_LLM_KEEPALIVE_EXPIRY", "60"))
+    # Model router circuit breakers: consecutive failures or EWMA error rate that open a circuit
+    llm_circuit_failures: int = int(os.getenv("RAG_LLM_CIRCUIT_FAILURES", "3"))
+    llm_circuit_error_rate: float = float(os.getenv("RAG_LLM_CIRCUIT_ERROR_RATE", "0.5"))
+    llm_circuit_cooldown: float = float(os.getenv("RAG_LLM_CIRCUIT_COOLDOWN", "30"))
+    # Hedged requests: race the next model if no first token arrives within this many ms (0 = off)
+    llm_hedge_after_ms: float = float(os.getenv("RAG_LLM_HEDGE_AFTER_MS", "0"))
+    # Offline chat model for load tests (RAG_CHAT_PROVIDER=mock)
+    mock_script: str = os.getenv("RAG_MOCK_SCRIPT", "")
+    mock_latency_ms: float = float(os.getenv("RAG_MOCK_LATENCY_MS", "200"))
+    mock_tokens_per_sec: float = float(os.getenv("RAG_MOCK_TOKENS_PER_SEC", "50"))
+    mock_response_tokens: int = int(os.getenv("RAG_MOCK_RESPONSE_TOKENS", "60"))
     chunk_size: int = int(os.getenv("RAG_CHUNK_SIZE", "800"))
     chunk_overlap: int = int(os.getenv("RAG_CHUNK_OVERLAP", "120"))
+    # Parent-document retrieval: search small child chunks, answer with parent windows
+    parent_retrieval: bool = os.getenv("RAG_PARENT_RETRIEVAL", "true").lower() == "true"
+    parent_chunk_size: int = int(os.getenv("RAG_PARENT_CHUNK_SIZE", "2000"))
+    parent_chunk_overlap: int = int(os.getenv("RAG_PARENT_CHUNK_OVERLAP", "200"))
+    child_chunk_size: int = int(os.getenv("RAG_CHILD_CHUNK_SIZE", "300"))
+    child_chunk_overlap: int = int(os.getenv("RAG_CHILD_CHUNK_OVERLAP", "50"))
+    child_fetch_multiplier: int = int(os.getenv("RAG_CHILD_FETCH_MULTIPLIER", "4"))
+    # Index layout: "faiss" (single index, full rewrite on save) or "segmented" (LSM-style)
+    index_layout: str = os.getenv("RAG_INDEX_LAYOUT", "faiss").lower()
+    compaction_interval: float = float(os.getenv("RAG_COMPACTION_INTERVAL", "300"))
+    compaction_min_segments: int = int(os.getenv("RAG_COMPACTION_MIN_SEGMENTS", "4"))
+    # Shared retrieval service (one embedding model + index per host)
+    retrieval_service_url: str = os.getenv("RAG_RETRIEVAL_SERVICE_URL", "")
+    retrieval_service_host: str = os.getenv("RAG_RETRIEVAL_SERVICE_HOST", "127.0.0.1")
+    retrieval_service_port: int = int(os.getenv("RAG_RETRIEVAL_SERVICE_PORT", "8765"))
+    query_batch_wait_ms: float = float(os.getenv("RAG_QUERY_BATCH_WAIT_MS", "5"))
+    query_batch_size: int = int(os.getenv("RAG_QUERY_BATCH_SIZE", "32"))
+    # Async entry points (MCP): bounded retrieval pool and per-request timeouts (seconds)
+    retrieval_max_workers: int = int(os.getenv("RAG_RETRIEVAL_WORKERS", "4"))
+    retrieval_timeout: float = float(os.getenv("RAG_RETRIEVAL_TIMEOUT", "15"))
+    request_timeout: float = float(os.getenv("RAG_REQUEST_TIMEOUT", "120"))
+    # Semantic answer cache (only answers drawn from the knowledge base alone)
+    semantic_cache: bool = os.getenv("RAG_SEMANTIC_CACHE", "true").lower() == "true"
+    semantic_cache_threshold: float = float(os.getenv("RAG_SEMANTIC_CACHE_THRESHOLD", "0.95"))
+    semantic_cache_ttl: float = float(os.getenv("RAG_SEMANTIC_CACHE_TTL", "86400"))
+    semantic_cache_size: int = int(os.getenv("RAG_SEMANTIC_CACHE_SIZE", "512"))
+    # Conversation memory: recent turns kept verbatim, older ones folded into a summary
+    memory_turns: int = int(os.getenv("RAG_MEMORY_TURNS", "6"))
+    memory_summary_tokens: int = int(os.getenv("RAG_MEMORY_SUMMARY_TOKENS", "400"))
+    # Persistent exact-match response cache; per-tool freshness TTLs live in cache.TOOL_TTLS
+    response_cache: bool = os.getenv("RAG_RESPONSE_CACHE", "true").lower() == "true"
+    response_cache_path: Path = Path(os.getenv("RAG_RESPONSE_CACHE_PATH", "artifacts/cache/responses.sqlite3"))
+    response_cache_size: int = int(os.getenv("RAG_RESPONSE_CACHE_SIZE", "5000"))
+    response_cache_ttl: float = float(os.getenv("RAG_RESPONSE_CACHE_TTL", "604800"))
+    # Identical history-free questions in flight at once share a single agent run
+    single_flight: bool = os.getenv("RAG_SINGLE_FLIGHT", "true").lower() == "true"
+    # Bind only the tools a query needs (keyword rules + embedding match on tool descriptions)
+    tool_routing: bool = os.getenv("RAG_TOOL_ROUTING", "true").lower() == "true"
+    tool_routing_threshold: float = float(os.getenv("RAG_TOOL_ROUTING_THRESHOLD", "0.3"))
+    tool_routing_top_k: int = int(os.getenv("RAG_TOOL_ROUTING_TOP_K", "3"))
+    tool_routing_max: int = int(os.getenv("RAG_TOOL_ROUTING_MAX", "5"))
+    # Tool calls from one agent step run concurrently on a shared pool
+    tool_max_workers: int = int(os.getenv("RAG_TOOL_WORKERS", "8"))
+    tool_timeout: float = float(os.getenv("RAG_TOOL_TIMEOUT", "30"))
+    # Per-answer latency records kept for the debug panel and MCP metrics resource
+    metrics_history: int = int(os.getenv("RAG_METRICS_HISTORY", "200"))
 
     def ensure_dirs(self) -> None:
         self.data_dir.mkdir(parents=True, exist_ok=True)
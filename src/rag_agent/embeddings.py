@@ -1,13 +1,15 @@
 """Embedding factory utilities."""
 from __future__ import annotations
 
+import gc
 import os
+import threading
 import warnings
 
 from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_openai import OpenAIEmbeddings 
 
 from .config import settings
+from .resources import configure_cpu, cpu_slot
 
 # Fix for PyTorch meta tensor issue
 os.environ.setdefault("TRANSFORMERS_NO_ADVISORY_WARNINGS", "1")
@@ -19,15 +21,32 @@ warnings.filterwarnings("ignore", message=".*torch.classes.*")
 warnings.filterwarnings("ignore", category=UserWarning, module="torch")
 
 
-def get_embeddings():
-    """Return an embeddings instance based on configured provider."""
-    provider = settings.embedding_provider
+# Process-wide registry: loading sentence-transformers weights costs seconds of CPU
+# and hundreds of MB, so every caller shares one instance per provider/model.
+_registry: dict[tuple[str, str], object] = {}
+_registry_lock = threading.Lock()
+
+
+def resolve_embedding_model(provider: str | None = None, model: str | None = None) -> tuple[str, str]:
+    """The ``(provider, model)`` pair a call would load, filling in configured defaults."""
+    provider = (provider or settings.embedding_provider).lower()
+    if model is None:
+        local = provider in ("huggingface", "onnx")
+        model = settings.hf_embedding_model if local else settings.embedding_model
+    return provider, model
+
+
+def _build_embeddings(provider: str, model: str):
+    # Size torch/OpenMP pools before the first model loads
+    configure_cpu()
     if provider == "openai":
-        return OpenAIEmbeddings(model=settings.embedding_model)
+        from .embeddings_openai import ConcurrentOpenAIEmbeddings
+
+        return ConcurrentOpenAIEmbeddings(model=model)
     if provider == "huggingface":
         # Configure to use CPU and avoid meta tensor issues
         return HuggingFaceEmbeddings(
-            model_name=settings.hf_embedding_model,
+            model_name=model,
             model_kwargs={
                 "device": "cpu",
                 "trust_remote_code": True,
@@ -36,10 +55,151 @@ def get_embeddings():
                 "normalize_embeddings": False,
             },
         )
+    if provider == "onnx":
+        from .embeddings_onnx import OnnxEmbeddings
+
+        return OnnxEmbeddings(
+            model_name=model,
+            batch_size=settings.embed_batch_size,
+            threads=settings.onnx_threads or settings.torch_threads,
+        )
     raise ValueError(
-        "Unsupported embedding provider. Use 'openai' or 'huggingface'. "
+        "Unsupported embedding provider. Use 'openai', 'huggingface' or 'onnx'. "
         "Override via RAG_EMBEDDING_PROVIDER env var."
     )
 
 
-__all__ = ["get_embeddings"]
+def get_embeddings(provider: str | None = None, model: str | None = None):
+    """Return the shared embeddings instance for a provider/model (configured ones by default)."""
+    key = resolve_embedding_model(provider, model)
+    with _registry_lock:
+        # Built under the lock so concurrent first calls don't load the model twice
+        if key not in _registry:
+            _registry[key] = _build_embeddings(*key)
+        return _registry[key]
+
+
+def warmup_embeddings(provider: str | None = None, model: str | None = None):
+    """Load the model and run one forward pass so the first real query is not slow."""
+    embeddings = get_embeddings(provider, model)
+    embeddings.embed_query("warmup")
+    return embeddings
+
+
+def unload_embeddings(provider: str | None = None, model: str | None = None) -> int:
+    """Drop cached models (all of them when no provider/model is given). Returns the count."""
+    from .batching import release_query_embeddings
+
+    with _registry_lock:
+        if provider is None and model is None:
+            keys = list(_registry)
+        else:
+            keys = [k for k in [resolve_embedding_model(provider, model)] if k in _registry]
+        removed = [_registry.pop(key) for key in keys]
+    # Their query batchers' threads would otherwise keep the weights alive
+    while removed:
+        release_query_embeddings(removed.pop())
+    gc.collect()
+    return len(keys)
+
+
+# Below this many texts, spinning up worker processes (each loading the model) costs more than it saves
+_MIN_TEXTS_FOR_POOL = 512
+
+
+def _sentence_transformer(embeddings):
+    """The underlying SentenceTransformer of a HuggingFaceEmbeddings, if any."""
+    client = getattr(embeddings, "_client", None) or getattr(embeddings, "client", None)
+    return client if client is not None and hasattr(client, "encode_multi_process") else None
+
+
+def is_local_model(embeddings) -> bool:
+    """True when embedding runs on this host's CPU (and so needs a CPU budget slot)."""
+    return _sentence_transformer(embeddings) is not None or hasattr(embeddings, "session")
+
+
+def embed_documents_bulk(texts: list[str], embeddings=None) -> list[list[float]]:
+    """Embed a large corpus for ingestion.
+
+    Texts are sorted by length so each batch pads to similar lengths, embedded in
+    ``settings.embed_batch_size`` batches, and spread across a sentence-transformers
+    multi-process pool of ``settings.embed_workers`` workers when the provider is a
+    local model. Vectors are returned in the original order.
+    """
+    embeddings = embeddings or get_embeddings()
+    if not texts:
+        return []
+    if getattr(embeddings, "handles_batching", False):
+        # Remote clients batch and parallelise requests themselves
+        return embeddings.embed_documents(texts)
+
+    with cpu_slot("ingest") as threads:
+        return _embed_sorted(texts, embeddings, threads)
+
+
+def _embed_sorted(texts: list[str], embeddings, threads: int) -> list[list[float]]:
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    sorted_texts = [texts[i] for i in order]
+    batch_size = max(1, settings.embed_batch_size)
+
+    model = _sentence_transformer(embeddings)
+    workers = min(settings.embed_workers, threads)
+    if model is not None and workers > 1 and len(texts) >= _MIN_TEXTS_FOR_POOL:
+        encode_kwargs = getattr(embeddings, "encode_kwargs", {}) or {}
+        # Split the ingest share between workers so the pool doesn't oversubscribe the host
+        previous = os.environ.get("OMP_NUM_THREADS")
+        os.environ["OMP_NUM_THREADS"] = str(max(1, threads // workers))
+        try:
+            pool = model.start_multi_process_pool(["cpu"] * workers)
+        finally:
+            if previous is None:
+                os.environ.pop("OMP_NUM_THREADS", None)
+            else:
+                os.environ["OMP_NUM_THREADS"] = previous
+        try:
+            vectors = model.encode_multi_process(
+                sorted_texts,
+                pool,
+                batch_size=batch_size,
+                normalize_embeddings=encode_kwargs.get("normalize_embeddings", False),
+            ).tolist()
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        vectors = []
+        for start in range(0, len(sorted_texts), batch_size):
+            vectors.extend(embeddings.embed_documents(sorted_texts[start:start + batch_size]))
+
+    result: list = [None] * len(texts)
+    for position, original_index in enumerate(order):
+        result[original_index] = vectors[position]
+    return result
+
+
+def _model_bytes(embeddings) -> int | None:
+    if hasattr(embeddings, "weights_bytes"):
+        return embeddings.weights_bytes
+    client = _sentence_transformer(embeddings)
+    if client is None:
+        return None  # Remote providers hold no weights
+    return sum(p.numel() * p.element_size() for p in client.parameters())
+
+
+def embedding_memory_report() -> list[dict]:
+    """Loaded embedding models and the memory their weights occupy."""
+    with _registry_lock:
+        items = list(_registry.items())
+    return [
+        {"provider": provider, "model": model, "weights_bytes": _model_bytes(embeddings)}
+        for (provider, model), embeddings in items
+    ]
+
+
+__all__ = [
+    "embed_documents_bulk",
+    "embedding_memory_report",
+    "get_embeddings",
+    "resolve_embedding_model",
+    "unload_embeddings",
+    "warmup_embeddings",
+]
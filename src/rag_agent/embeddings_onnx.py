@@ -0,0 +1,270 @@
+"""ONNX Runtime embedding backend for CPU inference, with optional int8 quantization.
+
+Selected with ``RAG_EMBEDDING_PROVIDER=onnx``. The configured Hugging Face model
+(``RAG_HF_EMBEDDING_MODEL``) is exported to ONNX once, optionally quantized
+with dynamic int8 weights, and cached under ``RAG_ONNX_CACHE_DIR``. Pooling,
+maximum sequence length and normalization follow the model's
+sentence-transformers configuration, so vectors match the ``huggingface``
+provider.
+"""
+from __future__ import annotations
+
+import json
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_SAMPLE_TEXTS = [
+    "What is the refund policy for annual subscriptions?",
+    "The quarterly report shows revenue growth of twelve percent.",
+    "How do I reset my password if I no longer have access to my email?",
+    "Photosynthesis converts light energy into chemical energy in plants.",
+    "The project deadline was moved to the end of next month.",
+    "Install the package with pip and set the API key in the .env file.",
+    "Tokyo is the capital of Japan and its most populous city.",
+    "Employees may work remotely up to three days per week.",
+]
+
+
+def _export(model_name: str, target_dir: Path) -> None:
+    """Export a Hugging Face encoder to ONNX with dynamic batch and sequence axes."""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    logger.info("Exporting %s to ONNX (one-time)...", model_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name).eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            str(target_dir / "model.onnx"),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    tokenizer.save_pretrained(str(target_dir))
+
+
+def _model_json(model_name: str, name: str) -> dict | list | None:
+    """A JSON file from a local model directory or the Hub, or ``None`` if the model has none."""
+    path = Path(model_name) / name
+    try:
+        if not path.exists():
+            from huggingface_hub import hf_hub_download
+
+            path = Path(hf_hub_download(model_name, name))
+        return json.loads(path.read_text(encoding="utf-8"))
+    except Exception:
+        return None
+
+
+# Order sentence-transformers concatenates pooled outputs in when several modes are on
+_POOLING_MODES = (
+    ("pooling_mode_cls_token", "cls"),
+    ("pooling_mode_max_tokens", "max"),
+    ("pooling_mode_mean_tokens", "mean"),
+    ("pooling_mode_mean_sqrt_len_tokens", "mean_sqrt_len"),
+    ("pooling_mode_lasttoken", "lasttoken"),
+)
+
+
+def _sentence_config(model_name: str) -> dict:
+    """Pooling modes, max sequence length and normalization, as sentence-transformers applies them.
+
+    Read from ``modules.json``, the Pooling module's ``config.json`` and
+    ``sentence_bert_config.json``. Plain encoders without them get mean pooling,
+    the model's position limit and no normalization.
+    """
+    modules = _model_json(model_name, "modules.json") or []
+    pooling_dir = next((m["path"] for m in modules if m.get("type", "").endswith(".Pooling")), "1_Pooling")
+    pooling = _model_json(model_name, f"{pooling_dir}/config.json") or {"pooling_mode_mean_tokens": True}
+    if pooling.get("pooling_mode_weightedmean_tokens"):
+        raise ValueError(f"{model_name} uses weighted-mean pooling, which the ONNX backend does not support")
+
+    max_length = (_model_json(model_name, "sentence_bert_config.json") or {}).get("max_seq_length")
+    if max_length is None:
+        from transformers import AutoConfig
+
+        max_length = getattr(AutoConfig.from_pretrained(model_name), "max_position_embeddings", 512)
+    return {
+        "pooling": [mode for key, mode in _POOLING_MODES if pooling.get(key)] or ["mean"],
+        "max_seq_length": int(max_length),
+        "normalize": any(m.get("type", "").endswith(".Normalize") for m in modules),
+    }
+
+
+def _quantize(source_dir: Path, target_dir: Path) -> None:
+    """Dynamic int8 quantization of the exported weights."""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    target_dir.mkdir(parents=True, exist_ok=True)
+    quantize_dynamic(
+        str(source_dir / "model.onnx"),
+        str(target_dir / "model.onnx"),
+        weight_type=QuantType.QInt8,
+    )
+    for path in source_dir.iterdir():
+        if path.name != "model.onnx":
+            shutil.copy2(path, target_dir / path.name)
+
+
+class OnnxEmbeddings(Embeddings):
+    """Sentence embeddings computed with ONNX Runtime, pooled like sentence-transformers."""
+
+    def __init__(
+        self,
+        model_name: str,
+        cache_dir: Path | None = None,
+        quantize: bool | None = None,
+        threads: int | None = None,
+        batch_size: int = 32,
+        normalize: bool | None = None,
+    ) -> None:
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        self.model_name = model_name
+        self.quantize = settings.onnx_quantize if quantize is None else quantize
+        self.batch_size = batch_size
+
+        base_dir = Path(cache_dir or settings.onnx_cache_dir) / model_name.replace("/", "__")
+        fp32_dir = base_dir / "fp32"
+        if not (fp32_dir / "model.onnx").exists():
+            _export(model_name, fp32_dir)
+        config_path = base_dir / "sentence_config.json"
+        if not config_path.exists():
+            config_path.write_text(json.dumps(_sentence_config(model_name), indent=2), encoding="utf-8")
+        config = json.loads(config_path.read_text(encoding="utf-8"))
+        self.pooling = config["pooling"]
+        self.max_seq_length = config["max_seq_length"]
+        # Unset: normalize only if the model's own pipeline does (a Normalize module)
+        self.normalize = config["normalize"] if normalize is None else normalize
+        model_dir = fp32_dir
+        if self.quantize:
+            model_dir = base_dir / "int8"
+            if not (model_dir / "model.onnx").exists():
+                _quantize(fp32_dir, model_dir)
+        self.model_path = model_dir / "model.onnx"
+
+        options = ort.SessionOptions()
+        threads = settings.onnx_threads if threads is None else threads
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(
+            str(self.model_path), sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(str(model_dir))
+
+    @property
+    def weights_bytes(self) -> int:
+        return self.model_path.stat().st_size
+
+    def _pool(self, hidden: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        mask = attention_mask[..., None].astype(hidden.dtype)
+        lengths = np.clip(mask.sum(axis=1), 1e-9, None)
+        outputs = []
+        for mode in self.pooling:
+            if mode == "cls":
+                outputs.append(hidden[:, 0])
+            elif mode == "max":
+                outputs.append(np.where(mask > 0, hidden, -1e9).max(axis=1))
+            elif mode == "mean":
+                outputs.append((hidden * mask).sum(axis=1) / lengths)
+            elif mode == "mean_sqrt_len":
+                outputs.append((hidden * mask).sum(axis=1) / np.sqrt(lengths))
+            elif mode == "lasttoken":
+                last = attention_mask.sum(axis=1).astype("int64") - 1
+                outputs.append(hidden[np.arange(len(hidden)), last])
+        return np.concatenate(outputs, axis=1)
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        encoded = self.tokenizer(
+            texts, padding=True, truncation=True, max_length=self.max_seq_length, return_tensors="np"
+        )
+        inputs = {k: v.astype("int64") for k, v in encoded.items() if k in self._input_names}
+        hidden = self.session.run(None, inputs)[0]
+
+        pooled = self._pool(hidden, encoded["attention_mask"])
+        if self.normalize:
+            pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return pooled
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        vectors = []
+        for start in range(0, len(texts), self.batch_size):
+            vectors.append(self._encode(texts[start:start + self.batch_size]))
+        return np.vstack(vectors).tolist() if vectors else []
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._encode([text])[0].tolist()
+
+
+def compare_with_pytorch(texts: list[str] | None = None, top_k: int = 5) -> dict:
+    """Quality-vs-speed report of the ONNX backend against the PyTorch (sentence-transformers) path.
+
+    Reports wall time for both, per-text cosine similarity between the two
+    vectors, and how often each text's top-k neighbours agree.
+    """
+    from .embeddings import get_embeddings
+
+    texts = texts or _SAMPLE_TEXTS
+    model = settings.hf_embedding_model
+    torch_embeddings = get_embeddings("huggingface", model)
+    onnx_embeddings = get_embeddings("onnx", model)
+
+    def timed(embeddings) -> tuple[np.ndarray, float]:
+        embeddings.embed_documents(texts[:2])  # Warm up before timing
+        start = time.perf_counter()
+        vectors = np.asarray(embeddings.embed_documents(texts), dtype="float32")
+        return vectors, time.perf_counter() - start
+
+    reference, torch_seconds = timed(torch_embeddings)
+    candidate, onnx_seconds = timed(onnx_embeddings)
+
+    reference /= np.clip(np.linalg.norm(reference, axis=1, keepdims=True), 1e-12, None)
+    candidate /= np.clip(np.linalg.norm(candidate, axis=1, keepdims=True), 1e-12, None)
+    cosine = (reference * candidate).sum(axis=1)
+
+    k = min(top_k, len(texts) - 1)
+    overlap = 1.0
+    if k > 0:
+        def neighbours(vectors: np.ndarray) -> np.ndarray:
+            sims = vectors @ vectors.T
+            np.fill_diagonal(sims, -np.inf)
+            return np.argsort(-sims, axis=1)[:, :k]
+
+        ref_nn, cand_nn = neighbours(reference), neighbours(candidate)
+        overlap = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(ref_nn, cand_nn)]))
+
+    return {
+        "model": model,
+        "quantized": onnx_embeddings.quantize,
+        "texts": len(texts),
+        "pytorch_seconds": round(torch_seconds, 4),
+        "onnx_seconds": round(onnx_seconds, 4),
+        "speedup": round(torch_seconds / onnx_seconds, 2) if onnx_seconds else None,
+        "mean_cosine": round(float(cosine.mean()), 4),
+        "min_cosine": round(float(cosine.min()), 4),
+        f"top{k}_overlap": round(overlap, 4),
+    }
+
+
+__all__ = ["OnnxEmbeddings", "compare_with_pytorch"]
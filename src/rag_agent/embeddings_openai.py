@@ -0,0 +1,151 @@
+"""Concurrent, rate-limit-aware client for the OpenAI embeddings API.
+
+Used for ``RAG_EMBEDDING_PROVIDER=openai``. Batches are sent concurrently
+under requests-per-minute and tokens-per-minute budgets, 429/5xx responses
+are retried with backoff, and vectors always come back in input order.
+Point ``RAG_OPENAI_EMBED_BASE_URL`` at a local stand-in server
+(e.g. ``scripts/fake_openai_embeddings.py``) to test without the hosted API.
+"""
+from __future__ import annotations
+
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+def _token_counter(model: str):
+    """Exact token counts via tiktoken when installed, else a ~4 chars/token estimate."""
+    try:
+        import tiktoken
+
+        encoding = tiktoken.encoding_for_model(model)
+        return lambda text: len(encoding.encode(text))
+    except Exception:
+        return lambda text: max(1, len(text) // 4)
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, shared by all worker threads."""
+
+    def __init__(self, rpm: int, tpm: int) -> None:
+        self.rpm = max(1, rpm)
+        self.tpm = max(1, tpm)
+        self._requests = float(self.rpm)
+        self._tokens = float(self.tpm)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    def acquire(self, tokens: int) -> None:
+        """Block until one request and ``tokens`` tokens fit in the budget."""
+        tokens = min(tokens, self.tpm)  # A single oversized batch must still be sendable
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max(
+                    (1 - self._requests) * 60 / self.rpm,
+                    (tokens - self._tokens) * 60 / self.tpm,
+                )
+            time.sleep(max(wait, 0.01))
+
+
+class ConcurrentOpenAIEmbeddings(Embeddings):
+    """OpenAI-compatible ``/embeddings`` client with concurrency and rate limiting."""
+
+    # Tells embed_documents_bulk to hand over the whole corpus in one call
+    handles_batching = True
+
+    def __init__(
+        self,
+        model: str,
+        api_key: str | None = None,
+        base_url: str | None = None,
+        batch_size: int | None = None,
+        concurrency: int | None = None,
+        rpm: int | None = None,
+        tpm: int | None = None,
+        max_retries: int = 6,
+    ) -> None:
+        import httpx
+
+        self.model = model
+        self.batch_size = batch_size or settings.openai_embed_batch_size
+        self.concurrency = concurrency or settings.openai_embed_concurrency
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(rpm or settings.openai_embed_rpm, tpm or settings.openai_embed_tpm)
+        self._count_tokens = _token_counter(model)
+        api_key = api_key or os.getenv("OPENAI_API_KEY", "")
+        self._http = httpx.Client(
+            base_url=(base_url or settings.openai_embed_base_url).rstrip("/"),
+            headers={"Authorization": f"Bearer {api_key}"} if api_key else {},
+            timeout=60.0,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+
+    def _post_batch(self, batch: list[str]) -> list[list[float]]:
+        import httpx
+
+        tokens = sum(self._count_tokens(text) for text in batch)
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(tokens)
+            try:
+                response = self._http.post("/embeddings", json={"model": self.model, "input": batch})
+            except httpx.TransportError as e:
+                # Dropped connections and timeouts are as transient as a 503
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                logger.warning("Embedding request failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+                continue
+            if response.status_code not in _RETRY_STATUS or attempt == self.max_retries:
+                break
+            retry_after = response.headers.get("retry-after")
+            try:
+                delay = float(retry_after)
+            except (TypeError, ValueError):
+                delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+            logger.warning("Embedding request got %s, retrying in %.1fs", response.status_code, delay)
+            time.sleep(delay)
+        response.raise_for_status()
+        # The API returns an index per item; sort so vectors line up with the batch
+        data = sorted(response.json()["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) == 1:
+            return self._post_batch(batches[0])
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="openai-embed") as pool:
+            # map() yields in submission order, so the output order matches the input
+            results = pool.map(self._post_batch, batches)
+            return [vector for batch in results for vector in batch]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._post_batch([text])[0]
+
+
+__all__ = ["ConcurrentOpenAIEmbeddings", "RateLimiter"]
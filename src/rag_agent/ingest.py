@@ -6,11 +6,15 @@ from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_community.vectorstores import FAISS
 
 from .config import settings
-from .embeddings import get_embeddings
+from .embeddings import embed_documents_bulk, get_embeddings, resolve_embedding_model
+from .manifest import VERSIONS_DIR, index_dir, read_manifest, write_manifest
+from .reduction import PROJECTION_NAME, FullVectors, ProjectedEmbeddings, Projector, for_index
+from .retrieval import PARENT_STORE_NAME, ParentStore, split_parent_child
+from .segments import SEGMENTS_DIR, SEGMENTS_MANIFEST, SegmentedIndex
 
 
-def load_documents() -> list:
-    """Load documents from the configured data directory based on file extension."""
+def load_documents(paths: list | None = None) -> list:
+    """Load documents from the configured data directory (or explicit paths) based on file extension."""
     settings.ensure_dirs()
     documents = []
     
@@ -30,7 +34,8 @@ def load_documents() -> list:
     )
 
     from tqdm import tqdm
-    all_files = list(settings.data_dir.rglob("*"))
+    from pathlib import Path
+    all_files = [Path(p) for p in paths] if paths else list(settings.data_dir.rglob("*"))
     
     # Filter for files only
     all_files = [f for f in all_files if f.is_file()]
@@ -83,20 +88,139 @@ def split_documents(documents: list) -> list:
     return splitter.split_documents(documents)
 
 
-def build_vector_store(chunks: list) -> FAISS:
-    embeddings = get_embeddings()
-    return FAISS.from_documents(chunks, embeddings)
+def build_vector_store(
+    chunks: list,
+    projector: Projector | None = None,
+    fit_projection: bool = False,
+    embeddings=None,
+) -> tuple[FAISS, FullVectors | None]:
+    """Embed chunks (with the configured model unless ``embeddings`` is given) and build a FAISS index.
+
+    Vectors are reduced with ``projector`` when given, or with a projection fitted
+    on these vectors when ``fit_projection`` is set and ``RAG_EMBEDDING_DIM`` > 0.
+    The store's embedding function then carries the projector, and the
+    full-width vectors are returned alongside it for re-scoring.
+    """
+    embeddings = embeddings or get_embeddings()
+    texts = [chunk.page_content for chunk in chunks]
+    vectors = embed_documents_bulk(texts, embeddings)
+    if projector is None and fit_projection and settings.embedding_dim > 0:
+        projector = Projector.fit(vectors, settings.embedding_dim, settings.embedding_reduction)
+    full_vectors = None
+    if projector is not None:
+        full_vectors = vectors
+        vectors = projector.transform(vectors).tolist()
+        embeddings = ProjectedEmbeddings(embeddings, projector)
+    store = FAISS.from_embeddings(
+        list(zip(texts, vectors)),
+        embeddings,
+        metadatas=[chunk.metadata for chunk in chunks],
+    )
+    return store, FullVectors.for_store(store, full_vectors) if full_vectors is not None else None
+
+
+def chunk_documents(documents: list) -> tuple[list, dict | None]:
+    """Split documents into indexable chunks (and parent windows when enabled)."""
+    if settings.parent_retrieval:
+        # Index small child chunks, keep the larger parent windows in a side docstore
+        return split_parent_child(documents)
+    return split_documents(documents), None
 
 
 def ingest_documents() -> str:
     """Run the end-to-end ingestion pipeline and persist FAISS index."""
+    import shutil
+
     documents = load_documents()
-    chunks = split_documents(documents)
-    vector_store = build_vector_store(chunks)
-    vector_store.save_local(str(settings.vector_dir), index_name="echomindai")
+    chunks, parents = chunk_documents(documents)
+    vector_store, full_vectors = build_vector_store(chunks, fit_projection=True)
+
+    projection_dim = None
+    if isinstance(vector_store.embeddings, ProjectedEmbeddings):
+        vector_store.embeddings.projector.save(settings.vector_dir)
+        projection_dim = vector_store.embeddings.projector.dim
+    else:
+        (settings.vector_dir / PROJECTION_NAME).unlink(missing_ok=True)
+
+    if settings.index_layout == "segmented":
+        index = SegmentedIndex(settings.vector_dir, vector_store.embeddings)
+        index.reset()
+        index.add_documents(chunks, store=vector_store, full_vectors=full_vectors)
+    else:
+        vector_store.save_local(str(settings.vector_dir), index_name="echomindai")
+        if full_vectors is not None:
+            full_vectors.save(settings.vector_dir)
+        else:
+            FullVectors.remove(settings.vector_dir)
+        # Loaders prefer segments when present, so drop them on a single-index rebuild
+        (settings.vector_dir / SEGMENTS_MANIFEST).unlink(missing_ok=True)
+        shutil.rmtree(settings.vector_dir / SEGMENTS_DIR, ignore_errors=True)
+
+    parent_path = settings.vector_dir / PARENT_STORE_NAME
+    if parents is not None:
+        ParentStore(parent_path).write(parents)
+    elif parent_path.exists():
+        # A stale parent store would expand chunks from the previous index
+        parent_path.unlink()
+    provider, model = resolve_embedding_model()
+    write_manifest(
+        settings.vector_dir,
+        parent_retrieval=parents is not None,
+        layout=settings.index_layout,
+        embedding_dim=projection_dim,
+        embedding_provider=provider,
+        embedding_model=model,
+    )
+    # The rebuilt index lives in place; indexes left by earlier model migrations are dead
+    shutil.rmtree(settings.vector_dir / VERSIONS_DIR, ignore_errors=True)
     return str(settings.vector_dir)
 
 
+def ingest_files(paths: list) -> int:
+    """Incrementally (re-)index specific files as a new segment. Returns the chunk count.
+
+    Chunks previously indexed from the same files are tombstoned, so re-adding an
+    edited file replaces its old content once the compactor runs.
+    """
+    if settings.index_layout != "segmented":
+        raise ValueError(
+            "Incremental ingestion requires the segmented index layout. "
+            "Set RAG_INDEX_LAYOUT=segmented and run a full ingest first."
+        )
+    documents = load_documents(paths)
+    chunks, parents = chunk_documents(documents)
+
+    # New segments must match the model the index was built with, even mid-migration,
+    # and go into the directory that model's index lives in
+    manifest = read_manifest(settings.vector_dir)
+    data_dir = index_dir(settings.vector_dir, manifest)
+    provider, model = resolve_embedding_model(manifest.get("embedding_provider"), manifest.get("embedding_model"))
+    embeddings = get_embeddings(provider, model)
+    index = SegmentedIndex(data_dir, for_index(embeddings, data_dir))
+    for source in {doc.metadata.get("source") for doc in documents}:
+        if source:
+            index.delete_source(source)
+    # New segments reuse the projection learned at the last full ingest
+    projector = Projector.load(data_dir)
+    if chunks:
+        store, full_vectors = build_vector_store(chunks, projector=projector, embeddings=embeddings)
+        index.add_documents(chunks, store=store, full_vectors=full_vectors)
+
+    if parents:
+        ParentStore(data_dir / PARENT_STORE_NAME).write(parents, append=True)
+    write_manifest(
+        settings.vector_dir,
+        index_dir=manifest.get("index_dir"),
+        parent_retrieval=settings.parent_retrieval,
+        layout="segmented",
+        embedding_dim=projector.dim if projector else None,
+        embedding_provider=provider,
+        embedding_model=model,
+    )
+    return len(chunks)
+
+
 __all__ = [
     "ingest_documents",
+    "ingest_files",
 ]
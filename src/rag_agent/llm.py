@@ -1,14 +1,95 @@
-"""LLM factory utilities."""
+"""LLM factory utilities.
+
+Chat clients are cached process-wide and share one keep-alive HTTP connection
+pool, so every agent (one per Streamlit session, plus MCP and the CLI) borrows
+the same clients instead of building its own fallback chain and paying fresh
+TLS handshakes.
+"""
 from __future__ import annotations
 
+import threading
+
 from langchain_groq import ChatGroq
 
 from .config import settings
+from .routing import ModelRouter
+
+_models: dict[tuple, object] = {}
+_chains: dict[str, object] = {}
+# Re-entrant: building a chain builds (and registers) its member clients
+_registry_lock = threading.RLock()
+_http_clients: tuple | None = None
+
+
+def get_http_clients() -> tuple:
+    """Keep-alive ``(httpx.Client, httpx.AsyncClient)`` pair shared by every chat client."""
+    global _http_clients
+    with _registry_lock:
+        if _http_clients is None:
+            import httpx
+
+            limits = httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_connections,
+                keepalive_expiry=settings.llm_keepalive_expiry,
+            )
+            timeout = httpx.Timeout(settings.request_timeout, connect=10.0)
+            _http_clients = (
+                httpx.Client(limits=limits, timeout=timeout),
+                httpx.AsyncClient(limits=limits, timeout=timeout),
+            )
+        return _http_clients
+
+
+def _build_chat_model(provider: str, model: str, kwargs: dict):
+    if provider == "groq":
+        http_client, http_async_client = get_http_clients()
+        return ChatGroq(model=model, http_client=http_client, http_async_client=http_async_client, **kwargs)
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+
+        http_client, http_async_client = get_http_clients()
+        return ChatOpenAI(model=model, http_client=http_client, http_async_client=http_async_client, **kwargs)
+    if provider == "google":
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        # Uses its own gRPC transport, so only the client itself is shared
+        return ChatGoogleGenerativeAI(model=model, **kwargs)
+    if provider == "mock":
+        from .llm_mock import MockChatModel
+
+        return MockChatModel(model_name=model, **kwargs)
+    raise ValueError(
+        f"Unsupported chat provider '{provider}'. Use 'groq', 'google', 'openai', or 'mock'."
+    )
+
+
+def get_chat_model(provider: str, model: str, **kwargs):
+    """Return the shared chat client for a provider, model and parameter set."""
+    key = (provider, model, tuple(sorted((name, repr(value)) for name, value in kwargs.items())))
+    with _registry_lock:
+        if key not in _models:
+            _models[key] = _build_chat_model(provider, model, kwargs)
+        return _models[key]
 
 
 def get_llm():
-    """Return a chat model instance based on configured provider."""
+    """Return the shared chat model router (primary plus fallbacks) for the configured provider."""
     provider = settings.chat_provider
+    with _registry_lock:
+        # Not cached on failure, so a missing API key is reported on every call
+        if provider not in _chains:
+            _chains[provider] = _build_llm(provider)
+        return _chains[provider]
+
+
+def _router(*models) -> ModelRouter:
+    hedge_ms = settings.llm_hedge_after_ms
+    # Opt-in: hedging trades some duplicate tokens for a tighter tail latency
+    return ModelRouter.from_models(*models, hedge_after=hedge_ms / 1000 if hedge_ms > 0 else None)
+
+
+def _build_llm(provider: str):
     if provider == "groq":
         # Verify Groq API key is set
         import os
@@ -36,27 +117,21 @@ def get_llm():
         }
         
         # 1. Primary Model (Configured in .env or default)
-        primary_model = ChatGroq(model=settings.chat_model, **base_kwargs)
+        primary_model = get_chat_model("groq", settings.chat_model, **base_kwargs)
         
         # 2. Fallbacks (Hardcoded High-Performance Alternatives)
         fallbacks = [
-            ChatGroq(model="mixtral-8x7b-32768", **base_kwargs), # Excellent alternative
-            ChatGroq(model="llama3-70b-8192", **base_kwargs),    # Strong redundant
-            ChatGroq(model="llama3-8b-8192", **base_kwargs),     # Fast backup
-            ChatGroq(model="gemma2-9b-it", **base_kwargs),       # Emergency backup
+            get_chat_model("groq", "mixtral-8x7b-32768", **base_kwargs), # Excellent alternative
+            get_chat_model("groq", "llama3-70b-8192", **base_kwargs),    # Strong redundant
+            get_chat_model("groq", "llama3-8b-8192", **base_kwargs),     # Fast backup
+            get_chat_model("groq", "gemma2-9b-it", **base_kwargs),       # Emergency backup
         ]
         
-        # 3. Create Fallback Chain
-        # This will automatically catch 429/5xx errors and try the next model
-        llm_with_fallbacks = primary_model.with_fallbacks(
-            fallbacks,
-            exceptions_to_handle=(ValueError, Exception) # Catch-all for API errors
-        )
-        
-        return llm_with_fallbacks
+        # 3. Route across the chain
+        # Failing or rate-limited models are skipped for a cooldown instead of retried first
+        return _router(primary_model, *fallbacks)
     if provider == "google":
         import os
-        from langchain_google_genai import ChatGoogleGenerativeAI
         
         api_key = os.getenv("GOOGLE_API_KEY")
         if not api_key:
@@ -70,8 +145,9 @@ def get_llm():
             
         # 1. Primary Model (Use stable 001/002 versions or 'gemini-pro')
         # Trying 'gemini-1.5-flash-latest' which translates to the latest valid endpoint
-        primary_model = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash-latest", 
+        primary_model = get_chat_model(
+            "google",
+            "gemini-1.5-flash-latest",
             google_api_key=api_key,
             temperature=settings.groq_temperature,
             convert_system_message_to_human=True
@@ -79,15 +155,14 @@ def get_llm():
         
         # 2. Fallbacks (Safe bets)
         fallbacks = [
-            ChatGoogleGenerativeAI(model="gemini-pro", google_api_key=api_key),
-            ChatGoogleGenerativeAI(model="gemini-1.0-pro", google_api_key=api_key),
+            get_chat_model("google", "gemini-pro", google_api_key=api_key),
+            get_chat_model("google", "gemini-1.0-pro", google_api_key=api_key),
         ]
         
-        return primary_model.with_fallbacks(fallbacks)
+        return _router(primary_model, *fallbacks)
 
     if provider == "openai":
         import os
-        from langchain_openai import ChatOpenAI
         
         api_key = os.getenv("OPENAI_API_KEY")
         if not api_key:
@@ -100,8 +175,9 @@ def get_llm():
             raise ValueError("OpenAI API Key not found. Set OPENAI_API_KEY.")
 
         # 1. Primary Model (GPT-4o is the current standard)
-        primary_model = ChatOpenAI(
-            model="gpt-4o",
+        primary_model = get_chat_model(
+            "openai",
+            "gpt-4o",
             openai_api_key=api_key,
             temperature=settings.groq_temperature,
             streaming=True
@@ -109,16 +185,29 @@ def get_llm():
         
         # 2. Fallbacks
         fallbacks = [
-            ChatOpenAI(model="gpt-4-turbo", openai_api_key=api_key),
-            ChatOpenAI(model="gpt-3.5-turbo", openai_api_key=api_key),
+            get_chat_model("openai", "gpt-4-turbo", openai_api_key=api_key),
+            get_chat_model("openai", "gpt-3.5-turbo", openai_api_key=api_key),
         ]
         
-        return primary_model.with_fallbacks(fallbacks)
+        return _router(primary_model, *fallbacks)
+
+    if provider == "mock":
+        from .llm_mock import load_script
+
+        # Routed like a live model, so circuit and hedging overhead is part of the benchmark
+        return _router(get_chat_model(
+            "mock",
+            "mock",
+            script=load_script(),
+            latency=settings.mock_latency_ms / 1000,
+            tokens_per_second=settings.mock_tokens_per_sec,
+            response_tokens=settings.mock_response_tokens,
+        ))
 
     raise ValueError(
-        f"Unsupported chat provider '{provider}'. Use 'groq', 'google', or 'openai'."
+        f"Unsupported chat provider '{provider}'. Use 'groq', 'google', 'openai', or 'mock'."
     )
 
 
-__all__ = ["get_llm"]
+__all__ = ["get_chat_model", "get_http_clients", "get_llm"]
 
@@ -0,0 +1,175 @@
+"""Deterministic offline chat model for load tests and benchmarks.
+
+Selected with ``RAG_CHAT_PROVIDER=mock``. :class:`MockChatModel` streams
+scripted or templated answers at a configurable first-token latency and token
+rate, and can emit tool calls, so the whole agent, UI and MCP stack can be
+exercised without an API key or quota.
+
+A script (``RAG_MOCK_SCRIPT``) is a JSON list of rules, tried in order::
+
+    [
+      {"match": "weather", "tool_calls": [{"name": "get_weather", "args": {"city": "Paris"}}]},
+      {"match": "weather", "content": "Here is the forecast: {tool_output:.300}"},
+      {"content": "Mock answer to \\"{question}\\". {filler}"}
+    ]
+
+``match`` is a case-insensitive regex on the latest user question (omit it to
+match anything). A rule with ``tool_calls`` applies only before any tool has
+answered in the current turn, and only for tools the agent has bound. Content
+and string arguments are templates with ``{question}``, ``{tool}``,
+``{tool_output}`` and ``{filler}`` (``RAG_MOCK_RESPONSE_TOKENS`` filler words).
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import re
+import time
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream, generate_from_stream
+from langchain_core.messages import AIMessageChunk, BaseMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGenerationChunk
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from .config import settings
+
+# Without a script: search the knowledge base once, then answer from it
+DEFAULT_SCRIPT = [
+    {"tool_calls": [{"name": "search_knowledge_base", "args": {"query": "{question}"}}]},
+    {"content": "Mock answer to \"{question}\". {filler}"},
+]
+
+_FILLER = (
+    "The quick brown fox jumps over the lazy dog while the agent gathers context, "
+    "weighs the sources and composes a grounded answer for the user."
+).split()
+
+
+def load_script(path: str | Path | None = None) -> list[dict]:
+    path = path or settings.mock_script
+    if not path:
+        return DEFAULT_SCRIPT
+    return json.loads(Path(path).read_text(encoding="utf-8"))
+
+
+def _text(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else json.dumps(message.content)
+
+
+def _usage(prompt_tokens: int, completion_tokens: int) -> dict:
+    return {
+        "input_tokens": prompt_tokens,
+        "output_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class _Template(dict):
+    def __missing__(self, key: str) -> str:
+        return "{" + key + "}"
+
+
+class MockChatModel(BaseChatModel):
+    """Chat model that plays back a script instead of calling an API."""
+
+    model_name: str = "mock"
+    script: list[dict] = DEFAULT_SCRIPT
+    latency: float = 0.2  # Seconds before the first token
+    tokens_per_second: float = 50.0  # 0 streams without delay
+    response_tokens: int = 60
+
+    @property
+    def _llm_type(self) -> str:
+        return "mock"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    def bind_tools(self, tools, **kwargs):
+        return self.bind(tools=[convert_to_openai_tool(tool) for tool in tools], **kwargs)
+
+    def _plan(self, messages: list[BaseMessage], tools: list[dict] | None) -> tuple[str, list[dict]]:
+        """Pick the script rule for this call: (content, tool_calls)."""
+        turn_start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=0)
+        question = _text(messages[turn_start]) if messages else ""
+        results = [m for m in messages[turn_start:] if isinstance(m, ToolMessage)]
+        bound = {tool["function"]["name"] for tool in tools or []}
+
+        fields = _Template(
+            question=question,
+            tool=getattr(results[-1], "name", "") if results else "",
+            tool_output=_text(results[-1]) if results else "",
+            filler=" ".join(_FILLER[i % len(_FILLER)] for i in range(self.response_tokens)),
+        )
+        for rule in self.script:
+            if rule.get("match") and not re.search(rule["match"], question, re.IGNORECASE):
+                continue
+            if rule.get("tool_calls"):
+                calls = [call for call in rule["tool_calls"] if call["name"] in bound]
+                if results or not calls:
+                    continue
+                return "", [
+                    {
+                        "name": call["name"],
+                        "args": {
+                            key: value.format_map(fields) if isinstance(value, str) else value
+                            for key, value in call.get("args", {}).items()
+                        },
+                    }
+                    for call in calls
+                ]
+            return rule.get("content", "").format_map(fields), []
+        return fields["filler"], []
+
+    def _chunks(self, messages, tools) -> Iterator[AIMessageChunk]:
+        content, tool_calls = self._plan(messages, tools)
+        prompt_tokens = sum(len(_text(m).split()) for m in messages)
+        # Ids are derived from the conversation, so reruns of a benchmark are identical
+        seed = hashlib.sha1("".join(_text(m) for m in messages).encode("utf-8")).hexdigest()[:12]
+        if tool_calls:
+            yield AIMessageChunk(
+                content="",
+                tool_call_chunks=[
+                    {"name": call["name"], "args": json.dumps(call["args"]), "id": f"call_{seed}_{i}", "index": i}
+                    for i, call in enumerate(tool_calls)
+                ],
+                usage_metadata=_usage(prompt_tokens, len(tool_calls)),
+            )
+            return
+        words = re.findall(r"\S+\s*", content) or [""]
+        for i, word in enumerate(words):
+            # Usage rides on the last chunk, as with real streaming providers
+            usage = _usage(prompt_tokens, len(words)) if i == len(words) - 1 else None
+            yield AIMessageChunk(content=word, usage_metadata=usage)
+
+    def _delay(self, index: int) -> float:
+        if index == 0:
+            return self.latency
+        return 1.0 / self.tokens_per_second if self.tokens_per_second > 0 else 0.0
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        for index, chunk in enumerate(self._chunks(messages, kwargs.get("tools"))):
+            time.sleep(self._delay(index))
+            if run_manager:
+                run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        for index, chunk in enumerate(self._chunks(messages, kwargs.get("tools"))):
+            await asyncio.sleep(self._delay(index))
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk.content, chunk=ChatGenerationChunk(message=chunk))
+            yield ChatGenerationChunk(message=chunk)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        return generate_from_stream(self._stream(messages, stop, run_manager, **kwargs))
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs: Any):
+        return await agenerate_from_stream(self._astream(messages, stop, run_manager, **kwargs))
+
+
+__all__ = ["DEFAULT_SCRIPT", "MockChatModel", "load_script"]
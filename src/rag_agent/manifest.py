@@ -0,0 +1,86 @@
+"""Index manifest: a small JSON file describing the persisted vector store."""
+from __future__ import annotations
+
+import json
+import time
+import uuid
+from pathlib import Path
+
+from .config import settings
+
+MANIFEST_NAME = "echomindai_manifest.json"
+# Complete indexes built by model migrations, one directory per generation
+VERSIONS_DIR = "versions"
+
+
+def read_manifest(vector_dir: Path | None = None) -> dict:
+    """Return the manifest for an index directory, or an empty dict if there is none."""
+    path = Path(vector_dir or settings.vector_dir) / MANIFEST_NAME
+    if not path.exists():
+        return {}
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(vector_dir: Path | None = None, **fields) -> dict:
+    """Write a fresh manifest with a new index version, merging in extra fields."""
+    directory = Path(vector_dir or settings.vector_dir)
+    directory.mkdir(parents=True, exist_ok=True)
+    manifest = {
+        "version": uuid.uuid4().hex[:12],
+        "created_at": time.time(),
+        **fields,
+    }
+    tmp_path = directory / (MANIFEST_NAME + ".tmp")
+    tmp_path.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    tmp_path.replace(directory / MANIFEST_NAME)
+    return manifest
+
+
+def index_dir(vector_dir: Path | None = None, manifest: dict | None = None) -> Path:
+    """Directory holding the live index files (vectors, projection, parent store).
+
+    A model migration builds a complete index under ``versions/<id>/`` and
+    publishes it by naming that directory in the manifest, so readers switch
+    with the manifest's single atomic rename. Indexes built in place resolve to
+    ``vector_dir`` itself. Pass ``manifest`` to resolve against a manifest
+    already read, so the directory matches its version and model.
+    """
+    directory = Path(vector_dir or settings.vector_dir)
+    manifest = read_manifest(directory) if manifest is None else manifest
+    return directory / manifest["index_dir"] if manifest.get("index_dir") else directory
+
+
+def index_version(vector_dir: Path | None = None) -> str:
+    """Identifier that changes whenever the index is rebuilt (used to invalidate caches)."""
+    directory = Path(vector_dir or settings.vector_dir)
+    version = read_manifest(directory).get("version")
+    if version:
+        return str(version)
+    # Indexes built before manifests existed: fall back to the FAISS file mtime
+    index_file = directory / "echomindai.faiss"
+    if index_file.exists():
+        return f"mtime-{int(index_file.stat().st_mtime)}"
+    return "empty"
+
+
+def index_embedding_model(vector_dir: Path | None = None) -> tuple[str | None, str | None]:
+    """``(provider, model)`` the index was embedded with; ``(None, None)`` if not recorded.
+
+    Queries must use this model, not the configured one, so an index keeps
+    working after ``RAG_HF_EMBEDDING_MODEL`` changes until it is migrated.
+    """
+    manifest = read_manifest(vector_dir)
+    return manifest.get("embedding_provider"), manifest.get("embedding_model")
+
+
+__all__ = [
+    "VERSIONS_DIR",
+    "index_dir",
+    "index_embedding_model",
+    "index_version",
+    "read_manifest",
+    "write_manifest",
+]
@@ -0,0 +1,130 @@
+"""Bounded conversation memory with a rolling summary of older turns.
+
+Every agent turn sends the chat history to the model, so an unbounded history
+makes each turn slower and more expensive than the last. :class:`SummarizingMemory`
+keeps the most recent ``RAG_MEMORY_TURNS`` exchanges verbatim and folds older
+ones into a summary capped at ``RAG_MEMORY_SUMMARY_TOKENS``. Folding runs on a
+background executor after the answer has been returned, so it never sits on the
+critical path of a turn.
+"""
+from __future__ import annotations
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+
+from .config import settings
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Update the existing summary with the new exchanges below. Keep names, numbers, decisions, "
+    "open questions and user preferences; drop pleasantries. Write at most {words} words of "
+    "plain prose and return only the updated summary.\n\n"
+    "Existing summary:\n{summary}\n\nNew exchanges:\n{transcript}"
+)
+
+# Shared by every session; summaries are short single LLM calls
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="memory")
+
+
+class SummarizingMemory(BaseChatMessageHistory):
+    """Chat history holding the last ``max_turns`` exchanges plus a summary of the rest."""
+
+    def __init__(self, llm=None, max_turns: int | None = None, summary_tokens: int | None = None) -> None:
+        self.llm = llm
+        self.max_turns = max(1, max_turns or settings.memory_turns)
+        self.summary_tokens = summary_tokens or settings.memory_summary_tokens
+        self.summary = ""
+        self._recent: list[BaseMessage] = []
+        self._lock = threading.Lock()
+        self._compacting = False
+        self._generation = 0  # Bumped by clear() so an in-flight fold is discarded
+
+    @property
+    def messages(self) -> list[BaseMessage]:
+        """Snapshot sent to the model: the summary (if any) followed by the recent turns."""
+        with self._lock:
+            recent = list(self._recent)
+            summary = self.summary
+        if not summary:
+            return recent
+        return [SystemMessage(content=f"Summary of the earlier conversation:\n{summary}")] + recent
+
+    def add_message(self, message: BaseMessage) -> None:
+        with self._lock:
+            self._recent.append(message)
+            overflow = self._overflow()
+            start = bool(overflow) and self.llm is not None and not self._compacting
+            if start:
+                self._compacting = True
+        if start:
+            _executor.submit(self._compact)
+        elif overflow and self.llm is None:
+            # No model to summarise with: just keep the window bounded
+            with self._lock:
+                del self._recent[:overflow]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._recent = []
+            self.summary = ""
+            self._generation += 1
+
+    def _overflow(self) -> int:
+        """Number of leading messages older than the last ``max_turns`` user turns."""
+        seen = 0
+        for index in range(len(self._recent) - 1, -1, -1):
+            if isinstance(self._recent[index], HumanMessage):
+                seen += 1
+                if seen == self.max_turns:
+                    return index
+        return 0
+
+    def _compact(self) -> None:
+        """Fold overflowing turns into the summary (runs on the memory executor)."""
+        try:
+            while True:
+                with self._lock:
+                    count = self._overflow()
+                    if not count:
+                        return
+                    folded = self._recent[:count]
+                    summary = self.summary
+                    generation = self._generation
+                try:
+                    summary = self._summarise(summary, folded)
+                except Exception as e:
+                    # Keep latency flat even if summarising fails: drop the turns, keep the old summary
+                    logger.warning("Conversation summary failed, dropping %d old messages: %s", count, e)
+                with self._lock:
+                    if generation != self._generation:
+                        continue
+                    # Only appends happen concurrently, so the folded messages are still at the front
+                    del self._recent[:count]
+                    self.summary = summary
+        finally:
+            with self._lock:
+                self._compacting = False
+
+    def _summarise(self, summary: str, messages: list[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}" for m in messages
+        )
+        prompt = _SUMMARY_PROMPT.format(
+            words=max(20, self.summary_tokens * 3 // 4),
+            summary=summary or "(none yet)",
+            transcript=transcript,
+        )
+        result = self.llm.invoke([HumanMessage(content=prompt)])
+        text = str(getattr(result, "content", result)).strip()
+        # Hard cap (~4 characters per token) in case the model ignores the length instruction
+        limit = self.summary_tokens * 4
+        return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + " ..."
+
+
+__all__ = ["SummarizingMemory"]
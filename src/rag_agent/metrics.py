@@ -0,0 +1,233 @@
+"""Per-answer latency breakdown: time to first token, token rate, tool and retrieval timings.
+
+Every ``ask``/``ask_stream``/``aask`` run gets a :class:`MetricsHandler`
+callback. It fills in a :class:`RunMetrics` record, and the finished record is
+kept in a process-wide :class:`MetricsRegistry`. The Streamlit debug panel and
+the MCP ``echomindai://metrics`` resource read from that registry.
+"""
+from __future__ import annotations
+
+import contextvars
+import threading
+import time
+from collections import deque
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from .config import settings
+
+# Run being measured in the current context; tools and retrieval record into it
+_current_run: contextvars.ContextVar[RunMetrics | None] = contextvars.ContextVar("rag_metrics_run", default=None)
+
+
+def _ms(seconds: float | None) -> float | None:
+    return round(seconds * 1000, 1) if seconds is not None else None
+
+
+class RunMetrics:
+    """Timings and token counts for one answer."""
+
+    def __init__(self, question: str) -> None:
+        self.question = question
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+        self.total: float | None = None
+        self.first_token: float | None = None
+        self.iterations = 0  # LLM calls; one per agent step
+        self.llm_seconds = 0.0
+        self.streamed_tokens = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.tools: list[dict] = []
+        self.retrievals: list[float] = []
+        self.cached = False
+        self.coalesced = False  # Followed another session's identical run instead of starting one
+        self.error: str | None = None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self._start
+
+    def add_tool(self, name: str, seconds: float, ok: bool) -> None:
+        with self._lock:
+            self.tools.append({"tool": name, "ms": _ms(seconds), "ok": ok})
+
+    def add_retrieval(self, seconds: float) -> None:
+        with self._lock:
+            self.retrievals.append(seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            completion = self.completion_tokens or self.streamed_tokens
+            return {
+                "question": self.question[:200],
+                "started_at": self.started_at,
+                "total_ms": _ms(self.total),
+                "ttft_ms": _ms(self.first_token),
+                "tokens_per_s": round(completion / self.llm_seconds, 1) if self.llm_seconds and completion else None,
+                "iterations": self.iterations,
+                "llm_ms": _ms(self.llm_seconds),
+                "prompt_tokens": self.prompt_tokens or None,
+                "completion_tokens": completion or None,
+                "tools": list(self.tools),
+                "retrieval_ms": [_ms(s) for s in self.retrievals],
+                "cached": self.cached,
+                "coalesced": self.coalesced,
+                "error": self.error,
+            }
+
+
+def _token_usage(response) -> tuple[int, int]:
+    """(prompt, completion) tokens reported by the provider, if any."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or 0
+    prompt = completion = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt += metadata.get("input_tokens") or 0
+            completion += metadata.get("output_tokens") or 0
+    return prompt, completion
+
+
+class MetricsHandler(BaseCallbackHandler):
+    """Callback that records one agent run into a :class:`RunMetrics`."""
+
+    def __init__(self, run: RunMetrics) -> None:
+        self.run = run
+        self._llm_starts: dict[UUID, float] = {}
+        self._tool_starts: dict[UUID, tuple[str, float]] = {}
+
+    def _llm_start(self, run_id: UUID) -> None:
+        with self.run._lock:
+            self.run.iterations += 1
+        self._llm_starts[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id: UUID, **kwargs) -> None:
+        self._llm_start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._llm_start(run_id)
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        with self.run._lock:
+            if self.run.first_token is None and token:
+                self.run.first_token = self.run.elapsed()
+            self.run.streamed_tokens += 1
+
+    def on_llm_end(self, response, *, run_id: UUID, **kwargs) -> None:
+        started = self._llm_starts.pop(run_id, None)
+        prompt, completion = _token_usage(response)
+        with self.run._lock:
+            if started is not None:
+                self.run.llm_seconds += time.perf_counter() - started
+            self.run.prompt_tokens += prompt
+            self.run.completion_tokens += completion
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._llm_starts.pop(run_id, None)
+
+    def on_tool_start(self, serialized, input_str: str, *, run_id: UUID, **kwargs) -> None:
+        name = (serialized or {}).get("name") or kwargs.get("name") or "tool"
+        self._tool_starts[run_id] = (name, time.perf_counter())
+
+    def _tool_done(self, run_id: UUID, ok: bool) -> None:
+        name, started = self._tool_starts.pop(run_id, ("tool", None))
+        if started is not None:
+            self.run.add_tool(name, time.perf_counter() - started, ok)
+
+    def on_tool_end(self, output, *, run_id: UUID, **kwargs) -> None:
+        self._tool_done(run_id, ok=True)
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        self._tool_done(run_id, ok=False)
+
+
+def record_retrieval(seconds: float) -> None:
+    """Attribute a retrieval to the run measured in this context (no-op outside a run)."""
+    run = _current_run.get()
+    if run is not None:
+        run.add_retrieval(seconds)
+
+
+class MetricsRegistry:
+    """Most recent runs, plus percentiles over them."""
+
+    def __init__(self, max_runs: int | None = None) -> None:
+        self._runs: deque[dict] = deque(maxlen=max_runs or settings.metrics_history)
+        self._lock = threading.Lock()
+
+    def start(self, question: str) -> tuple[RunMetrics, MetricsHandler]:
+        """New run record and its callback; also makes it current for retrieval timing."""
+        run = RunMetrics(question)
+        _current_run.set(run)
+        return run, MetricsHandler(run)
+
+    def record(self, run: RunMetrics, error: str | None = None) -> dict:
+        """Close ``run`` and keep its snapshot."""
+        run.total = run.elapsed()
+        run.error = error
+        if _current_run.get() is run:
+            _current_run.set(None)
+        snapshot = run.snapshot()
+        with self._lock:
+            self._runs.append(snapshot)
+        return snapshot
+
+    def recent(self, limit: int = 20) -> list[dict]:
+        with self._lock:
+            return list(self._runs)[-limit:]
+
+    def summary(self) -> dict:
+        with self._lock:
+            runs = list(self._runs)
+
+        def percentile(values: list, p: float) -> float | None:
+            values = sorted(v for v in values if v is not None)
+            if not values:
+                return None
+            return values[min(len(values) - 1, int(p * len(values)))]
+
+        tools: dict[str, dict] = {}
+        for run in runs:
+            for call in run["tools"]:
+                entry = tools.setdefault(call["tool"], {"calls": 0, "errors": 0, "ms": []})
+                entry["calls"] += 1
+                entry["errors"] += 0 if call["ok"] else 1
+                entry["ms"].append(call["ms"])
+        retrievals = [ms for run in runs for ms in run["retrieval_ms"]]
+        return {
+            "runs": len(runs),
+            "cached": sum(run["cached"] for run in runs),
+            "coalesced": sum(run["coalesced"] for run in runs),
+            "errors": sum(bool(run["error"]) for run in runs),
+            "total_ms": {"p50": percentile([r["total_ms"] for r in runs], 0.5),
+                         "p95": percentile([r["total_ms"] for r in runs], 0.95)},
+            "ttft_ms": {"p50": percentile([r["ttft_ms"] for r in runs], 0.5),
+                        "p95": percentile([r["ttft_ms"] for r in runs], 0.95)},
+            "tokens_per_s": {"p50": percentile([r["tokens_per_s"] for r in runs], 0.5)},
+            "retrieval_ms": {"p50": percentile(retrievals, 0.5), "p95": percentile(retrievals, 0.95)},
+            "tools": {
+                name: {"calls": e["calls"], "errors": e["errors"],
+                       "p50_ms": percentile(e["ms"], 0.5), "p95_ms": percentile(e["ms"], 0.95)}
+                for name, e in sorted(tools.items())
+            },
+        }
+
+
+_registry: MetricsRegistry | None = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Process-wide registry shared by every agent."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+__all__ = ["MetricsHandler", "MetricsRegistry", "RunMetrics", "get_metrics_registry", "record_retrieval"]
@@ -0,0 +1,242 @@
+"""Zero-downtime re-embedding when the embedding model changes.
+
+The manifest records which model embedded the index, and every reader embeds
+queries with that model, so changing ``RAG_HF_EMBEDDING_MODEL`` (or
+``RAG_EMBEDDING_PROVIDER``) leaves the live index working. ``python -m
+rag_agent.cli migrate`` then re-embeds the stored chunk text with the configured
+model into a shadow directory next to the index while the old index keeps
+serving. Vectors are checkpointed in blocks, so an interrupted run resumes
+where it stopped. Once the shadow is complete, the full new index (vectors,
+projection and parent store) is written to its own ``versions/<id>/``
+directory and published by a single manifest write naming it. Readers resolve
+the index through the manifest, so they see either the old index or the new
+one, never a mix, and pick it up on their next query.
+"""
+from __future__ import annotations
+
+import json
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from .config import settings
+from .embeddings import embed_documents_bulk, get_embeddings, resolve_embedding_model
+from .logger import setup_logger
+from .manifest import VERSIONS_DIR, index_dir, index_embedding_model, read_manifest, write_manifest
+from .reduction import FullVectors, ProjectedEmbeddings, Projector
+from .retrieval import PARENT_STORE_NAME
+from .segments import SegmentedIndex, is_segmented
+
+logger = setup_logger(__name__)
+
+SHADOW_SUFFIX = ".migration"
+STATE_NAME = "state.json"
+# Texts per checkpoint file; bounds the work lost when a run is interrupted
+BLOCK_SIZE = 4096
+
+
+def shadow_dir(vector_dir: Path | None = None) -> Path:
+    """Directory the shadow index is built in (a sibling of the live index)."""
+    vector_dir = Path(vector_dir or settings.vector_dir)
+    return vector_dir.with_name(vector_dir.name + SHADOW_SUFFIX)
+
+
+def needs_migration(vector_dir: Path | None = None) -> bool:
+    """True when the index was embedded with a different model than the configured one."""
+    provider, model = index_embedding_model(vector_dir)
+    if provider is None:
+        return False  # Built before models were recorded; assume the configured one
+    return (provider, model) != resolve_embedding_model()
+
+
+def migration_status(vector_dir: Path | None = None) -> dict:
+    """Progress of a running or interrupted migration, or an empty dict if there is none."""
+    path = shadow_dir(vector_dir) / STATE_NAME
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+
+
+class Migration:
+    """Re-embeds the live index with a target model and flips over when done."""
+
+    def __init__(
+        self,
+        provider: str | None = None,
+        model: str | None = None,
+        vector_dir: Path | None = None,
+    ) -> None:
+        self.vector_dir = Path(vector_dir or settings.vector_dir)
+        self.shadow = shadow_dir(self.vector_dir)
+        self.provider, self.model = resolve_embedding_model(provider, model)
+        self.source = read_manifest(self.vector_dir)
+        self.state: dict = {}
+
+    def _save_state(self, **fields) -> None:
+        self.state.update(fields, updated_at=time.time())
+        tmp_path = self.shadow / (STATE_NAME + ".tmp")
+        tmp_path.write_text(json.dumps(self.state, indent=2), encoding="utf-8")
+        tmp_path.replace(self.shadow / STATE_NAME)
+
+    def _prepare_shadow(self, total: int) -> None:
+        """Reuse checkpoints from an interrupted run of the same migration, else start fresh."""
+        previous = migration_status(self.vector_dir)
+        same_run = (
+            previous.get("source_version") == self.source.get("version")
+            and previous.get("provider") == self.provider
+            and previous.get("model") == self.model
+            and previous.get("total") == total
+        )
+        if not same_run:
+            shutil.rmtree(self.shadow, ignore_errors=True)
+        self.shadow.mkdir(parents=True, exist_ok=True)
+        self.state = previous if same_run else {
+            "source_version": self.source.get("version"),
+            "provider": self.provider,
+            "model": self.model,
+            "total": total,
+            "started_at": time.time(),
+        }
+        self._save_state(status="running", done=self.state.get("done", 0), error=None)
+
+    @property
+    def _source_dir(self) -> Path:
+        return index_dir(self.vector_dir, self.source)
+
+    def _source_chunks(self, embeddings) -> tuple[list, bool]:
+        """Live chunks of the current index in a stable order, and whether it is segmented."""
+        if is_segmented(self._source_dir):
+            index = SegmentedIndex(self._source_dir, embeddings)
+            return list(index.documents()), True
+        store = FAISS.load_local(
+            str(self._source_dir),
+            embeddings=embeddings,
+            index_name="echomindai",
+            allow_dangerous_deserialization=True,
+        )
+        ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+        return [(doc_id, store.docstore.search(doc_id)) for doc_id in ids], False
+
+    def _embed(self, texts: list[str], embeddings) -> np.ndarray:
+        """Embed in checkpointed blocks, skipping blocks finished by an earlier run."""
+        blocks = []
+        for number, start in enumerate(range(0, len(texts), BLOCK_SIZE)):
+            path = self.shadow / f"vectors-{number:05d}.npy"
+            if not path.exists():
+                vectors = np.asarray(
+                    embed_documents_bulk(texts[start:start + BLOCK_SIZE], embeddings), dtype="float32"
+                )
+                tmp_path = path.with_suffix(".tmp")
+                with open(tmp_path, "wb") as f:
+                    np.save(f, vectors)
+                tmp_path.replace(path)
+            blocks.append(np.load(path))
+            done = min(start + BLOCK_SIZE, len(texts))
+            self._save_state(done=done)
+            logger.info("Re-embedded %d/%d chunks with %s", done, len(texts), self.model)
+        return np.vstack(blocks)
+
+    def run(self) -> dict:
+        """Build the shadow index and flip to it. Returns the new manifest (empty if nothing to do)."""
+        if self.source.get("embedding_provider") == self.provider and self.source.get("embedding_model") == self.model:
+            logger.info("Index is already embedded with %s/%s", self.provider, self.model)
+            return {}
+
+        embeddings = get_embeddings(self.provider, self.model)
+        chunks, segmented = self._source_chunks(embeddings)
+        if not chunks:
+            raise ValueError(f"No indexed chunks found in {self.vector_dir}; run a full ingest instead.")
+        self._prepare_shadow(len(chunks))
+
+        try:
+            ids = [doc_id for doc_id, _ in chunks]
+            documents = [doc for _, doc in chunks]
+            texts = [doc.page_content for doc in documents]
+            vectors = self._embed(texts, embeddings)
+
+            projector = None
+            full_vectors = None
+            store_embeddings = embeddings
+            if settings.embedding_dim > 0:
+                # The new model may have a different width; learn a projection for it
+                projector = Projector.fit(vectors, settings.embedding_dim, settings.embedding_reduction)
+                full_vectors = FullVectors(ids, vectors)
+                vectors = projector.transform(vectors)
+                store_embeddings = ProjectedEmbeddings(embeddings, projector)
+            store = FAISS.from_embeddings(
+                list(zip(texts, vectors.tolist())),
+                store_embeddings,
+                metadatas=[doc.metadata for doc in documents],
+                ids=ids,
+            )
+            manifest = self._flip(store, projector, full_vectors, segmented)
+        except Exception as e:
+            self._save_state(status="failed", error=str(e))
+            raise
+
+        shutil.rmtree(self.shadow, ignore_errors=True)
+        logger.info("Migrated %d chunks to %s/%s", len(chunks), self.provider, self.model)
+        return manifest
+
+    def _flip(
+        self, store: FAISS, projector: Projector | None, full_vectors: FullVectors | None, segmented: bool
+    ) -> dict:
+        """Write the new index to its own directory and publish it with one manifest write."""
+        name = uuid.uuid4().hex[:12]
+        target = self.vector_dir / VERSIONS_DIR / name
+        target.mkdir(parents=True)
+        if projector is not None:
+            projector.save(target)
+        if segmented:
+            SegmentedIndex(target, store.embeddings).add_documents([], store=store, full_vectors=full_vectors)
+        else:
+            store.save_local(str(target), index_name="echomindai")
+            if full_vectors is not None:
+                full_vectors.save(target)
+        # The parent store holds raw text keyed by parent id, so it carries over unchanged
+        parents = self._source_dir / PARENT_STORE_NAME
+        if parents.exists():
+            shutil.copy2(parents, target / PARENT_STORE_NAME)
+
+        if read_manifest(self.vector_dir).get("version") != self.source.get("version"):
+            shutil.rmtree(target, ignore_errors=True)
+            raise RuntimeError(
+                "The index changed while migrating (re-ingest or `add`). "
+                "Run the migration again to re-embed the new content."
+            )
+        fields = {k: v for k, v in self.source.items() if k not in ("version", "created_at")}
+        fields.update(
+            index_dir=f"{VERSIONS_DIR}/{name}",
+            embedding_provider=self.provider,
+            embedding_model=self.model,
+            embedding_dim=projector.dim if projector else None,
+            migrated_from="/".join(
+                filter(None, (self.source.get("embedding_provider"), self.source.get("embedding_model")))
+            ) or None,
+        )
+        # The only step readers can observe: they resolve the index through the manifest
+        manifest = write_manifest(self.vector_dir, **fields)
+        self._prune(keep={target, self._source_dir})
+        return manifest
+
+    def _prune(self, keep: set) -> None:
+        """Remove older generations; the one just replaced stays for readers still on it."""
+        versions = self.vector_dir / VERSIONS_DIR
+        if not versions.is_dir():
+            return
+        for path in versions.iterdir():
+            if path not in keep:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def migrate(provider: str | None = None, model: str | None = None) -> dict:
+    """Re-embed the index with ``provider``/``model`` (the configured model by default)."""
+    return Migration(provider, model).run()
+
+
+__all__ = ["Migration", "migrate", "migration_status", "needs_migration", "shadow_dir"]
@@ -1,83 +1,122 @@
 """Conversational RAG Agent with Tools."""
 from __future__ import annotations
 
-from pathlib import Path
-from typing import Iterable, List
+from typing import AsyncIterator, Iterable, Iterator, List
 
 from langchain_community.vectorstores import FAISS
 from langchain_core.messages import BaseMessage, AIMessage, HumanMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.tools import tool
-from langchain_classic.agents import create_tool_calling_agent, AgentExecutor
+from langchain_core.tools import StructuredTool
+from langchain_classic.agents import create_tool_calling_agent
 
+from .agent_executor import ConcurrentAgentExecutor
+from .cache import ResponseCache, get_response_cache, get_semantic_cache
+from .cancellation import CancellationHandler, CancellationToken, Cancelled
 from .config import settings
 from .embeddings import get_embeddings
 from .llm import get_llm
-from .llm import get_llm
+from .logger import setup_logger
+from .memory import SummarizingMemory
+from .metrics import get_metrics_registry, record_retrieval
+from .prompts import build_system_prompt
+from .retrieval import Retriever, get_retrieval_executor
+from .singleflight import get_single_flight
+from .streaming import Final, StreamEvent, Token, ToolEnd, ToolStart, iterate_sync
+from .tool_routing import ToolSelector
 from .tools import calculator, generate_plot, web_search, save_file, translate_content
 from .tools_external import get_weather, get_global_news, find_hotels, search_products, get_map_location, find_relevant_links, get_images, generate_ai_image, get_stock_price
 from .tools_visualization import create_chart
-import queue
+import asyncio
 import threading
-from langchain_core.callbacks import BaseCallbackHandler
-
-class StreamHandler(BaseCallbackHandler):
-    """Callback handler that streams LLM tokens to a queue."""
-    def __init__(self, q: queue.Queue):
-        self.q = q
-        self.tokens_received = False
-
-    def on_llm_new_token(self, token: str, **kwargs) -> None:
-        self.tokens_received = True
-        self.q.put(token)
-
-    def on_tool_end(self, output: str, **kwargs) -> None:
-        pass
+import time
+from contextlib import aclosing
+from functools import partial
 
+logger = setup_logger(__name__)
 
 class RAGAgent:
     """Agent that can chat, calculate, plot, and search documents."""
 
     def __init__(self, vector_store: FAISS | None = None) -> None:
         settings.ensure_dirs()
-        self.vector_store = vector_store or self._load_vector_store()
+        self.retriever = self._open_retriever(vector_store)
+        self.vector_store = self.retriever.vector_store
+        self.semantic_cache = get_semantic_cache(self.embeddings)
+        self.response_cache = get_response_cache()
+        self.metrics = get_metrics_registry()
+        self.last_metrics: dict | None = None  # Latency breakdown of this agent's latest answer
         self.llm = get_llm()
-        self.agent_executor = self._build_agent()
-        from langchain_core.chat_history import InMemoryChatMessageHistory
-        self.history = InMemoryChatMessageHistory()
-
-    def _load_vector_store(self) -> FAISS:
-        """Load vector store or create empty one if missing."""
-        vector_path = Path(settings.vector_dir)
-        embeddings = get_embeddings()
-        
-        if not vector_path.exists():
-            import faiss
-            from langchain_community.docstore.in_memory import InMemoryDocstore
-            index = faiss.IndexFlatL2(len(embeddings.embed_query("hello")))
-            return FAISS(
-                embedding_function=embeddings,
-                index=index,
-                docstore=InMemoryDocstore(),
-                index_to_docstore_id={}
-            )
-
-        return FAISS.load_local(
-            str(vector_path),
-            embeddings=embeddings,
-            index_name="echomindai",
-            allow_dangerous_deserialization=True,
+        self.tools = self._build_tools()
+        self._executors: dict[tuple[str, ...], ConcurrentAgentExecutor] = {}
+        self._executors_lock = threading.Lock()
+        # Full tool set, used when routing is off
+        self.agent_executor = self._executor(tuple(self.tools))
+        # Binding every tool schema on each call is slow; bind per-query subsets instead
+        self.tool_selector = (
+            ToolSelector(list(self.tools.values()), self.embeddings) if settings.tool_routing else None
         )
+        # Last few turns verbatim plus a rolling summary, so per-turn prompt size stays flat
+        self.history = SummarizingMemory(self.llm)
+
+    def _open_retriever(self, vector_store=None):
+        """Use the shared retrieval service when configured, else load the index in-process."""
+        if vector_store is None and settings.retrieval_service_url:
+            from .retrieval_service import RetrievalClient
+
+            client = RetrievalClient(settings.retrieval_service_url)
+            try:
+                client.health()
+                self.embeddings = client.embeddings
+                return client
+            except Exception as e:
+                logger.warning("Retrieval service unavailable (%s); loading index in-process", e)
+
+        if vector_store is not None:
+            self.embeddings = getattr(vector_store, "embeddings", None) or get_embeddings()
+            return Retriever.open(self.embeddings, vector_store)
+        # Query embeddings from every session are micro-batched through one shared model,
+        # the one the index was built with (which may differ from the configured one mid-migration)
+        retriever = Retriever.open()
+        self.embeddings = retriever.embeddings
+        return retriever
+
+    def _current_retriever(self):
+        # Re-ingests and model migrations publish a new index version; reopen on the next query
+        retriever = self.retriever.refreshed()
+        if retriever is not self.retriever:
+            logger.info("Index changed on disk, reloading")
+            self.retriever = retriever
+            self.vector_store = retriever.vector_store
+        return retriever
+
+    @property
+    def index_version(self) -> str:
+        return self._current_retriever().index_version
+
+    def retrieve(self, query: str, k: int = 4) -> list:
+        """Return the top-k documents for a query, expanded to parent windows when available."""
+        start = time.perf_counter()
+        docs = self._current_retriever().search(query, k=k)
+        record_retrieval(time.perf_counter() - start)
+        return docs
+
+    async def aretrieve(self, query: str, k: int = 4, timeout: float | None = None) -> list:
+        """Async retrieval on the bounded retrieval pool, with a per-request timeout."""
+        start = time.perf_counter()
+        docs = await asyncio.wait_for(self._asearch(query, k), timeout=timeout or settings.retrieval_timeout)
+        record_retrieval(time.perf_counter() - start)
+        return docs
+
+    async def _asearch(self, query: str, k: int) -> list:
+        # Checking for a new index reads the manifest and may reopen it, so not on the loop
+        loop = asyncio.get_running_loop()
+        retriever = await loop.run_in_executor(get_retrieval_executor(), self._current_retriever)
+        return await retriever.asearch(query, k=k)
 
-    def _build_agent(self):
+    def _build_tools(self) -> dict:
+        """All agent tools by name, in the order they are bound."""
         # 1. Define Retrieval Tool
-        @tool
-        def search_knowledge_base(query: str) -> str:
-            """
-            Search the project's knowledge base (documents) for information.
-            Use this for questions about specific projects, policies, or uploaded files.
-            """
-            docs = self.vector_store.similarity_search(query, k=4)
+        def _format_docs(docs: list) -> str:
             if not docs:
                 return "No relevant documents found."
             
@@ -87,7 +126,24 @@ class RAGAgent:
                 formatted.append(f"Source {i} ({source}):\n{doc.page_content}")
             return "\n\n---\n\n".join(formatted)
 
-        # 2. Bind Tools
+        def search_knowledge_base(query: str) -> str:
+            return _format_docs(self.retrieve(query, k=4))
+
+        async def asearch_knowledge_base(query: str) -> str:
+            # Async agent runs (MCP) search on the retrieval pool, not the default executor
+            return _format_docs(await self.aretrieve(query, k=4))
+
+        search_knowledge_base = StructuredTool.from_function(
+            func=search_knowledge_base,
+            coroutine=asearch_knowledge_base,
+            name="search_knowledge_base",
+            description=(
+                "Search the project's knowledge base (documents) for information. "
+                "Use this for questions about specific projects, policies, or uploaded files."
+            ),
+        )
+
+        # 2. Collect Tools
         # Enhanced with World Knowledge + Generative Tools
         tools = [
             search_knowledge_base, 
@@ -106,75 +162,23 @@ class RAGAgent:
             save_file,
             translate_content
         ]
-        
+        return {tool.name: tool for tool in tools}
 
-        
-        # 3. Create Prompt
+    def _build_agent(self, tool_names: tuple[str, ...]) -> ConcurrentAgentExecutor:
+        tools = [self.tools[name] for name in tool_names]
+
+        # Create Prompt (only the protocol sections for the bound tools)
         prompt = ChatPromptTemplate.from_messages([
-            ("system", "You are 'EchoMindAI', an Advanced Enterprise Intelligence Agent.\n"
-                       "Your mission is to provide **COMPLETELY DYNAMIC**, **ACCURATE**, and **VISUALLY STUNNING** responses.\n"
-                       "\n"
-                       "**CORE GENERATION PROTOCOLS (STRICT):**\n"
-                       "1. **DEEP DETAIL & ACCURACY**: Never give surface-level answers. Dive deep. Explain the 'Why', 'How', and 'History'. IF unsure, state your confidence level clearly.\n"
-                       "2. **DYNAMIC STRUCTURE**: Adapt your formatting to the question. Use bolding, headers, lists, and tables to make the content readable and engaging.\n"
-                       "3. **VISUAL FIRST**: For ANY physical object, place, product, or person, you **MUST** embed an image using `get_images`.\n"
-                       "   - Format: `![Alt Text](ImageURL)`\n"
-                       "   - **NEVER** leave a visual query text-only.\n"
-                       "\n"
-                       "**TOOL USAGE & RENDERING RULES (STRICT FORMATS):**\n"
-                       "- **Weather**: You MUST use the `get_weather` tool. It returns HTML. **OUTPUT IT EXACTLY AS IS**. Do not modify it. Do not wrap it in markdown.\n"
-                       "- **Finance**: You MUST use the `get_stock_price` tool. It returns HTML. **OUTPUT IT EXACTLY AS IS** (start with `<div`). Do not wrap it in markdown code blocks.\n"
-                       "- **Shopping/Hotels**: You MUST use the **GRID LAYOUT HTML** below. **NEVER** use a list or text table.\n"
-                       "  ```html\n"
-                       "  <section class=\"product-grid\">\n"
-                       "    <div class=\"product-card\">\n"
-                       "      <div class=\"product-card-img-container\"><img src=\"IMAGE_URL\"/></div>\n"
-                       "      <div class=\"product-card-content\">\n"
-                       "         <h3>Title</h3>\n"
-                       "         <div class=\"rating\">⭐ 4.8</div>\n"
-                       "         <div class=\"price\">$Price</div>\n"
-                       "         <p class=\"description\">Detailed specs...</p>\n"
-                       "         <a href=\"LINK\" class=\"action-btn\">View</a>\n"
-                       "      </div>\n"
-                       "    </div>\n"
-                       "  </section>\n"
-                       "  ```\n"
-                       "\n"
-                       "**CONSISTENCY PROTOCOL:**\n"
-                       "- **NEVER** change the UI format on your own.\n"
-                       "- **ALWAYS** use the schemas above for their respective topics.\n"
-                       "- **ACCURACY**: Verify facts. If a price or rating is unknown, estimate reasonable values based on market data, but mark as 'Est.'.\n"
-                       "\n"
-                       "**MATH & STUDY PROTOCOL (USER FRIENDLY):**\n"
-                       "**MATH & STUDY PROTOCOL (RENDERED):**\n"
-                       "- **Equations**: You **MUST** use standard LaTeX math wrapped in `$$` delimiters for proper rendering.\n"
-                       "- **Format**: `$$ \\int x^n dx = \\frac{{1}}{{n+1}} x^{{n+1}} + C $$` (This renders as a beautiful equation).\n"
-                       "- **Structure**: \n"
-                       "  1. **The Formula**: Show the core equation first using `$$` blocks.\n"
-                       "  2. **The Example**: Provide a specific worked example (e.g., `n=5`).\n"
-                       "  3. **Step-by-Step**: Explain the manipulation clearly.\n"
-                       "  4. **Analogy/Concept**: Explain the intuition.\n"
-                       "  4. **Example**: A concrete worked example or application.\n"
-                       "- **Tone**: Encouraging, clear, and educational. Avoid dense walls of text. Use bullet points.\n"
-                       "\n"
-                       "**SOCIAL MEDIA & LINKS:**\n"
-                       "- If asked for profiles (LinkedIn, Twitter, etc.), **ALWAYS** use `find_relevant_links` with the person's name + platform.\n"
-                       "- Provide the actual clickable URLs in a neat list.\n"
-                       "\n"
-                       "**ERROR HANDLING PROTOCOL:**\n"
-                       "- If a tool returns 'Search Failed' or 'Rate Limited', **DO NOT** make up information.\n"
-                       "- Explicitly state: 'I am currently unable to search the live web due to high traffic/technical limits.'\n"
-                       "- Offer to answer based on your internal knowledge or suggest the user tries again in a moment."
-                       ),
+            ("system", build_system_prompt(tool_names)),
             MessagesPlaceholder(variable_name="chat_history"),
             ("human", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad"),
         ])
 
-        # 4. Create Agent
+        # Create Agent
         agent = create_tool_calling_agent(self.llm, tools, prompt)
         
-        # 5. Create Executor
+        # Create Executor
         def _handle_error(error) -> str:
             # Robust Error Handler for "Parsing Failed" scenarios
             # This happens when the LLM answers directly (Good!) but the Agent expects a Tool (Bad parser).
@@ -202,48 +206,206 @@ class RAGAgent:
             # Fallback: Just return the raw error so the user isn't blind
             return f"**Agent System Info**: I generated a response, but the system parser caught an edge case.\n\nRaw context: {error_str[-200:]}"
 
-        return AgentExecutor(
+        return ConcurrentAgentExecutor(
             agent=agent, 
             tools=tools, 
             verbose=False,  # Silent mode: Respond in UI, not Terminal
-            handle_parsing_errors=_handle_error
+            handle_parsing_errors=_handle_error,
+            return_intermediate_steps=True,  # Needed to know which tools an answer used
         )
 
-    def ask_stream(self, query: str):
-        """Stream the agent's response."""
-        q = queue.Queue()
-        handler = StreamHandler(q)
-        
-        def run():
-            try:
-                # Use internal memory
-                chat_history = self.history.messages
-                res = self.agent_executor.invoke(
-                    {"input": query, "chat_history": chat_history},
-                    config={"callbacks": [handler]}
+    def _executor(self, tool_names: tuple[str, ...]) -> ConcurrentAgentExecutor:
+        """Executor bound to exactly ``tool_names``, built once per subset."""
+        with self._executors_lock:
+            executor = self._executors.get(tool_names)
+            if executor is None:
+                executor = self._executors[tool_names] = self._build_agent(tool_names)
+            return executor
+
+    def _executor_for(self, question: str, history: list) -> ConcurrentAgentExecutor:
+        """Executor with only the tools this question is likely to need."""
+        if self.tool_selector is None:
+            return self.agent_executor
+        # Route on the previous user turn too, so follow-ups ("and tomorrow?") keep their tools
+        previous = next((m.content for m in reversed(history) if isinstance(m, HumanMessage)), "")
+        tool_names = self.tool_selector.select(f"{previous}\n{question}" if previous else question)
+        logger.debug("Binding %d/%d tools: %s", len(tool_names), len(self.tools), ", ".join(tool_names))
+        return self._executor(tool_names)
+
+    async def astream(
+        self,
+        question: str,
+        chat_history: list | None = None,
+        timeout: float | None = None,
+        cancel: CancellationToken | None = None,
+    ) -> AsyncIterator[StreamEvent]:
+        """Stream an answer as typed events, ending with exactly one :class:`Final`.
+
+        Runs on the caller's event loop; sync callers use :meth:`stream_events`.
+        Cancelling ``cancel`` (or the consuming task) stops the model stream and
+        any tool calls that have not started; nothing is cached or remembered.
+        Identical history-free questions already in flight (from any session)
+        share that run instead of starting another.
+        """
+        history = self._history_for(chat_history)
+        if history or not settings.single_flight:
+            async for event in self._astream_run(question, chat_history, timeout, cancel):
+                yield event
+            return
+
+        loop = asyncio.get_running_loop()
+        timeout = timeout or settings.request_timeout
+        key = await loop.run_in_executor(get_retrieval_executor(), self._flight_key, question)
+        # The shared run leaves memory alone; each subscriber remembers the answer itself
+        events, leader = get_single_flight().join(
+            key, lambda token: self._astream_run(question, None, timeout, token, remember=False), cancel, timeout
+        )
+        # The shared run records its metrics on the leader; followers record what they saw
+        metrics = None
+        if not leader:
+            metrics, _ = self.metrics.start(question)
+            metrics.coalesced = True
+        outcome = "cancelled"
+        try:
+            async with aclosing(events):
+                async for event in events:
+                    if metrics is not None and isinstance(event, Token):
+                        if metrics.first_token is None:
+                            metrics.first_token = metrics.elapsed()
+                        metrics.streamed_tokens += 1
+                    if isinstance(event, Final):
+                        outcome = event.error
+                        if event.error is None:
+                            await loop.run_in_executor(
+                                get_retrieval_executor(),
+                                self._record, question, event.output, chat_history, history,
+                            )
+                    yield event
+        finally:
+            if metrics is not None:
+                self.last_metrics = self.metrics.record(metrics, outcome)
+
+    def _flight_key(self, question: str) -> str:
+        return ResponseCache.key(question, [], self.index_version, self._model_id)
+
+    async def _astream_run(
+        self,
+        question: str,
+        chat_history: list | None,
+        timeout: float | None,
+        cancel: CancellationToken | None,
+        remember: bool = True,
+    ) -> AsyncIterator[StreamEvent]:
+        cancel = cancel or CancellationToken()
+        metrics, metrics_handler = self.metrics.start(question)
+        history = self._history_for(chat_history)
+        loop = asyncio.get_running_loop()
+        cached = await loop.run_in_executor(
+            get_retrieval_executor(), self._cached_answer, question, history
+        )
+        if cached is not None:
+            metrics.cached = True
+            # Recording embeds for the semantic cache and writes SQLite, so it stays off the loop too
+            await loop.run_in_executor(
+                get_retrieval_executor(),
+                partial(self._record, question, cached, chat_history, history, remember=remember),
+            )
+            self.last_metrics = self.metrics.record(metrics)
+            yield Final(cached, cached=True)
+            return
+
+        # Routing may embed the question, so keep it off the event loop
+        executor = await loop.run_in_executor(
+            get_retrieval_executor(), self._executor_for, question, history
+        )
+        timeout = timeout or settings.request_timeout
+        deadline = loop.time() + timeout
+        result = None
+        error = None
+        events = executor.astream_events(
+            {"input": question, "chat_history": history},
+            config={"callbacks": [metrics_handler, CancellationHandler(cancel)]},
+            version="v2",
+        )
+        # Wakes the loop below even while it waits for the model's first token
+        stopped = loop.create_future()
+        unsubscribe = cancel.on_cancel(
+            lambda: loop.call_soon_threadsafe(lambda: stopped.done() or stopped.set_result(None))
+        )
+        try:
+            while True:
+                step = asyncio.ensure_future(anext(events))
+                done, _ = await asyncio.wait(
+                    {step, stopped}, timeout=max(0.0, deadline - loop.time()), return_when=asyncio.FIRST_COMPLETED
                 )
-                
-                # Fallback: if no tokens streamed
-                if not handler.tokens_received:
-                   q.put(res.get("output", ""))
-                   
-                # Save to memory
-                self.history.add_user_message(query)
-                self.history.add_ai_message(res.get("output", ""))
-                
-            except Exception as e:
-                q.put(f"Error: {e}")
-            finally:
-                q.put(None) # Sentinel
+                if step not in done:
+                    step.cancel()
+                    await asyncio.gather(step, return_exceptions=True)
+                    raise Cancelled("cancelled") if stopped.done() else asyncio.TimeoutError()
+                try:
+                    event = step.result()
+                except StopAsyncIteration:
+                    break
+                kind = event["event"]
+                if kind == "on_chat_model_stream":
+                    content = event["data"]["chunk"].content
+                    if isinstance(content, str) and content:
+                        yield Token(content)
+                elif kind == "on_tool_start":
+                    yield ToolStart(event["name"], event["data"].get("input"))
+                elif kind == "on_tool_end":
+                    yield ToolEnd(event["name"], str(event["data"].get("output", "")))
+                elif kind == "on_chain_end" and not event["parent_ids"]:
+                    result = event["data"]["output"]
+        except asyncio.TimeoutError:
+            error = f"request timed out after {timeout:.0f}s"
+        except Cancelled:
+            error = "cancelled"
+        except asyncio.CancelledError:
+            # The consumer went away (e.g. MCP client disconnected); stop pending tool calls too
+            cancel.cancel()
+            self.last_metrics = self.metrics.record(metrics, "cancelled")
+            raise
+        except Exception as e:
+            error = "cancelled" if cancel.cancelled else str(e)
+        finally:
+            unsubscribe()
+            await events.aclose()
+
+        if error is None and not isinstance(result, dict):
+            error = "the agent finished without an answer"
+        if error == "cancelled":
+            self.last_metrics = self.metrics.record(metrics, error)
+            yield Final("", error=error)
+            return
+        if error is not None:
+            self.last_metrics = self.metrics.record(metrics, error)
+            yield Final(f"Error: {error}", error=error)
+            return
+        output = result.get("output", "")
+        await loop.run_in_executor(
+            get_retrieval_executor(),
+            partial(self._record, question, output, chat_history, history, result, remember=remember),
+        )
+        self.last_metrics = self.metrics.record(metrics)
+        yield Final(output, tools=self._tools_used(result))
 
-        thread = threading.Thread(target=run)
-        thread.start()
+    def stream_events(
+        self, question: str, chat_history: list | None = None, cancel: CancellationToken | None = None
+    ) -> Iterator[StreamEvent]:
+        """Sync view of :meth:`astream`, run on the shared background event loop."""
+        return iterate_sync(self.astream(question, chat_history, cancel=cancel))
 
-        while True:
-            token = q.get()
-            if token is None:
-                break
-            yield token
+    def ask_stream(self, query: str, cancel: CancellationToken | None = None):
+        """Stream the agent's response as text chunks (stops early once ``cancel`` is cancelled)."""
+        streamed = False
+        for event in self.stream_events(query, cancel=cancel):
+            if isinstance(event, Token):
+                streamed = True
+                yield event.text
+            elif isinstance(event, Final) and event.output and (event.error or not streamed):
+                # Cached answers, tool-only answers and errors arrive as one chunk
+                yield event.output
 
     @staticmethod
     def _coerce_history(messages: list[tuple[str, str]] | List[BaseMessage] | None) -> List[BaseMessage]:
@@ -260,47 +422,107 @@ class RAGAgent:
                 coerced.append(AIMessage(content=content))
         return coerced
 
-    def ask(self, question: str, chat_history: list | None = None) -> str:
-        """Synchronous ask with retry and caching."""
-        # Check cache (simple in-memory)
-        if not hasattr(self, "_response_cache"):
-            self._response_cache = {}
-        
-        cache_key = f"{question}-{str(chat_history)}"
-        cache_key = f"{question}-{str(chat_history)}"
-        # if cache_key in self._response_cache:
-        #     return self._response_cache[cache_key]
+    @staticmethod
+    def _tools_used(result: dict) -> list[str]:
+        """Names of the tools the agent called while producing a result."""
+        return [action.tool for action, _ in result.get("intermediate_steps", [])]
+
+    def _history_for(self, chat_history: list | None) -> List[BaseMessage]:
+        # Explicit history (legacy callers) wins over the internal memory
+        if chat_history:
+            return self._coerce_history(chat_history)
+        return self.history.messages
+
+    @property
+    def _model_id(self) -> str:
+        return f"{settings.chat_provider}:{settings.chat_model}"
+
+    def _cached_answer(self, question: str, history: list) -> str | None:
+        if self.response_cache is not None:
+            # Exact match on question + history, still fresh for the tools it used
+            cached = self.response_cache.lookup(question, history, self.index_version, self._model_id)
+            if cached is not None:
+                return cached
+        # Semantic matches are only valid for questions asked without conversational context
+        if self.semantic_cache is None or history:
+            return None
+        return self.semantic_cache.lookup(question, self.index_version)
+
+    def _record(
+        self,
+        question: str,
+        output: str,
+        chat_history: list | None,
+        history: list,
+        result: dict | None = None,
+        remember: bool = True,
+    ) -> None:
+        """Cache a fresh result and update memory if we used the internal one."""
+        if result is not None:
+            tools_used = self._tools_used(result)
+            if self.response_cache is not None:
+                self.response_cache.store(
+                    question, output, history, self.index_version, self._model_id, tools_used
+                )
+            if self.semantic_cache is not None and not history:
+                self.semantic_cache.store(question, output, self.index_version, tools_used)
+        if remember and not chat_history:
+            self.history.add_user_message(question)
+            self.history.add_ai_message(output)
 
-        from tenacity import retry, stop_after_attempt, wait_exponential
+    def ask(self, question: str, chat_history: list | None = None, cancel: CancellationToken | None = None) -> str:
+        """Synchronous ask with retry and caching."""
+        from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_exponential
         
-        @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
+        @retry(
+            stop=stop_after_attempt(3),
+            wait=wait_exponential(multiplier=1, min=2, max=10),
+            retry=retry_if_not_exception_type(Cancelled),
+        )
         def _invoke_with_retry(input_data):
-            return self.agent_executor.invoke(input_data)
+            callbacks = [metrics_handler] + ([CancellationHandler(cancel)] if cancel else [])
+            return executor.invoke(input_data, config={"callbacks": callbacks})
 
-        # Simplified sync call using the same executor logic
-        history = self.history.messages
-        if chat_history:
-             # If explicit history provided, use it (or merge it)
-             history = self._coerce_history(chat_history)
+        metrics, metrics_handler = self.metrics.start(question)
+        history = self._history_for(chat_history)
+        cached = self._cached_answer(question, history)
+        if cached is not None:
+            metrics.cached = True
+            self._record(question, cached, chat_history, history)
+            self.last_metrics = self.metrics.record(metrics)
+            return cached
+        executor = self._executor_for(question, history)
              
         try:
             result = _invoke_with_retry({"input": question, "chat_history": history})
             output = result["output"]
-            
-            # Cache success
-            self._response_cache[cache_key] = output
-            # Limit cache size
-            if len(self._response_cache) > 100:
-                self._response_cache.pop(next(iter(self._response_cache)))
-            
-            # Update memory if we used the internal one
-            if not chat_history:
-                self.history.add_user_message(question)
-                self.history.add_ai_message(output)
-                
+            self._record(question, output, chat_history, history, result)
+            self.last_metrics = self.metrics.record(metrics)
             return output
+        except Cancelled:
+            self.last_metrics = self.metrics.record(metrics, "cancelled")
+            return ""
         except Exception as e:
+            self.last_metrics = self.metrics.record(metrics, str(e))
             return f"Error: {str(e)} (after retries)"
 
+    async def aask(
+        self,
+        question: str,
+        chat_history: list | None = None,
+        timeout: float | None = None,
+        cancel: CancellationToken | None = None,
+    ) -> str:
+        """Native async ask with a per-request timeout.
+
+        Cancelling the awaiting task (e.g. the MCP client disconnecting) cancels
+        the agent run instead of leaving it running on a worker thread.
+        """
+        final = None
+        async for event in self.astream(question, chat_history, timeout, cancel):
+            if isinstance(event, Final):
+                final = event
+        return final.output
+
 __all__ = ["RAGAgent"]
 
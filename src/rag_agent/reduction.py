@@ -0,0 +1,151 @@
+"""Reduced-dimension embeddings for compact indexes.
+
+With ``RAG_EMBEDDING_DIM`` set, ingest learns a projection from the full
+embedding width down to that many dimensions (PCA, or plain truncation for
+Matryoshka-style models) and persists it next to the index. Queries are
+projected the same way; the retriever can optionally re-score the candidates
+at full precision, using the full-width vectors stored next to the index at
+ingest (:class:`FullVectors`).
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from .logger import setup_logger
+from .manifest import index_dir
+
+logger = setup_logger(__name__)
+
+PROJECTION_NAME = "echomindai_projection.npz"
+FULL_VECTORS_NAME = "echomindai_full.npy"
+FULL_IDS_NAME = "echomindai_full_ids.json"
+
+
+class Projector:
+    """Linear projection ``(x - mean) @ components.T`` learned at ingest time."""
+
+    def __init__(self, mean: np.ndarray, components: np.ndarray, method: str) -> None:
+        self.mean = mean.astype("float32")
+        self.components = components.astype("float32")
+        self.method = method
+
+    @property
+    def dim(self) -> int:
+        return self.components.shape[0]
+
+    @classmethod
+    def fit(cls, vectors, dim: int, method: str = "pca") -> "Projector":
+        vectors = np.asarray(vectors, dtype="float32")
+        full_dim = vectors.shape[1]
+        dim = min(dim, full_dim)
+        if method == "truncate":
+            return cls(np.zeros(full_dim), np.eye(full_dim)[:dim], method)
+        if method != "pca":
+            raise ValueError(f"Unsupported reduction '{method}'. Use 'pca' or 'truncate'.")
+
+        if len(vectors) < dim:
+            logger.warning(
+                "Only %d vectors to fit PCA; reducing to %d dimensions instead of %d",
+                len(vectors), len(vectors), dim,
+            )
+            dim = len(vectors)
+        mean = vectors.mean(axis=0)
+        _, _, vt = np.linalg.svd(vectors - mean, full_matrices=False)
+        return cls(mean, vt[:dim], method)
+
+    def transform(self, vectors) -> np.ndarray:
+        projected = (np.asarray(vectors, dtype="float32") - self.mean) @ self.components.T
+        if self.method == "truncate":
+            # Matryoshka prefixes are re-normalised so norms stay comparable
+            norms = np.linalg.norm(projected, axis=-1, keepdims=True)
+            projected = projected / np.clip(norms, 1e-12, None)
+        return projected
+
+    def save(self, vector_dir: Path) -> None:
+        np.savez(
+            Path(vector_dir) / PROJECTION_NAME,
+            mean=self.mean,
+            components=self.components,
+            method=np.array(self.method),
+        )
+
+    @classmethod
+    def load(cls, vector_dir: Path) -> "Projector | None":
+        path = Path(vector_dir) / PROJECTION_NAME
+        if not path.exists():
+            return None
+        data = np.load(path)
+        return cls(data["mean"], data["components"], str(data["method"]))
+
+
+class ProjectedEmbeddings(Embeddings):
+    """Wraps a full-width model so documents and queries land in the reduced space."""
+
+    def __init__(self, embeddings, projector: Projector) -> None:
+        self.embeddings = embeddings
+        self.projector = projector
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.projector.transform(self.embeddings.embed_documents(texts)).tolist()
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.projector.transform(self.embeddings.embed_query(text)).tolist()
+
+
+class FullVectors:
+    """Full-width vectors of a reduced index, keyed by docstore id, for re-scoring.
+
+    Saved next to the FAISS files and memory-mapped on load, so re-scoring
+    reads a few rows from disk instead of re-embedding every candidate.
+    """
+
+    def __init__(self, ids: list[str], vectors: np.ndarray) -> None:
+        self.ids = list(ids)
+        self.vectors = vectors
+        self._rows = {doc_id: row for row, doc_id in enumerate(self.ids)}
+
+    @classmethod
+    def for_store(cls, store, vectors) -> "FullVectors":
+        """Pair ``vectors`` (in insertion order) with the docstore ids ``store`` gave them."""
+        ids = [store.index_to_docstore_id[i] for i in range(store.index.ntotal)]
+        return cls(ids, np.asarray(vectors, dtype="float32"))
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def rows(self, ids: list) -> np.ndarray | None:
+        """Vectors for ``ids`` in order, or ``None`` if any of them is missing."""
+        if not all(doc_id in self._rows for doc_id in ids):
+            return None
+        return np.asarray(self.vectors[[self._rows[doc_id] for doc_id in ids]], dtype="float32")
+
+    def save(self, directory: Path) -> None:
+        directory = Path(directory)
+        np.save(directory / FULL_VECTORS_NAME, np.asarray(self.vectors, dtype="float32"))
+        (directory / FULL_IDS_NAME).write_text(json.dumps(self.ids), encoding="utf-8")
+
+    @classmethod
+    def load(cls, directory: Path) -> "FullVectors | None":
+        directory = Path(directory)
+        if not (directory / FULL_VECTORS_NAME).exists() or not (directory / FULL_IDS_NAME).exists():
+            return None
+        ids = json.loads((directory / FULL_IDS_NAME).read_text(encoding="utf-8"))
+        return cls(ids, np.load(directory / FULL_VECTORS_NAME, mmap_mode="r"))
+
+    @staticmethod
+    def remove(directory: Path) -> None:
+        for name in (FULL_VECTORS_NAME, FULL_IDS_NAME):
+            (Path(directory) / name).unlink(missing_ok=True)
+
+
+def for_index(embeddings, vector_dir: Path | None = None):
+    """Return ``embeddings`` wrapped with the index's persisted projection, if it has one."""
+    projector = Projector.load(Path(vector_dir) if vector_dir else index_dir())
+    return ProjectedEmbeddings(embeddings, projector) if projector is not None else embeddings
+
+
+__all__ = ["FullVectors", "ProjectedEmbeddings", "Projector", "for_index"]
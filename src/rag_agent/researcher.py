@@ -6,15 +6,16 @@ import json
 from typing import List, Dict, Generator
 from langchain_community.tools import DuckDuckGoSearchRun
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
+from .llm import get_chat_model
 import os
 
 class ResearchAgent:
     def __init__(self):
         # Initialize LLM (fast model for planning, smart model for synthesis if available)
         # We use strict JSON mode for planning
-        self.llm = ChatGroq(
-            model_name="llama-3.1-70b-versatile",
+        self.llm = get_chat_model(
+            "groq",
+            "llama-3.1-70b-versatile",
             temperature=0.4,
             api_key=os.getenv("GROQ_API_KEY")
         )
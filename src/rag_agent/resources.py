@@ -0,0 +1,110 @@
+"""Process-wide CPU budget shared by embedding, vision, plotting and ingest work.
+
+Torch (embeddings, BLIP captioning), ONNX Runtime and matplotlib each default
+to using every core, so two overlapping jobs oversubscribe the CPU. Here the
+torch intra-op pool is sized once (``RAG_TORCH_THREADS``) and every workload
+must hold a slot, weighted in threads, before running. The sum of running
+weights never exceeds ``RAG_CPU_THREADS``; callers wait instead of competing.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from contextlib import contextmanager
+
+from .config import settings
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_configured = False
+_configure_lock = threading.Lock()
+
+
+def configure_cpu() -> None:
+    """Size native thread pools once per process (idempotent)."""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        threads = str(settings.torch_threads)
+        # Read by OpenMP/MKL when they initialise (and inherited by ingest worker processes)
+        os.environ.setdefault("OMP_NUM_THREADS", threads)
+        os.environ.setdefault("MKL_NUM_THREADS", threads)
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        try:
+            import torch
+
+            torch.set_num_threads(settings.torch_threads)
+            try:
+                torch.set_num_interop_threads(1)
+            except RuntimeError:
+                pass  # Inter-op pool already started; intra-op sizing still applies
+        except ImportError:
+            pass
+
+
+class CPUBudget:
+    """Weighted admission control: running workloads never exceed ``total`` threads."""
+
+    def __init__(self, total: int) -> None:
+        self.total = max(1, total)
+        self._in_use = 0
+        self._running: dict[str, int] = {}
+        self._waiting: dict[str, int] = {}
+        self._cond = threading.Condition()
+
+    def cost(self, workload: str) -> int:
+        """Threads a workload occupies while it runs."""
+        if workload in ("embedding", "vision"):
+            cost = settings.torch_threads
+        elif workload == "ingest":
+            # Bulk ingest takes what's left after reserving room for one interactive torch job
+            cost = self.total - settings.torch_threads
+        else:
+            cost = 1  # plot and other single-threaded work
+        return min(max(1, cost), self.total)
+
+    @contextmanager
+    def slot(self, workload: str):
+        """Hold a share of the CPU for the duration of the block; yields the thread count."""
+        configure_cpu()
+        cost = self.cost(workload)
+        with self._cond:
+            self._waiting[workload] = self._waiting.get(workload, 0) + 1
+            self._cond.wait_for(lambda: self._in_use + cost <= self.total)
+            self._waiting[workload] -= 1
+            self._in_use += cost
+            self._running[workload] = self._running.get(workload, 0) + 1
+        try:
+            yield cost
+        finally:
+            with self._cond:
+                self._in_use -= cost
+                self._running[workload] -= 1
+                self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "total_threads": self.total,
+                "threads_in_use": self._in_use,
+                "running": {k: v for k, v in self._running.items() if v},
+                "waiting": {k: v for k, v in self._waiting.items() if v},
+            }
+
+
+_budget = CPUBudget(settings.cpu_threads)
+
+
+def cpu_slot(workload: str):
+    """Context manager reserving CPU for ``workload`` ("embedding", "vision", "plot", "ingest")."""
+    return _budget.slot(workload)
+
+
+def get_cpu_budget() -> CPUBudget:
+    return _budget
+
+
+__all__ = ["CPUBudget", "configure_cpu", "cpu_slot", "get_cpu_budget"]
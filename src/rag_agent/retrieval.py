@@ -0,0 +1,293 @@
+"""Parent-document retrieval: small child chunks for search, parent windows for answers."""
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from .config import settings
+from .manifest import index_dir, index_version, read_manifest
+from .reduction import FullVectors, Projector, ProjectedEmbeddings
+from .segments import SegmentedIndex, is_segmented, open_segmented_index
+
+PARENT_STORE_NAME = "echomindai_parents.jsonl"
+
+
+def split_parent_child(documents: list) -> tuple[list, dict[str, Document]]:
+    """Split documents into parent windows and the child chunks that get embedded.
+
+    Every child carries a ``parent_id`` in its metadata pointing at the parent
+    window it was cut from.
+    """
+    parent_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.parent_chunk_size,
+        chunk_overlap=settings.parent_chunk_overlap,
+    )
+    child_splitter = RecursiveCharacterTextSplitter(
+        chunk_size=settings.child_chunk_size,
+        chunk_overlap=settings.child_chunk_overlap,
+    )
+
+    parents: dict[str, Document] = {}
+    children = []
+    for parent in parent_splitter.split_documents(documents):
+        parent_id = uuid.uuid4().hex
+        parents[parent_id] = parent
+        for child in child_splitter.split_documents([parent]):
+            child.metadata["parent_id"] = parent_id
+            children.append(child)
+    return children, parents
+
+
+class ParentStore:
+    """Append-only JSONL docstore holding parent windows, loaded lazily on first lookup."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._docs: dict[str, Document] | None = None
+        self._mtime = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_dir(cls, vector_dir: Path) -> "ParentStore | None":
+        """Return the store persisted next to an index, or ``None`` if it has none."""
+        path = Path(vector_dir) / PARENT_STORE_NAME
+        return cls(path) if path.exists() else None
+
+    def write(self, parents: dict[str, Document], append: bool = False) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            with open(self.path, "a" if append else "w", encoding="utf-8") as f:
+                for parent_id, doc in parents.items():
+                    record = {"id": parent_id, "page_content": doc.page_content, "metadata": doc.metadata}
+                    f.write(json.dumps(record, default=str) + "\n")
+            # Invalidate so the next lookup re-reads the file
+            self._docs = None
+
+    def _load(self) -> dict[str, Document]:
+        with self._lock:
+            # Re-read when another process appended parents (incremental ingests)
+            mtime = self.path.stat().st_mtime if self.path.exists() else 0.0
+            if self._docs is None or mtime != self._mtime:
+                docs: dict[str, Document] = {}
+                self._mtime = mtime
+                if self.path.exists():
+                    with open(self.path, encoding="utf-8") as f:
+                        for line in f:
+                            if not line.strip():
+                                continue
+                            record = json.loads(line)
+                            docs[record["id"]] = Document(
+                                page_content=record["page_content"],
+                                metadata=record.get("metadata", {}),
+                            )
+                self._docs = docs
+            return self._docs
+
+    def get(self, parent_id: str) -> Document | None:
+        return self._load().get(parent_id)
+
+
+def load_vector_store(embeddings, vector_dir: Path | None = None):
+    """Load the persisted vector store, or create an empty one if missing."""
+    from langchain_community.vectorstores import FAISS
+
+    vector_path = Path(vector_dir) if vector_dir else index_dir()
+    projector = Projector.load(vector_path)
+    if projector is not None:
+        # Reduced-dimension index: queries must be projected like the stored vectors
+        embeddings = ProjectedEmbeddings(embeddings, projector)
+
+    if is_segmented(vector_path):
+        # Shared per process so there is a single compactor per index directory
+        return open_segmented_index(vector_path, embeddings)
+
+    if not (vector_path / "echomindai.faiss").exists():
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+        index = faiss.IndexFlatL2(len(embeddings.embed_query("hello")))
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore(),
+            index_to_docstore_id={}
+        )
+
+    return FAISS.load_local(
+        str(vector_path),
+        embeddings=embeddings,
+        index_name="echomindai",
+        allow_dangerous_deserialization=True,
+    )
+
+
+_retrieval_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def get_retrieval_executor() -> ThreadPoolExecutor:
+    """Bounded pool reserved for embedding and search work from async callers."""
+    global _retrieval_executor
+    with _executor_lock:
+        if _retrieval_executor is None:
+            _retrieval_executor = ThreadPoolExecutor(
+                max_workers=settings.retrieval_max_workers,
+                thread_name_prefix="retrieval",
+            )
+        return _retrieval_executor
+
+
+class Retriever:
+    """Similarity search over a vector store with optional parent expansion."""
+
+    def __init__(
+        self,
+        vector_store,
+        parent_store: ParentStore | None = None,
+        index_version: str = "unknown",
+        embeddings=None,
+        projector: Projector | None = None,
+        vector_dir: Path | None = None,
+        full_vectors=None,
+    ) -> None:
+        self.vector_store = vector_store
+        self.parent_store = parent_store
+        self.index_version = index_version
+        # Full-width model; projected into the index space by search_by_vector
+        self.embeddings = embeddings or getattr(vector_store, "embeddings", None)
+        self.projector = projector
+        # Set for retrievers over the persisted index, which can be reopened
+        self.vector_dir = vector_dir
+        # ids -> full-width vectors stored at ingest (or None), for re-scoring reduced indexes
+        self.full_vectors = full_vectors
+
+    @classmethod
+    def open(cls, embeddings=None, vector_store=None, vector_dir: Path | None = None) -> "Retriever":
+        """Build a retriever over the persisted index (or a store passed in explicitly).
+
+        Without ``embeddings``, queries are embedded (micro-batched) with the model
+        recorded in the index manifest.
+        """
+        vector_dir = Path(vector_dir or settings.vector_dir)
+        # One manifest read, so the files, version and query model all belong to the same index
+        manifest = read_manifest(vector_dir)
+        data_dir = index_dir(vector_dir, manifest)
+        if embeddings is None:
+            from .batching import get_query_embeddings
+
+            embeddings = get_query_embeddings(manifest.get("embedding_provider"), manifest.get("embedding_model"))
+        owned = vector_store is None
+        store = vector_store or load_vector_store(embeddings, data_dir)
+        projector = Projector.load(data_dir) if owned else None
+        full_vectors = None
+        if projector is not None:
+            if isinstance(store, SegmentedIndex):
+                full_vectors = store.full_vectors
+            elif (full := FullVectors.load(data_dir)) is not None:
+                full_vectors = full.rows
+        return cls(
+            store,
+            ParentStore.for_dir(data_dir),
+            str(manifest["version"]) if manifest.get("version") else index_version(vector_dir),
+            embeddings,
+            projector,
+            vector_dir if owned else None,
+            full_vectors,
+        )
+
+    def refreshed(self) -> "Retriever":
+        """This retriever, or a reopened one if the index on disk has a new version.
+
+        Re-ingests and model migrations write a new manifest version; the reopened
+        retriever embeds queries with whatever model the new index was built with.
+        """
+        if self.vector_dir is None or index_version(self.vector_dir) == self.index_version:
+            return self
+        return Retriever.open(vector_dir=self.vector_dir)
+
+    @property
+    def _fetch_k_factor(self) -> int:
+        return 1 if self.parent_store is None else max(1, settings.child_fetch_multiplier)
+
+    @property
+    def _rescoring(self) -> bool:
+        # Indexes built before full-width vectors were stored keep the reduced-space ranking
+        return self.projector is not None and self.full_vectors is not None and settings.embedding_rescore
+
+    def search(self, query: str, k: int = 4) -> list:
+        return self.search_by_vector(self.embeddings.embed_query(query), k)
+
+    def search_by_vector(self, embedding, k: int = 4) -> list:
+        """Search with a full-width query embedding."""
+        # Over-fetch children so that k distinct parents survive deduplication
+        fetch_k = k * self._fetch_k_factor
+        if self._rescoring:
+            fetch_k *= max(1, settings.rescore_factor)
+        index_vector = embedding
+        if self.projector is not None:
+            index_vector = self.projector.transform(embedding).tolist()
+        children = self.vector_store.similarity_search_by_vector(index_vector, k=fetch_k)
+        if self._rescoring:
+            children = self._rescore(embedding, children)
+        return self.expand(children, k)
+
+    def _rescore(self, embedding, candidates: list) -> list:
+        """Re-rank reduced-space candidates by cosine similarity of their stored full-width vectors."""
+        import numpy as np
+
+        if not candidates:
+            return candidates
+        vectors = self.full_vectors([doc.id for doc in candidates])
+        if vectors is None:
+            return candidates
+        query = np.asarray(embedding, dtype="float32")
+        scores = vectors @ query / np.clip(np.linalg.norm(vectors, axis=1) * np.linalg.norm(query), 1e-12, None)
+        return [candidates[i] for i in np.argsort(-scores)]
+
+    async def asearch(self, query: str, k: int = 4) -> list:
+        """Async search: embedding and lookup run as separate steps on the bounded pool.
+
+        Cancelling the awaiting task (e.g. an MCP client disconnect) skips any
+        step that has not started yet.
+        """
+        from .batching import BatchedEmbeddings
+
+        loop = asyncio.get_running_loop()
+        executor = get_retrieval_executor()
+        if isinstance(self.embeddings, BatchedEmbeddings):
+            embedding = await self.embeddings.aembed_query(query)
+        else:
+            embedding = await loop.run_in_executor(executor, self.embeddings.embed_query, query)
+        return await loop.run_in_executor(executor, self.search_by_vector, embedding, k)
+
+    def expand(self, children: list, k: int) -> list:
+        """Replace the top child hits with their parents, keeping rank order."""
+        if self.parent_store is None:
+            return children[:k]
+        results = []
+        seen: set[str] = set()
+        for child in children:
+            parent_id = child.metadata.get("parent_id")
+            if parent_id is None:
+                results.append(child)
+            elif parent_id not in seen:
+                seen.add(parent_id)
+                results.append(self.parent_store.get(parent_id) or child)
+            if len(results) >= k:
+                break
+        return results
+
+
+__all__ = [
+    "ParentStore",
+    "Retriever",
+    "get_retrieval_executor",
+    "load_vector_store",
+    "split_parent_child",
+]
@@ -0,0 +1,211 @@
+"""Shared retrieval service: one embedding model and index per host.
+
+``python -m rag_agent.cli serve`` starts a localhost HTTP daemon that owns the
+embedding model and vector store. Streamlit sessions, the MCP server and the
+CLI talk to it through :class:`RetrievalClient` (set
+``RAG_RETRIEVAL_SERVICE_URL``) instead of each loading their own copies.
+
+Endpoints (JSON over HTTP):
+
+- ``GET  /health``  -> ``{"status": "ok", "index_version": ...}``
+- ``POST /search``  ``{"query": str, "k": int}`` -> ``{"documents": [...], "index_version": ...}``
+- ``POST /embed``   ``{"texts": [str, ...]}`` -> ``{"embeddings": [[float, ...], ...]}``
+"""
+from __future__ import annotations
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from .config import settings
+from .embeddings import warmup_embeddings
+from .logger import setup_logger
+from .manifest import index_embedding_model, index_version
+from .retrieval import Retriever
+
+logger = setup_logger(__name__)
+
+
+class RetrievalService:
+    """Owns the embedding model and retriever; reloads when the index is rebuilt."""
+
+    def __init__(self) -> None:
+        # Queries use the model the index was built with, not necessarily the configured one
+        warmup_embeddings(*index_embedding_model())
+        self._lock = threading.Lock()
+        self.retriever = Retriever.open()
+
+    def _current(self) -> Retriever:
+        # A re-ingest or model migration writes a new manifest version; swap in the new index once
+        if index_version() != self.retriever.index_version:
+            with self._lock:
+                retriever = self.retriever.refreshed()
+                if retriever is not self.retriever:
+                    logger.info("Index changed on disk, reloading")
+                    self.retriever = retriever
+        return self.retriever
+
+    def search(self, query: str, k: int) -> dict:
+        retriever = self._current()
+        docs = retriever.search(query, k=k)
+        return {
+            "documents": [{"page_content": d.page_content, "metadata": d.metadata} for d in docs],
+            "index_version": retriever.index_version,
+        }
+
+    def embed(self, texts: list[str]) -> dict:
+        return {"embeddings": self._current().embeddings.embed_queries(texts)}
+
+    def health(self) -> dict:
+        return {"status": "ok", "index_version": self._current().index_version}
+
+
+def _make_handler(service: RetrievalService):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: dict) -> None:
+            body = json.dumps(payload, default=str).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, service.health())
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/search":
+                    k = max(1, min(int(request.get("k", 4)), 20))
+                    self._reply(200, service.search(request["query"], k))
+                elif self.path == "/embed":
+                    self._reply(200, service.embed(list(request["texts"])))
+                else:
+                    self._reply(404, {"error": f"Unknown path {self.path}"})
+            except (KeyError, ValueError) as e:
+                self._reply(400, {"error": f"Bad request: {e}"})
+            except Exception as e:
+                self._reply(500, {"error": str(e)})
+
+        def log_message(self, format, *args):  # noqa: A002 - silence per-request logs
+            pass
+
+    return Handler
+
+
+def serve(host: str | None = None, port: int | None = None) -> None:
+    """Run the retrieval daemon until interrupted."""
+    host = host or settings.retrieval_service_host
+    port = port or settings.retrieval_service_port
+    service = RetrievalService()
+    server = ThreadingHTTPServer((host, port), _make_handler(service))
+    server.daemon_threads = True
+    logger.info("Retrieval service listening on http://%s:%d", host, port)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class _RemoteEmbeddings(Embeddings):
+    def __init__(self, client: "RetrievalClient") -> None:
+        self.client = client
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self.client._post("/embed", {"texts": texts})["embeddings"]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+
+class RetrievalClient:
+    """Thin client with the same ``search``/``index_version`` surface as :class:`Retriever`."""
+
+    vector_store = None
+    # Seconds between /health calls made just to notice a new index version
+    version_check_interval = 1.0
+
+    def __init__(self, base_url: str, timeout: float = 30.0) -> None:
+        import httpx
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._http = httpx.Client(base_url=self.base_url, timeout=timeout)
+        self._ahttp = None
+        self.embeddings = _RemoteEmbeddings(self)
+        self._index_version = "unknown"
+        self._version_checked = float("-inf")
+        self._version_lock = threading.Lock()
+
+    def _post(self, path: str, payload: dict) -> dict:
+        response = self._http.post(path, json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def health(self) -> dict:
+        response = self._http.get("/health")
+        response.raise_for_status()
+        payload = response.json()
+        self._set_version(payload)
+        return payload
+
+    @property
+    def index_version(self) -> str:
+        """The service's index version, re-checked at most every ``version_check_interval`` seconds."""
+        self._check_version()
+        return self._index_version
+
+    def refreshed(self) -> "RetrievalClient":
+        """The service reloads changed indexes itself; this only picks up its new version."""
+        self._check_version()
+        return self
+
+    def _check_version(self) -> None:
+        with self._version_lock:
+            if time.monotonic() - self._version_checked < self.version_check_interval:
+                return
+            # Set before the call so a down service is not asked again on every lookup
+            self._version_checked = time.monotonic()
+        try:
+            self.health()
+        except Exception as e:
+            logger.warning("Could not check the retrieval service's index version: %s", e)
+
+    def _set_version(self, payload: dict) -> None:
+        version = payload.get("index_version")
+        if version is not None:
+            with self._version_lock:
+                self._index_version = version
+                self._version_checked = time.monotonic()
+
+    def search(self, query: str, k: int = 4) -> list:
+        return self._documents(self._post("/search", {"query": query, "k": k}))
+
+    async def asearch(self, query: str, k: int = 4) -> list:
+        """Native async search; cancelling the caller closes the HTTP request."""
+        import httpx
+
+        if self._ahttp is None:
+            self._ahttp = httpx.AsyncClient(base_url=self.base_url, timeout=self.timeout)
+        response = await self._ahttp.post("/search", json={"query": query, "k": k})
+        response.raise_for_status()
+        return self._documents(response.json())
+
+    def _documents(self, payload: dict) -> list:
+        self._set_version(payload)
+        return [
+            Document(page_content=d["page_content"], metadata=d.get("metadata", {}))
+            for d in payload["documents"]
+        ]
+
+
+__all__ = ["RetrievalClient", "RetrievalService", "serve"]
@@ -0,0 +1,595 @@
+"""Health-aware routing across a chain of chat models.
+
+Replaces ``with_fallbacks``, which tries every model in order on every request
+and so pays a failed call to the primary for as long as it is rate-limited.
+:class:`ModelRouter` keeps per-model health (EWMA error rate and latency) shared
+by every agent in the process, opens a circuit on a failing model for a
+cooldown window, and sends traffic straight to the healthiest model. After the
+cooldown a single probe request is let through; success closes the circuit.
+
+With ``RAG_LLM_HEDGE_AFTER_MS`` set, a request whose first token has not
+arrived within that threshold also starts the next model in the chain; the
+first to stream wins and the other is cancelled.
+"""
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Iterator
+
+from langchain_core.callbacks import AsyncCallbackManager, CallbackManager
+from langchain_core.messages import AIMessage, HumanMessage, convert_to_messages, message_chunk_to_message
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, LLMResult
+from langchain_core.runnables import Runnable, RunnableConfig, ensure_config
+
+from .cancellation import Cancelled
+from .config import settings
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+_EWMA_ALPHA = 0.2
+# Error-rate samples needed before the rate alone can open a circuit
+_MIN_SAMPLES = 5
+_MAX_COOLDOWN_FACTOR = 10
+
+
+def _status_code(error: Exception) -> int | None:
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+
+def _retry_after(error: Exception) -> float | None:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def is_rate_limit(error: Exception) -> bool:
+    return _status_code(error) == 429 or "ratelimit" in type(error).__name__.lower()
+
+
+class ModelHealth:
+    """Circuit breaker plus rolling error/latency statistics for one model."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.state = "closed"  # closed -> open -> half_open -> closed
+        self.error_rate = 0.0
+        self.latency = None  # EWMA seconds of successful calls
+        self.requests = 0
+        self.failures = 0
+        self.short_circuits = 0
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.cooldown = settings.llm_circuit_cooldown
+        self.last_error = ""
+        self._latencies: deque[float] = deque(maxlen=200)
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        return self.state == "closed" and self.error_rate < settings.llm_circuit_error_rate / 2
+
+    def acquire(self) -> bool:
+        """Whether a request may be sent now; half-open circuits admit a single probe."""
+        with self._lock:
+            if self.state == "open" and time.monotonic() >= self.open_until:
+                self.state = "half_open"
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            self.short_circuits += 1
+            return False
+
+    def release(self) -> None:
+        """End a probe that finished without recording an outcome (e.g. an abandoned stream)."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self, seconds: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.error_rate *= 1 - _EWMA_ALPHA
+            self.latency = seconds if self.latency is None else (
+                _EWMA_ALPHA * seconds + (1 - _EWMA_ALPHA) * self.latency
+            )
+            self._latencies.append(seconds)
+            self.consecutive_failures = 0
+            if self.state != "closed":
+                logger.info("Circuit for %s closed", self.name)
+            self.state = "closed"
+            self.cooldown = settings.llm_circuit_cooldown
+            self._probing = False
+
+    def record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.error_rate = _EWMA_ALPHA + (1 - _EWMA_ALPHA) * self.error_rate
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            rate_limited = is_rate_limit(error)
+            trip = (
+                rate_limited
+                or self.state == "half_open"
+                or self.consecutive_failures >= settings.llm_circuit_failures
+                or (self.requests >= _MIN_SAMPLES and self.error_rate >= settings.llm_circuit_error_rate)
+            )
+            if trip:
+                if self.state == "half_open":
+                    # Failed probe: back off further before the next one
+                    self.cooldown = min(self.cooldown * 2, settings.llm_circuit_cooldown * _MAX_COOLDOWN_FACTOR)
+                cooldown = (rate_limited and _retry_after(error)) or self.cooldown
+                self.state = "open"
+                self.open_until = time.monotonic() + cooldown
+                logger.warning("Circuit for %s open for %.0fs (%s)", self.name, cooldown, self.last_error)
+            self._probing = False
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def percentile(p: float) -> float | None:
+                if not latencies:
+                    return None
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000, 1)
+
+            return {
+                "model": self.name,
+                "state": self.state,
+                "requests": self.requests,
+                "failures": self.failures,
+                "short_circuits": self.short_circuits,
+                "error_rate": round(self.error_rate, 3),
+                "latency_ms": round(self.latency * 1000, 1) if self.latency is not None else None,
+                "p50_ms": percentile(0.5),
+                "p95_ms": percentile(0.95),
+                "open_for_s": round(max(0.0, self.open_until - time.monotonic()), 1) if self.state == "open" else 0,
+                "last_error": self.last_error,
+            }
+
+
+_health: dict[str, ModelHealth] = {}
+_health_lock = threading.Lock()
+
+
+def model_health(name: str) -> ModelHealth:
+    """Process-wide health record for a model (shared by every router and agent)."""
+    with _health_lock:
+        if name not in _health:
+            _health[name] = ModelHealth(name)
+        return _health[name]
+
+
+def routing_metrics() -> list[dict]:
+    """Per-model circuit state, error rate and latency for every routed model."""
+    with _health_lock:
+        records = list(_health.values())
+    return [record.snapshot() for record in records]
+
+
+def _model_name(model) -> str:
+    return str(getattr(model, "model_name", None) or getattr(model, "model", None) or type(model).__name__)
+
+
+class ModelRouter(Runnable):
+    """Chat-model runnable that routes each request to the healthiest model in a chain.
+
+    Models keep their configured order as a preference; healthy closed circuits
+    come first, degraded ones next, and open circuits are skipped until their
+    cooldown ends. A failure before any output moves on to the next candidate.
+    """
+
+    def __init__(self, models: list[tuple[str, Runnable]], hedge_after: float | None = None) -> None:
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.models = models
+        # Seconds without a first token before the next model is raced (None disables hedging)
+        self.hedge_after = hedge_after
+
+    @classmethod
+    def from_models(cls, *models, hedge_after: float | None = None) -> "ModelRouter":
+        return cls([(_model_name(model), model) for model in models], hedge_after=hedge_after)
+
+    def bind_tools(self, tools, **kwargs) -> "ModelRouter":
+        # Bound copies share the same health records (looked up by name)
+        return ModelRouter(
+            [(name, model.bind_tools(tools, **kwargs)) for name, model in self.models],
+            hedge_after=self.hedge_after,
+        )
+
+    def _candidates(self) -> Iterator[tuple[str, Runnable, ModelHealth]]:
+        ranked = sorted(
+            enumerate(self.models),
+            key=lambda item: (
+                model_health(item[1][0]).state != "closed",
+                not model_health(item[1][0]).healthy,
+                item[0],
+            ),
+        )
+        admitted = False
+        for _, (name, model) in ranked:
+            health = model_health(name)
+            if health.acquire():
+                admitted = True
+                yield name, model, health
+        if not admitted:
+            # Every circuit is open: try the one closest to reopening rather than failing outright
+            name, model = min(self.models, key=lambda item: model_health(item[0]).open_until)
+            yield name, model, model_health(name)
+
+    def invoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        if self.hedge_after is not None:
+            return _collect(self._hedged_stream(input, config, **kwargs))
+        last_error: Exception | None = None
+        for _, model, health in self._candidates():
+            start = time.perf_counter()
+            try:
+                result = model.invoke(input, config, **kwargs)
+            except Cancelled:
+                health.release()  # The user pressed Stop: not the model's fault, and no failover
+                raise
+            except Exception as e:
+                health.record_failure(e)
+                last_error = e
+                continue
+            except BaseException:
+                health.release()  # Interrupted: no verdict on the model
+                raise
+            health.record_success(time.perf_counter() - start)
+            return result
+        raise last_error
+
+    async def ainvoke(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Any:
+        if self.hedge_after is not None:
+            return _collect([chunk async for chunk in self._ahedged_stream(input, config, **kwargs)])
+        last_error: Exception | None = None
+        for _, model, health in self._candidates():
+            start = time.perf_counter()
+            try:
+                result = await model.ainvoke(input, config, **kwargs)
+            except Cancelled:
+                health.release()  # The user pressed Stop: not the model's fault, and no failover
+                raise
+            except Exception as e:
+                health.record_failure(e)
+                last_error = e
+                continue
+            except BaseException:
+                health.release()  # Cancelled: no verdict on the model
+                raise
+            health.record_success(time.perf_counter() - start)
+            return result
+        raise last_error
+
+    def stream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> Iterator:
+        if self.hedge_after is not None:
+            yield from self._hedged_stream(input, config, **kwargs)
+            return
+        last_error: Exception | None = None
+        for _, model, health in self._candidates():
+            start = time.perf_counter()
+            started = False
+            try:
+                for chunk in model.stream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Cancelled:
+                health.release()  # The user pressed Stop: not the model's fault, and no failover
+                raise
+            except Exception as e:
+                health.record_failure(e)
+                if started:
+                    raise  # Output already reached the caller; cannot switch models mid-answer
+                last_error = e
+                continue
+            except BaseException:
+                health.release()  # Consumer stopped reading
+                raise
+            health.record_success(time.perf_counter() - start)
+            return
+        raise last_error
+
+    async def astream(self, input: Any, config: RunnableConfig | None = None, **kwargs: Any) -> AsyncIterator:
+        if self.hedge_after is not None:
+            async for chunk in self._ahedged_stream(input, config, **kwargs):
+                yield chunk
+            return
+        last_error: Exception | None = None
+        for _, model, health in self._candidates():
+            start = time.perf_counter()
+            started = False
+            try:
+                async for chunk in model.astream(input, config, **kwargs):
+                    started = True
+                    yield chunk
+            except Cancelled:
+                health.release()
+                raise
+            except Exception as e:
+                health.record_failure(e)
+                if started:
+                    raise
+                last_error = e
+                continue
+            except BaseException:
+                health.release()
+                raise
+            health.record_success(time.perf_counter() - start)
+            return
+        raise last_error
+
+    # --- Hedging --------------------------------------------------------
+    #
+    # Candidates stream with their callbacks stripped so two racing models never
+    # interleave tokens in a UI; the router reports the winner's tokens itself
+    # under a single chat-model run.
+
+    def _hedged_stream(self, input: Any, config: RunnableConfig | None, **kwargs: Any) -> Iterator:
+        config = ensure_config(config)
+        run = CallbackManager.configure(
+            config.get("callbacks"),
+            inheritable_tags=config.get("tags"),
+            inheritable_metadata=config.get("metadata"),
+        ).on_chat_model_start({"name": type(self).__name__}, [_messages(input)], name=config.get("run_name"))[0]
+        quiet = {**config, "callbacks": None}
+        candidates = self._candidates()
+        events: queue.Queue = queue.Queue()
+        racers: list[_Racer] = []
+
+        def launch() -> bool:
+            for name, model, health in candidates:
+                racer = _Racer(name, model, health, events)
+                racer.start(input, quiet, kwargs)
+                racers.append(racer)
+                return True
+            return False
+
+        launch()
+        deadline = time.monotonic() + self.hedge_after
+        hedged = False
+        winner = None
+        chunks: list = []
+        last_error: Exception | None = None
+        try:
+            while winner is None:
+                if all(racer.finished for racer in racers):
+                    # Everything launched so far failed: fail over immediately
+                    if not launch():
+                        raise last_error
+                    deadline = time.monotonic() + self.hedge_after
+                try:
+                    timeout = None if hedged else max(0.0, deadline - time.monotonic())
+                    racer, kind, payload = events.get(timeout=timeout)
+                except queue.Empty:
+                    hedged = True
+                    if launch():
+                        logger.info("No first token after %.1fs; racing %s", self.hedge_after, racers[-1].name)
+                    continue
+                if kind == "error":
+                    racer.finished = True
+                    racer.health.record_failure(payload)
+                    last_error = payload
+                    continue
+                winner = racer
+                if kind == "chunk":
+                    chunks.append(payload)
+                else:
+                    winner.finished = True  # Empty response
+
+            for racer in racers:
+                if racer is not winner and not racer.finished:
+                    racer.cancel()
+
+            while True:
+                if chunks:
+                    chunk = chunks.pop(0)
+                    _emit(run, chunk)
+                    yield chunk
+                    continue
+                if winner.finished:
+                    break
+                racer, kind, payload = events.get()
+                if racer is not winner:
+                    continue
+                if kind == "chunk":
+                    chunks.append(payload)
+                elif kind == "error":
+                    winner.health.record_failure(payload)
+                    raise payload
+                else:
+                    winner.finished = True
+        except BaseException as e:
+            for racer in racers:
+                racer.cancel()
+            run.on_llm_error(e)
+            raise
+        winner.health.record_success(time.perf_counter() - winner.started)
+        run.on_llm_end(LLMResult(generations=[[ChatGeneration(message=_collect(winner.chunks))]]))
+
+    async def _ahedged_stream(self, input: Any, config: RunnableConfig | None, **kwargs: Any) -> AsyncIterator:
+        config = ensure_config(config)
+        run = (await AsyncCallbackManager.configure(
+            config.get("callbacks"),
+            inheritable_tags=config.get("tags"),
+            inheritable_metadata=config.get("metadata"),
+        ).on_chat_model_start({"name": type(self).__name__}, [_messages(input)], name=config.get("run_name")))[0]
+        quiet = {**config, "callbacks": None}
+        candidates = self._candidates()
+        events: asyncio.Queue = asyncio.Queue()
+        racers: list[_AsyncRacer] = []
+
+        def launch() -> bool:
+            for name, model, health in candidates:
+                racers.append(_AsyncRacer(name, model, health, events, input, quiet, kwargs))
+                return True
+            return False
+
+        launch()
+        deadline = time.monotonic() + self.hedge_after
+        hedged = False
+        winner = None
+        last_error: Exception | None = None
+        try:
+            while winner is None:
+                if all(racer.finished for racer in racers):
+                    if not launch():
+                        raise last_error
+                    deadline = time.monotonic() + self.hedge_after
+                try:
+                    timeout = None if hedged else max(0.0, deadline - time.monotonic())
+                    racer, kind, payload = await asyncio.wait_for(events.get(), timeout)
+                except asyncio.TimeoutError:
+                    hedged = True
+                    if launch():
+                        logger.info("No first token after %.1fs; racing %s", self.hedge_after, racers[-1].name)
+                    continue
+                if kind == "error":
+                    racer.finished = True
+                    racer.health.record_failure(payload)
+                    last_error = payload
+                    continue
+                winner = racer
+                pending = [payload] if kind == "chunk" else []
+                winner.finished = kind == "done"
+
+            for racer in racers:
+                if racer is not winner:
+                    racer.cancel()
+
+            while True:
+                for chunk in pending:
+                    await run.on_llm_new_token(_token(chunk), chunk=ChatGenerationChunk(message=chunk))
+                    yield chunk
+                pending = []
+                if winner.finished:
+                    break
+                racer, kind, payload = await events.get()
+                if racer is not winner:
+                    continue
+                if kind == "chunk":
+                    pending.append(payload)
+                elif kind == "error":
+                    winner.health.record_failure(payload)
+                    raise payload
+                else:
+                    winner.finished = True
+        except BaseException as e:
+            for racer in racers:
+                racer.cancel()
+            await run.on_llm_error(e)
+            raise
+        winner.health.record_success(time.perf_counter() - winner.started)
+        await run.on_llm_end(LLMResult(generations=[[ChatGeneration(message=_collect(winner.chunks))]]))
+
+
+class _Racer:
+    """One candidate streaming into a shared queue from its own thread.
+
+    Threads cannot be interrupted, so a cancelled racer stops (closing its HTTP
+    stream) when its next chunk arrives.
+    """
+
+    def __init__(self, name: str, model: Runnable, health: ModelHealth, events: queue.Queue) -> None:
+        self.name = name
+        self.model = model
+        self.health = health
+        self.events = events
+        self.chunks: list = []
+        self.finished = False
+        self.started = time.perf_counter()
+        self._cancelled = threading.Event()
+
+    def start(self, input: Any, config: RunnableConfig, kwargs: dict) -> None:
+        threading.Thread(
+            target=self._run, args=(input, config, kwargs), name=f"hedge-{self.name}", daemon=True
+        ).start()
+
+    def _run(self, input: Any, config: RunnableConfig, kwargs: dict) -> None:
+        stream = self.model.stream(input, config, **kwargs)
+        try:
+            for chunk in stream:
+                if self._cancelled.is_set():
+                    return
+                self.chunks.append(chunk)
+                self.events.put((self, "chunk", chunk))
+        except Exception as e:
+            self.events.put((self, "error", e))
+            return
+        finally:
+            stream.close()
+        self.events.put((self, "done", None))
+
+    def cancel(self) -> None:
+        if not self._cancelled.is_set():
+            self._cancelled.set()
+            self.health.release()  # No verdict on a model we stopped waiting for
+
+
+class _AsyncRacer:
+    """One candidate streaming into a shared queue as an asyncio task."""
+
+    def __init__(self, name, model, health, events: asyncio.Queue, input, config, kwargs) -> None:
+        self.name = name
+        self.model = model
+        self.health = health
+        self.events = events
+        self.chunks: list = []
+        self.finished = False
+        self.started = time.perf_counter()
+        self._task = asyncio.ensure_future(self._run(input, config, kwargs))
+
+    async def _run(self, input, config, kwargs) -> None:
+        try:
+            async for chunk in self.model.astream(input, config, **kwargs):
+                self.chunks.append(chunk)
+                await self.events.put((self, "chunk", chunk))
+        except Exception as e:
+            await self.events.put((self, "error", e))
+            return
+        await self.events.put((self, "done", None))
+
+    def cancel(self) -> None:
+        if not self._task.done():
+            self._task.cancel()
+            self.health.release()
+
+
+def _messages(input: Any) -> list:
+    if hasattr(input, "to_messages"):
+        return input.to_messages()
+    if isinstance(input, str):
+        return [HumanMessage(content=input)]
+    return convert_to_messages(input)
+
+
+def _token(chunk) -> str:
+    return chunk.content if isinstance(chunk.content, str) else ""
+
+
+def _emit(run, chunk) -> None:
+    run.on_llm_new_token(_token(chunk), chunk=ChatGenerationChunk(message=chunk))
+
+
+def _collect(chunks):
+    """Merge streamed message chunks into one message (tool-call chunks included)."""
+    merged = None
+    for chunk in chunks:
+        merged = chunk if merged is None else merged + chunk
+    if merged is None:
+        return AIMessage(content="")
+    return message_chunk_to_message(merged)
+
+
+__all__ = ["ModelHealth", "ModelRouter", "is_rate_limit", "model_health", "routing_metrics"]
@@ -0,0 +1,404 @@
+"""Segment-based (LSM-style) vector index with background compaction.
+
+New ingests are written as small immutable FAISS segments under
+``<vector_dir>/segments/`` and recorded in ``segments.json``. Queries fan out
+across every segment and merge by distance. Deletes are tombstones in the
+manifest; a background compactor merges segments into one and purges
+tombstoned vectors.
+"""
+from __future__ import annotations
+
+import heapq
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+
+from .config import settings
+from .logger import setup_logger
+from .reduction import FullVectors
+
+logger = setup_logger(__name__)
+
+SEGMENTS_MANIFEST = "segments.json"
+SEGMENTS_DIR = "segments"
+MANIFEST_LOCK = "segments.lock"
+
+
+@contextmanager
+def _file_lock(path: Path):
+    """Exclusive inter-process lock on ``path`` (blocking; held only for manifest updates)."""
+    with open(path, "a+b") as f:
+        if os.name == "nt":
+            import msvcrt
+
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+        else:
+            import fcntl
+
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def is_segmented(vector_dir: Path) -> bool:
+    return (Path(vector_dir) / SEGMENTS_MANIFEST).exists()
+
+
+class SegmentedIndex:
+    """Vector store facade over a list of immutable FAISS segments."""
+
+    def __init__(self, root: Path, embeddings) -> None:
+        self.root = Path(root)
+        self.embeddings = embeddings
+        self._segments: dict[str, FAISS] = {}
+        self._order: list[str] = []
+        self._tombstones: set[str] = set()
+        self._full: dict[str, FullVectors | None] = {}  # Loaded lazily, on the first re-score
+        self._manifest_mtime = 0.0
+        self._lock = threading.RLock()
+        self._compactor: threading.Thread | None = None
+        self._stop = threading.Event()
+        self.refresh()
+
+    # --- Manifest -------------------------------------------------------
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.root / SEGMENTS_MANIFEST
+
+    def _segment_dir(self, segment_id: str) -> Path:
+        return self.root / SEGMENTS_DIR / segment_id
+
+    def _read_manifest(self) -> dict:
+        if not self._manifest_path.exists():
+            return {"segments": [], "tombstones": []}
+        payload = json.loads(self._manifest_path.read_text(encoding="utf-8"))
+        return {"segments": list(payload.get("segments", [])), "tombstones": list(payload.get("tombstones", []))}
+
+    def _apply(self, payload: dict) -> None:
+        """Make the in-memory view match ``payload`` (caller holds ``self._lock``)."""
+        order = payload["segments"]
+        for segment_id in order:
+            if segment_id not in self._segments:
+                self._segments[segment_id] = FAISS.load_local(
+                    str(self._segment_dir(segment_id)),
+                    embeddings=self.embeddings,
+                    index_name="echomindai",
+                    allow_dangerous_deserialization=True,
+                )
+        for segment_id in set(self._segments) - set(order):
+            del self._segments[segment_id]
+            self._full.pop(segment_id, None)
+        self._order = list(order)
+        self._tombstones = set(payload["tombstones"])
+        self._manifest_mtime = self._manifest_path.stat().st_mtime if self._manifest_path.exists() else 0.0
+
+    @contextmanager
+    def _manifest_update(self):
+        """Read-modify-write of the manifest, serialized across processes.
+
+        Yields the payload as it is on disk (not this process's possibly stale
+        view), so segments and tombstones written by another process (CLI
+        ``add`` vs. a compacting UI or MCP server) are never dropped.
+        """
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._lock, _file_lock(self.root / MANIFEST_LOCK):
+            payload = self._read_manifest()
+            yield payload
+            tmp_path = self._manifest_path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(payload, indent=2), encoding="utf-8")
+            tmp_path.replace(self._manifest_path)
+            self._apply(payload)
+
+    def refresh(self) -> None:
+        """Pick up segments and tombstones written by other processes."""
+        if not self._manifest_path.exists():
+            return
+        mtime = self._manifest_path.stat().st_mtime
+        if mtime == self._manifest_mtime:
+            return
+        with self._lock:
+            self._apply(self._read_manifest())
+
+    # --- Writes ---------------------------------------------------------
+
+    def reset(self) -> None:
+        """Drop every segment (used by full re-ingests)."""
+        with self._manifest_update() as payload:
+            previous = payload["segments"]
+            payload["segments"], payload["tombstones"] = [], []
+        for segment_id in previous:
+            shutil.rmtree(self._segment_dir(segment_id), ignore_errors=True)
+
+    def _write_segment(self, store: FAISS, full_vectors: FullVectors | None = None) -> str:
+        segment_id = f"{int(time.time() * 1000)}-{uuid.uuid4().hex[:6]}"
+        store.save_local(str(self._segment_dir(segment_id)), index_name="echomindai")
+        if full_vectors is not None:
+            full_vectors.save(self._segment_dir(segment_id))
+        return segment_id
+
+    def add_documents(
+        self, documents: list, store: FAISS | None = None, full_vectors: FullVectors | None = None
+    ) -> str | None:
+        """Write documents as a new immutable segment. Returns the segment id.
+
+        ``full_vectors`` are the full-width vectors of a reduced-dimension
+        ``store``, kept in the segment for re-scoring.
+        """
+        if not documents and store is None:
+            return None
+        store = store or FAISS.from_documents(documents, self.embeddings)
+        segment_id = self._write_segment(store, full_vectors)
+        with self._manifest_update() as payload:
+            self._segments[segment_id] = store  # Already in memory; don't reload it from disk
+            payload["segments"].append(segment_id)
+        return segment_id
+
+    def delete(self, ids) -> None:
+        """Tombstone docstore ids; vectors are purged at the next compaction."""
+        with self._manifest_update() as payload:
+            payload["tombstones"] = sorted(set(payload["tombstones"]).union(ids))
+
+    def delete_source(self, source: str) -> int:
+        """Tombstone every chunk whose ``source`` metadata matches. Returns the count."""
+        ids = []
+        with self._lock:
+            for store in self._segments.values():
+                for doc_id, doc in store.docstore._dict.items():
+                    if doc.metadata.get("source") == source:
+                        ids.append(doc_id)
+        if ids:
+            self.delete(ids)
+        return len(ids)
+
+    def save_local(self, *_args, **_kwargs) -> None:
+        """Segments are persisted as they are written; nothing to rewrite."""
+
+    # --- Reads ----------------------------------------------------------
+
+    def documents(self):
+        """Yield ``(doc_id, document)`` for every live chunk, in segment order."""
+        self.refresh()
+        with self._lock:
+            segments = [self._segments[s] for s in self._order]
+            tombstones = set(self._tombstones)
+        for store in segments:
+            for idx in range(store.index.ntotal):
+                doc_id = store.index_to_docstore_id[idx]
+                if doc_id not in tombstones:
+                    yield doc_id, store.docstore.search(doc_id)
+
+    def similarity_search_with_score_by_vector(self, embedding, k: int = 4) -> list:
+        self.refresh()
+        vector = np.asarray([embedding], dtype="float32")
+        with self._lock:
+            segments = [self._segments[s] for s in self._order]
+            tombstones = self._tombstones
+        candidates = []
+        for store in segments:
+            if store.index.ntotal == 0:
+                continue
+            # Over-fetch by the tombstone count so deleted hits don't starve the result
+            fetch_k = min(store.index.ntotal, k + len(tombstones))
+            scores, indices = store.index.search(vector, fetch_k)
+            for score, idx in zip(scores[0], indices[0]):
+                if idx < 0:
+                    continue
+                doc_id = store.index_to_docstore_id[idx]
+                if doc_id in tombstones:
+                    continue
+                candidates.append((float(score), doc_id, store))
+        best = heapq.nsmallest(k, candidates, key=lambda c: c[0])
+        return [(store.docstore.search(doc_id), score) for score, doc_id, store in best]
+
+    def _full_vectors(self, segment_id: str) -> FullVectors | None:
+        with self._lock:
+            if segment_id not in self._full:
+                self._full[segment_id] = FullVectors.load(self._segment_dir(segment_id))
+            return self._full[segment_id]
+
+    def full_vectors(self, ids: list) -> np.ndarray | None:
+        """Full-width vectors for docstore ``ids`` across segments, or ``None`` if any is missing."""
+        with self._lock:
+            order = list(self._order)
+        found = {}
+        for segment_id in order:
+            full = self._full_vectors(segment_id)
+            if full is None:
+                continue
+            wanted = [doc_id for doc_id in ids if doc_id in full and doc_id not in found]
+            if wanted:
+                found.update(zip(wanted, full.rows(wanted)))
+        if len(found) < len(set(ids)):
+            return None
+        return np.stack([found[doc_id] for doc_id in ids])
+
+    def similarity_search_by_vector(self, embedding, k: int = 4, **_kwargs) -> list:
+        return [doc for doc, _ in self.similarity_search_with_score_by_vector(embedding, k=k)]
+
+    def similarity_search_with_score(self, query: str, k: int = 4) -> list:
+        return self.similarity_search_with_score_by_vector(self.embeddings.embed_query(query), k=k)
+
+    def similarity_search(self, query: str, k: int = 4, **_kwargs) -> list:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k=k)]
+
+    # --- Compaction -----------------------------------------------------
+
+    def needs_compaction(self) -> bool:
+        with self._lock:
+            return len(self._order) >= settings.compaction_min_segments or bool(self._tombstones)
+
+    def compact(self) -> bool:
+        """Merge all current segments into one, dropping tombstoned vectors."""
+        self.refresh()
+        with self._lock:
+            snapshot = list(self._order)
+            tombstones = set(self._tombstones)
+            segments = [self._segments[s] for s in snapshot]
+        if len(snapshot) < 2 and not tombstones:
+            return False
+
+        # Several processes (UI, MCP, CLI) may share the directory; only one compacts at a time
+        lock_fd = self._try_lock()
+        if lock_fd is None:
+            return False
+        try:
+            return self._compact(snapshot, tombstones, segments)
+        finally:
+            self._unlock(lock_fd)
+
+    @property
+    def _lock_path(self) -> Path:
+        return self.root / "compact.lock"
+
+    def _try_lock(self) -> int | None:
+        try:
+            return os.open(self._lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if time.time() - self._lock_path.stat().st_mtime >= 3600:
+                self._lock_path.unlink(missing_ok=True)  # Stale lock from a crashed compactor
+            return None
+
+    def _unlock(self, lock_fd: int) -> None:
+        os.close(lock_fd)
+        self._lock_path.unlink(missing_ok=True)
+
+    def _compact(self, snapshot: list, tombstones: set, segments: list) -> bool:
+        import faiss
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+
+        # Build the merged segment outside the lock; queries keep using the old ones
+        texts, vectors, metadatas, ids = [], [], [], []
+        full_ids, full_blocks = [], []
+        for segment_id, store in zip(snapshot, segments):
+            if store.index.ntotal == 0:
+                continue
+            stored = store.index.reconstruct_n(0, store.index.ntotal)
+            kept = []
+            for idx, doc_id in store.index_to_docstore_id.items():
+                if doc_id in tombstones:
+                    continue
+                doc = store.docstore.search(doc_id)
+                texts.append(doc.page_content)
+                metadatas.append(doc.metadata)
+                vectors.append(stored[idx])
+                ids.append(doc_id)
+                kept.append(doc_id)
+            full = self._full_vectors(segment_id)
+            if full is not None and (kept := [doc_id for doc_id in kept if doc_id in full]):
+                full_ids.extend(kept)
+                full_blocks.append(full.rows(kept))
+
+        merged = None
+        if ids:
+            merged = FAISS(
+                embedding_function=self.embeddings,
+                index=faiss.IndexFlatL2(len(vectors[0])),
+                docstore=InMemoryDocstore(),
+                index_to_docstore_id={},
+            )
+            merged.add_embeddings(list(zip(texts, vectors)), metadatas=metadatas, ids=ids)
+        merged_full = FullVectors(full_ids, np.vstack(full_blocks)) if full_blocks else None
+        merged_id = self._write_segment(merged, merged_full) if merged is not None else None
+
+        with self._manifest_update() as payload:
+            if not set(snapshot) <= set(payload["segments"]):
+                # A reset replaced the segments meanwhile; the merge is stale
+                stale = True
+            else:
+                stale = False
+                # Segments appended (by any process) while we were merging stay, as do new tombstones
+                newer = [s for s in payload["segments"] if s not in snapshot]
+                payload["segments"] = ([merged_id] if merged_id else []) + newer
+                payload["tombstones"] = sorted(set(payload["tombstones"]) - tombstones)
+                if merged is not None:
+                    self._segments[merged_id] = merged
+        if stale:
+            if merged_id:
+                shutil.rmtree(self._segment_dir(merged_id), ignore_errors=True)
+            logger.info("Discarded a compaction that raced with a reset")
+            return False
+        for segment_id in snapshot:
+            shutil.rmtree(self._segment_dir(segment_id), ignore_errors=True)
+        logger.info("Compacted %d segments (%d tombstones purged)", len(snapshot), len(tombstones))
+        return True
+
+    def start_compactor(self, interval: float | None = None) -> None:
+        """Run compaction periodically on a daemon thread."""
+        if self._compactor is not None:
+            return
+        interval = interval or settings.compaction_interval
+
+        def run():
+            while not self._stop.wait(interval):
+                if not self.root.exists():
+                    break  # An older index generation, pruned after a model migration
+                try:
+                    if self.needs_compaction():
+                        self.compact()
+                except Exception as e:
+                    logger.error("Segment compaction failed: %s", e)
+
+        self._compactor = threading.Thread(target=run, name="segment-compactor", daemon=True)
+        self._compactor.start()
+
+    def stop_compactor(self) -> None:
+        self._stop.set()
+
+
+_open_indexes: dict[Path, SegmentedIndex] = {}
+_open_lock = threading.Lock()
+
+
+def open_segmented_index(root: Path, embeddings) -> SegmentedIndex:
+    """Return the process-wide index for a directory, starting its compactor once."""
+    root = Path(root).resolve()
+    with _open_lock:
+        index = _open_indexes.get(root)
+        if index is None:
+            index = SegmentedIndex(root, embeddings)
+            index.start_compactor()
+            _open_indexes[root] = index
+        else:
+            # Reopened after a re-ingest with another model: string queries must use it
+            index.embeddings = embeddings
+        return index
+
+
+__all__ = ["SegmentedIndex", "is_segmented", "open_segmented_index"]
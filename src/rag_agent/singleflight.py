@@ -0,0 +1,197 @@
+"""Single-flight coalescing of identical in-flight questions.
+
+When several sessions ask the same opening question at once (typically a
+welcome-screen prompt), only the first starts an agent run. Everyone else
+subscribes to it and receives the same stream of events, replayed from the
+start, so a burst of N identical clicks costs one run instead of N.
+
+Only questions asked without history are coalesced, keyed by the question,
+index version and model. The shared run is its own task and is cancelled only
+once every subscriber has left, so one user pressing Stop does not cut off
+the others.
+"""
+from __future__ import annotations
+
+import asyncio
+import threading
+from typing import AsyncIterator, Callable
+
+from .cancellation import CancellationToken
+from .logger import setup_logger
+from .streaming import Final, StreamEvent
+
+logger = setup_logger(__name__)
+
+
+class Flight:
+    """One shared run: its events so far plus the subscribers waiting on more."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.cancel = CancellationToken()
+        self.events: list[StreamEvent] = []
+        self.done = False
+        self.subscribers = 0  # Counted on join, so a slow first read cannot look abandoned
+        self.task: asyncio.Future | None = None
+        self._wakeups: set[tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+        self._lock = threading.Lock()
+
+    def publish(self, event: StreamEvent) -> None:
+        with self._lock:
+            if self.done:
+                return
+            self.events.append(event)
+            self.done = isinstance(event, Final)
+            wakeups = list(self._wakeups)
+        # Subscribers may sit on other event loops (MCP vs the sync adapter's loop)
+        for loop, wake in wakeups:
+            try:
+                loop.call_soon_threadsafe(wake.set)
+            except RuntimeError:
+                pass  # That subscriber's loop has shut down
+
+    def _leave(self) -> None:
+        with self._lock:
+            self.subscribers -= 1
+            abandoned = self.subscribers == 0 and not self.done
+        if abandoned:
+            # Nobody is left to read the answer; stop spending tokens on it
+            self.cancel.cancel()
+
+    async def _follow(
+        self, cancel: CancellationToken | None, timeout: float | None
+    ) -> AsyncIterator[StreamEvent]:
+        """Replay every event so far, then follow the run until its :class:`Final` or ``timeout``."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout if timeout else None
+        wake = asyncio.Event()
+        waiter = (loop, wake)
+        unsubscribe = cancel.on_cancel(lambda: loop.call_soon_threadsafe(wake.set)) if cancel else (lambda: None)
+        with self._lock:
+            self._wakeups.add(waiter)
+        index = 0
+        try:
+            while True:
+                with self._lock:
+                    # Cleared under the lock, so a publish after this read always wakes us
+                    wake.clear()
+                    batch = self.events[index:]
+                    done = self.done
+                index += len(batch)
+                for event in batch:
+                    yield event
+                if done:
+                    return
+                if cancel is not None and cancel.cancelled:
+                    yield Final("", error="cancelled")
+                    return
+                try:
+                    # This subscriber's own deadline; the run may keep going for the others
+                    await asyncio.wait_for(wake.wait(), None if deadline is None else max(0.0, deadline - loop.time()))
+                except asyncio.TimeoutError:
+                    error = f"request timed out after {timeout:.0f}s"
+                    yield Final(f"Error: {error}", error=error)
+                    return
+        finally:
+            unsubscribe()
+            with self._lock:
+                self._wakeups.discard(waiter)
+
+
+class Subscription:
+    """One subscriber's stream of a :class:`Flight`.
+
+    The subscriber is counted when it joins, and :meth:`aclose` always
+    releases it, even if iteration never started (an async generator's
+    ``finally`` would not run then, leaving the run looking watched forever).
+    """
+
+    def __init__(
+        self, flight: Flight, cancel: CancellationToken | None = None, timeout: float | None = None
+    ) -> None:
+        self.flight = flight
+        self._events = flight._follow(cancel, timeout)
+        self._closed = False
+
+    def __aiter__(self) -> "Subscription":
+        return self
+
+    async def __anext__(self) -> StreamEvent:
+        try:
+            return await anext(self._events)
+        except StopAsyncIteration:
+            await self.aclose()
+            raise
+
+    async def aclose(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        try:
+            await self._events.aclose()
+        finally:
+            self.flight._leave()
+
+
+class SingleFlight:
+    """Process-wide table of in-flight runs, shared by every agent."""
+
+    def __init__(self) -> None:
+        self._flights: dict[str, Flight] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+    def join(
+        self,
+        key: str,
+        start: Callable[[CancellationToken], AsyncIterator[StreamEvent]],
+        cancel: CancellationToken | None = None,
+        timeout: float | None = None,
+    ) -> tuple[Subscription, bool]:
+        """Subscribe to the run for ``key``, starting it with ``start(token)`` if there is none.
+
+        ``cancel`` and ``timeout`` apply to this subscriber only. Returns the
+        subscription and whether this caller started the run. The caller must
+        ``aclose()`` the subscription (e.g. with ``aclosing``).
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = Flight(key)
+            with flight._lock:
+                flight.subscribers += 1
+        if leader:
+            flight.task = asyncio.ensure_future(self._run(flight, start(flight.cancel)))
+        else:
+            logger.debug("Joining in-flight run for %s", key[:12])
+        return Subscription(flight, cancel, timeout), leader
+
+    async def _run(self, flight: Flight, stream: AsyncIterator[StreamEvent]) -> None:
+        try:
+            async for event in stream:
+                flight.publish(event)
+        except asyncio.CancelledError:
+            flight.publish(Final("", error="cancelled"))
+            raise
+        except Exception as e:
+            flight.publish(Final(f"Error: {e}", error=str(e)))
+        finally:
+            with self._lock:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+            # A run that ended without a Final (should not happen) must not strand subscribers
+            flight.publish(Final("", error="the agent finished without an answer"))
+
+
+_single_flight = SingleFlight()
+
+
+def get_single_flight() -> SingleFlight:
+    return _single_flight
+
+
+__all__ = ["Flight", "SingleFlight", "Subscription", "get_single_flight"]
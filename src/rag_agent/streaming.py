@@ -0,0 +1,105 @@
+"""Typed events for streamed answers, and a sync adapter for async streams.
+
+:meth:`RAGAgent.astream` yields :class:`Token`, :class:`ToolStart`,
+:class:`ToolEnd` and one closing :class:`Final` event. Async callers (MCP)
+consume it directly. Sync callers (Streamlit, the CLI) go through
+:func:`iterate_sync`, which runs streams on one shared background event loop
+instead of starting a thread per request.
+"""
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Iterator, TypeVar, Union
+
+T = TypeVar("T")
+
+
+@dataclass(slots=True)
+class Token:
+    """A piece of answer text from the model."""
+    text: str
+
+
+@dataclass(slots=True)
+class ToolStart:
+    tool: str
+    input: object = None
+
+
+@dataclass(slots=True)
+class ToolEnd:
+    tool: str
+    output: str = ""
+
+
+@dataclass(slots=True)
+class Final:
+    """Last event of every stream: the complete answer (or the error message)."""
+    output: str
+    tools: list[str] = field(default_factory=list)
+    cached: bool = False
+    error: str | None = None
+
+
+StreamEvent = Union[Token, ToolStart, ToolEnd, Final]
+
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_lock = threading.Lock()
+_DONE = object()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """Event loop on a daemon thread, shared by every sync caller of an async stream."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="rag-async", daemon=True).start()
+        return _loop
+
+
+def iterate_sync(stream: AsyncIterator[T]) -> Iterator[T]:
+    """Iterate an async generator from sync code.
+
+    The whole stream runs as one task on the background loop (so context
+    variables set inside it stay visible to later steps). Closing the
+    iterator early, e.g. on a Stop button, cancels that task.
+    """
+    items: queue.Queue = queue.Queue()
+
+    async def pump() -> None:
+        try:
+            async for item in stream:
+                items.put(item)
+        except BaseException as e:
+            items.put(e)
+            raise
+        finally:
+            items.put(_DONE)
+
+    future = asyncio.run_coroutine_threadsafe(pump(), get_background_loop())
+    try:
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        if not future.done():
+            future.cancel()
+
+
+__all__ = [
+    "Final",
+    "StreamEvent",
+    "Token",
+    "ToolEnd",
+    "ToolStart",
+    "get_background_loop",
+    "iterate_sync",
+]
@@ -0,0 +1,98 @@
+"""Per-query tool subsets, so each request binds only the tool schemas it needs.
+
+Binding all tools sends every JSON schema (and the prompt sections describing
+them) on each LLM call. :class:`ToolSelector` picks a small subset per query
+from keyword rules plus an embedding classifier over the tool descriptions;
+the agent keeps one pre-built executor per subset.
+"""
+from __future__ import annotations
+
+import re
+import threading
+
+import numpy as np
+
+from .config import settings
+from .logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Always bound: answering from the knowledge base is the agent's primary job
+CORE_TOOLS = ("search_knowledge_base",)
+# Bound when nothing else matched, so open-ended questions can still reach the web
+DEFAULT_TOOLS = ("web_search",)
+# Tools whose answers are expected to come with pictures (the "visual first" protocol)
+COMPANION_TOOLS = {
+    "search_products": ("get_images",),
+    "get_map_location": ("get_images",),
+}
+
+KEYWORD_RULES = {
+    "calculator": r"\b(calculate|compute|how much is|sum of|multiply|divide|percent(age)?|sqrt|square root|"
+                  r"equation|integral|derivative|solve|formula)\b|\d\s*[-+*/^%]\s*\d",
+    "generate_plot": r"\b(plot|graph|visuali[sz]e)\b",
+    "create_chart": r"\b(chart|bar graph|pie|histogram|trend line)\b",
+    "web_search": r"\b(latest|today|current|recent|search|look up|who is|what happened)\b",
+    "get_weather": r"\b(weather|temperature|forecast|rain(ing)?|snow(ing)?|humidity|sunny)\b",
+    "get_global_news": r"\b(news|headlines?|breaking)\b",
+    "search_products": r"\b(buy|shop(ping)?|products?|deals?|cheapest|best .+ (under|for)|hotels?)\b",
+    "get_map_location": r"\b(where is|map|location of|directions?|address)\b",
+    "get_stock_price": r"\b(stocks?|share price|ticker|market cap|nasdaq|nyse|nse|bse)\b",
+    "find_relevant_links": r"\b(links?|urls?|website|linkedin|twitter|github|instagram|profiles?)\b",
+    "get_images": r"\b(images?|pictures?|photos?|show me|look like)\b",
+    "generate_ai_image": r"\b(generate|create|draw|make|design)\b.*\b(image|picture|art|illustration|logo)\b",
+    "save_file": r"\b(save|export|write)\b.*\b(file|document|txt|csv|markdown)\b",
+    "translate_content": r"\b(translat\w*|in (spanish|french|german|hindi|chinese|japanese|arabic))\b",
+}
+_COMPILED_RULES = {tool: re.compile(pattern, re.IGNORECASE) for tool, pattern in KEYWORD_RULES.items()}
+
+
+class ToolSelector:
+    """Chooses the tools to bind for a query (names returned in the agent's tool order)."""
+
+    def __init__(self, tools: list, embeddings=None) -> None:
+        self.names = [tool.name for tool in tools]
+        self.descriptions = {tool.name: f"{tool.name.replace('_', ' ')}: {tool.description}" for tool in tools}
+        self.embeddings = embeddings
+        self._vectors: np.ndarray | None = None
+        self._lock = threading.Lock()
+
+    def _description_vectors(self) -> np.ndarray:
+        with self._lock:
+            if self._vectors is None:
+                vectors = np.asarray(
+                    self.embeddings.embed_documents([self.descriptions[n] for n in self.names]), dtype="float32"
+                )
+                self._vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+            return self._vectors
+
+    def _by_similarity(self, text: str) -> list[str]:
+        if self.embeddings is None:
+            return []
+        try:
+            query = np.asarray(self.embeddings.embed_query(text), dtype="float32")
+            scores = self._description_vectors() @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        except Exception as e:
+            logger.warning("Tool classifier unavailable, using keyword rules only: %s", e)
+            return []
+        ranked = np.argsort(-scores)[: settings.tool_routing_top_k]
+        return [self.names[i] for i in ranked if scores[i] >= settings.tool_routing_threshold]
+
+    def select(self, text: str) -> tuple[str, ...]:
+        """Tool names to bind for ``text`` (the question, plus recent context if any)."""
+        matched = [tool for tool, rule in _COMPILED_RULES.items() if rule.search(text)]
+        matched += self._by_similarity(text)
+        if not matched:
+            matched = list(DEFAULT_TOOLS)
+        for tool in list(matched):
+            matched += COMPANION_TOOLS.get(tool, ())
+
+        chosen = set(CORE_TOOLS)
+        for tool in matched:
+            if len(chosen) >= max(len(CORE_TOOLS) + 1, settings.tool_routing_max):
+                break
+            chosen.add(tool)
+        return tuple(name for name in self.names if name in chosen)
+
+
+__all__ = ["CORE_TOOLS", "KEYWORD_RULES", "ToolSelector"]
@@ -14,6 +14,7 @@ from langchain_community.tools import DuckDuckGoSearchRun
 from deep_translator import GoogleTranslator
 
 from .config import settings
+from .resources import cpu_slot
 
 # Initialize chart directory
 chart_dir = settings.data_dir / "charts"
@@ -94,13 +95,14 @@ def generate_plot(code: str) -> str:
         
         # execution environment
         local_scope = {"plt": plt, "np": np, "pd": pd, "sns": sns}
-        exec(code, {}, local_scope)
-        
-        # Save
-        filename = f"plot_{int(time.time())}.png"
-        save_path = static_dir / filename
-        plt.savefig(str(save_path))
-        plt.close()
+        with cpu_slot("plot"):
+            exec(code, {}, local_scope)
+            
+            # Save
+            filename = f"plot_{int(time.time())}.png"
+            save_path = static_dir / filename
+            plt.savefig(str(save_path))
+            plt.close()
         
         return f"![Chart](app/static/{filename})"
     except Exception as e:
@@ -5,6 +5,8 @@ import torch
 from PIL import Image
 from transformers import BlipProcessor, BlipForConditionalGeneration
 
+from .resources import cpu_slot
+
 # Lazy load model to avoid startup costs if not used
 _processor = None
 _model = None
@@ -36,7 +38,9 @@ def describe_image(image_path: str) -> str:
         # Unconditional image captioning
         inputs = _processor(raw_image, return_tensors="pt")
         
-        out = _model.generate(**inputs, max_new_tokens=50)
+        # Share the CPU with embeddings/ingest instead of oversubscribing it
+        with cpu_slot("vision"):
+            out = _model.generate(**inputs, max_new_tokens=50)
         caption = _processor.decode(out[0], skip_special_tokens=True)
         
         return caption
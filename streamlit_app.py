@@ -824,21 +824,17 @@ def main():
                         full_response = ""
                         response_container = st.empty()
                         stop_container = st.empty() # Container for stop button
-                        stop_generating = False
                         
                         import re
+                        from rag_agent.cancellation import CancellationToken
                         
-                        # Stop Button UI
+                        # Stop Button UI: clicking reruns the script, which interrupts this loop at
+                        # the next chunk; closing the stream (and on_click) cancels the LLM call and pending tools
+                        cancel_token = CancellationToken()
                         with stop_container:
-                            if st.button("⏹ Stop Generating", key="stop_gen_btn"):
-                                stop_generating = True
-
-                        for chunk in agent.ask_stream(prompt):
-                            # Check for stop signal (session state or button)
-                            # Note: Buttons in loops are tricky in Streamlit. 
-                            # Ideally we check session state, but immediate button requires rerun.
-                            # We use a placeholder approach.
-                            
+                            st.button("⏹ Stop Generating", key="stop_gen_btn", on_click=cancel_token.cancel)
+
+                        for chunk in agent.ask_stream(prompt, cancel=cancel_token):
                             full_response += chunk
                             
                             # Debug: Show raw tokens if debug mode is on
@@ -935,6 +931,17 @@ def main():
                         if st.session_state.get("debug_mode", False):
                             with st.expander("🐞 Raw Output (Debug)"):
                                 st.code(full_response)
+                            if agent.last_metrics:
+                                with st.expander("⏱️ Latency Breakdown (Debug)"):
+                                    m = agent.last_metrics
+                                    c1, c2, c3, c4 = st.columns(4)
+                                    c1.metric("Total", f"{m['total_ms'] or 0:.0f} ms")
+                                    c2.metric("First token", f"{m['ttft_ms']:.0f} ms" if m["ttft_ms"] is not None else "—")
+                                    c3.metric("Tokens/s", m["tokens_per_s"] or "—")
+                                    c4.metric("LLM calls", m["iterations"])
+                                    st.json(m)
+                                    st.caption("Recent answers (p50/p95)")
+                                    st.json(agent.metrics.summary(), expanded=False)
                         
                         # UI Feature: Copy Button (Bottom Right, Minimal)
                         st.markdown("<div style='height: 20px;'></div>", unsafe_allow_html=True) # Spacer